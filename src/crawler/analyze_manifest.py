@@ -0,0 +1,113 @@
+"""
+Манифест инкрементального analyze (output/analyze_manifest.json).
+
+Хранит для каждой страницы SHA-256 содержимого и (размер, mtime) файла, а также
+сигнатуру токенизатора: пока сигнатура и хэш страницы не изменились, её токены
+и леммы пересчитывать не нужно.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+ANALYZE_MANIFEST_FORMAT = "analyze-manifest-v1"
+ANALYZE_MANIFEST_FILENAME = "analyze_manifest.json"
+
+_HASH_CHUNK = 1 << 20
+
+
+def default_manifest_path(tokens_dir: Path) -> Path:
+    """Манифест лежит рядом с каталогами токенов и лемм (output/analyze_manifest.json)."""
+    return tokens_dir.parent / ANALYZE_MANIFEST_FILENAME
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stat(path: Path) -> tuple[int, int]:
+    """(размер, mtime_ns) — быстрая проверка без чтения файла."""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+class AnalyzeManifest:
+    """
+    Состояние прошлого прогона analyze.
+
+    Страница считается неизменённой, если совпадают размер и mtime (файл не читается)
+    либо, при изменившемся mtime, совпадает SHA-256 содержимого.
+    """
+
+    def __init__(self, signature: str, settings: dict[str, str]) -> None:
+        self.signature = signature
+        self.settings = settings
+        self.pages: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: Path, signature: str, settings: dict[str, str]) -> "AnalyzeManifest":
+        """
+        Читает манифест; при другой сигнатуре токенизатора или других каталогах
+        результата возвращает пустой манифест (всё пересчитывается).
+        """
+        manifest = cls(signature, settings)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return manifest
+        if (
+            not isinstance(payload, dict)
+            or payload.get("format") != ANALYZE_MANIFEST_FORMAT
+            or payload.get("signature") != signature
+            or payload.get("settings") != settings
+            or not isinstance(payload.get("pages"), dict)
+        ):
+            return manifest
+        manifest.pages = {
+            name: entry
+            for name, entry in payload["pages"].items()
+            if isinstance(entry, dict) and isinstance(entry.get("sha256"), str)
+        }
+        return manifest
+
+    def is_unchanged(self, page: Path) -> bool:
+        entry = self.pages.get(page.name)
+        if entry is None:
+            return False
+        size, mtime_ns = file_stat(page)
+        if entry.get("size") == size and entry.get("mtime_ns") == mtime_ns:
+            return True
+        if entry.get("size") != size:
+            return False
+        if file_sha256(page) != entry["sha256"]:
+            return False
+        # Содержимое то же (например, страницу перекачали без изменений): обновляем mtime.
+        entry["mtime_ns"] = mtime_ns
+        return True
+
+    def record(self, page: Path) -> None:
+        size, mtime_ns = file_stat(page)
+        self.pages[page.name] = {"sha256": file_sha256(page), "size": size, "mtime_ns": mtime_ns}
+
+    def forget(self, name: str) -> None:
+        self.pages.pop(name, None)
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "format": ANALYZE_MANIFEST_FORMAT,
+            "signature": self.signature,
+            "settings": self.settings,
+            "pages": {name: self.pages[name] for name in sorted(self.pages)},
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
@@ -0,0 +1,115 @@
+"""
+Микробенчмарки этапов обработки.
+
+bench-tokenizer сравнивает токенизатор analyze с прежней схемой (HTMLParser, весь текст
+страницы склеивается в одну строку, затем findall по ней и fullmatch на каждый токен)
+на одних и тех же страницах и проверяет, что наборы токенов совпадают.
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+from .text_processing import STOPWORDS, TOKEN_RE, _ArticleExtractor, _extract_tokens, _scan_markup
+
+
+class _LegacyTextExtractor(_ArticleExtractor):
+    """Прежний извлекатель: копит фрагменты текста и склеивает их через пробел."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._article_chunks: list[str] = []
+        self._fallback_chunks: list[str] = []
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth > 0:
+            return
+        if data and not data.isspace():
+            self._fallback_chunks.append(data)
+            if self._capture_depth > 0:
+                self._article_chunks.append(data)
+
+    def get_text(self) -> str:
+        if self._article_chunks:
+            return " ".join(self._article_chunks)
+        return " ".join(self._fallback_chunks)
+
+
+def _legacy_tokenize(html: str) -> list[str]:
+    parser = _LegacyTextExtractor()
+    parser.feed(html)
+    parser.close()
+    tokens: set[str] = set()
+    for raw in TOKEN_RE.findall(parser.get_text().lower()):
+        token = raw.strip("-")
+        if not token or len(token) <= 2:
+            continue
+        if not re.fullmatch(r"[А-Яа-яЁё]+(?:-[А-Яа-яЁё]+)?", token):
+            continue
+        if token in STOPWORDS:
+            continue
+        tokens.add(token)
+    return sorted(tokens)
+
+
+def _fused_tokenize(html: str) -> list[str]:
+    return sorted(set(_extract_tokens(html)))
+
+
+def _measure(tokenize: Callable[[str], list[str]], pages: list[str], repeat: int) -> tuple[float, list[list[str]]]:
+    """Лучшее время из repeat прогонов по всем страницам и результат последнего прогона."""
+    best = float("inf")
+    results: list[list[str]] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [tokenize(html) for html in pages]
+        best = min(best, time.perf_counter() - started)
+    return best, results
+
+
+def bench_tokenizer(pages_dir: Path, repeat: int = 3) -> int:
+    """
+    Печатает страниц/с и токенов/с для прежнего и текущего токенизатора.
+
+    Токены считаются по тексту, извлечённому из страницы (с повторами, после фильтрации
+    стоп-слов), одинаково для обоих вариантов. HTML читается в память заранее, чтобы
+    не мерить диск.
+    """
+    if not pages_dir.is_dir():
+        print(f"bench-tokenizer: pages directory not found: {pages_dir}", file=sys.stderr)
+        return 1
+    if repeat < 1:
+        print("bench-tokenizer: --repeat must be >= 1", file=sys.stderr)
+        return 1
+    html_files = sorted(path for path in pages_dir.glob("*.html") if path.is_file())
+    if not html_files:
+        print(f"bench-tokenizer: no html files in {pages_dir}", file=sys.stderr)
+        return 1
+
+    pages = [path.read_text(encoding="utf-8") for path in html_files]
+    token_count = sum(len(_extract_tokens(html)) for html in pages)
+    megabytes = sum(len(html.encode("utf-8")) for html in pages) / 1e6
+    # Страницы, которые быстрый разбор отдал HTMLParser из-за нестандартной разметки.
+    fallback = sum(not _scan_markup(html, _ArticleExtractor()) for html in pages)
+
+    legacy_seconds, legacy_tokens = _measure(_legacy_tokenize, pages, repeat)
+    fused_seconds, fused_tokens = _measure(_fused_tokenize, pages, repeat)
+
+    print(
+        f"bench-tokenizer: pages={len(pages)} size={megabytes:.1f}MB tokens={token_count} "
+        f"html_parser_fallback={fallback} repeat={repeat}"
+    )
+    for name, seconds in (("before", legacy_seconds), ("after", fused_seconds)):
+        print(
+            f"bench-tokenizer: {name:<6} {seconds:.3f}s "
+            f"pages/s={len(pages) / seconds:.1f} tokens/s={token_count / seconds:.0f}"
+        )
+    print(f"bench-tokenizer: speedup={legacy_seconds / fused_seconds:.2f}x")
+
+    mismatched = [path.name for path, old, new in zip(html_files, legacy_tokens, fused_tokens) if old != new]
+    if mismatched:
+        print(f"bench-tokenizer: token sets differ for {len(mismatched)} pages, e.g. {mismatched[0]}", file=sys.stderr)
+        return 1
+    return 0
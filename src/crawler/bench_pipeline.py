@@ -0,0 +1,429 @@
+"""
+Бенчмарк всего конвейера на синтетическом корпусе: analyze -> tfidf -> build-index ->
+vector-index -> булев и векторный поиск.
+
+Корпус генерируется без сети и воспроизводимо (по seed): псевдорусские основы с
+падежными окончаниями, частоты основ по закону Ципфа. Без установленного aspell (или с
+aspell="stub") вместо него запускается заглушка с тем же pipe-протоколом, которая
+отбрасывает окончания синтетических слов: лемматизация по-прежнему идёт через пул
+процессов и кэш, но её время не сравнимо со временем настоящего словаря.
+
+Для каждого этапа пишется время и пиковый RSS процесса после него, с trace_memory —
+ещё и пик памяти Python-объектов этапа по tracemalloc (время этапов тогда завышено
+трассировкой, а процессы analyze --workers не видны). Для запросов — p50/p95/p99.
+Результат сохраняется в JSON, baseline — прошлый JSON для сравнения.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from .boolean_search import (
+    _BooleanQueryParser,
+    _load_index,
+    _load_positional_index,
+    _query_has_positions,
+    _read_inverted_index,
+    _tokenize_query,
+)
+from .boolean_search import build_index as build_inverted_index
+from .lemmatizer import close_aspell_pools
+from .tfidf import build_tfidf_for_corpus
+from .text_processing import analyze
+from .vector_search import (
+    VECTOR_BACKEND_PYTHON,
+    VECTOR_INDEX_V2,
+    build_vector_index,
+    load_vector_index,
+    prepare_vector_index,
+    search_in_loaded_index,
+)
+
+try:
+    import resource
+except ImportError:  # Windows: пиковый RSS не измеряется
+    resource = None
+
+ASPELL_AUTO = "auto"
+ASPELL_SYSTEM = "system"
+ASPELL_STUB = "stub"
+ASPELL_MODES = (ASPELL_AUTO, ASPELL_SYSTEM, ASPELL_STUB)
+
+_CONSONANTS = "бвгдзклмнпрстфхчш"
+_VOWELS = "аеиоуыя"
+# Окончания синтетических слов; лемма основы — основа + "а".
+_ENDINGS = ("а", "ы", "е", "у", "ой", "ам", "ами", "ах")
+_LEMMA_ENDING = "а"
+
+# Заглушка aspell -a: "+ ЛЕММА" для слова с синтетическим окончанием, иначе "*".
+_ASPELL_STUB = '''import sys
+ENDINGS = sorted({endings!r}, key=len, reverse=True)
+out = sys.stdout
+out.write("@(#) International Ispell Version 3.1.20 (but really bench stub)\\n")
+out.flush()
+for line in sys.stdin:
+    line = line.rstrip("\\n")
+    if not line.startswith("^"):
+        continue
+    line = line[1:]
+    for word in line.split():
+        lemma = None
+        for ending in ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= 3:
+                lemma = word[: -len(ending)] + {lemma_ending!r}
+                break
+        out.write("*\\n" if lemma is None or lemma == word else "+ " + lemma.upper() + "\\n")
+    out.write("\\n")
+    out.flush()
+'''
+
+
+def _make_stems(count: int, rnd: random.Random) -> list[str]:
+    stems: set[str] = set()
+    ordered: list[str] = []
+    while len(ordered) < count:
+        syllables = rnd.randint(2, 3)
+        stem = "".join(rnd.choice(_CONSONANTS) + rnd.choice(_VOWELS) for _ in range(syllables))
+        stem += rnd.choice(_CONSONANTS)
+        if stem not in stems:
+            stems.add(stem)
+            ordered.append(stem)
+    return ordered
+
+
+def generate_corpus(pages_dir: Path, docs: int, words: int, vocabulary: int, seed: int) -> int:
+    """
+    Пишет docs страниц 00001.html… с текстом в <article>; возвращает число слов корпуса.
+
+    Длина страницы — от words / 2 до words * 3 / 2 слов, основа слова выбирается по
+    закону Ципфа (вес 1 / ранг), окончание — равновероятно.
+    """
+    rnd = random.Random(seed)
+    stems = _make_stems(vocabulary, rnd)
+    cum_weights: list[float] = []
+    total = 0.0
+    for rank in range(1, len(stems) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    width = max(5, len(str(docs)))
+    word_count = 0
+    for number in range(1, docs + 1):
+        length = rnd.randint(max(1, words // 2), max(1, words * 3 // 2))
+        chosen = rnd.choices(stems, cum_weights=cum_weights, k=length)
+        page_words = [stem + rnd.choice(_ENDINGS) for stem in chosen]
+        word_count += length
+        paragraphs = [" ".join(page_words[start : start + 60]) for start in range(0, length, 60)]
+        body = "".join(f"<p>{paragraph}.</p>\n" for paragraph in paragraphs)
+        html = (
+            f'<!doctype html>\n<html lang="ru"><head><meta charset="utf-8"><title>{page_words[0]}</title></head>\n'
+            f"<body><nav>главная</nav><article>\n{body}</article></body></html>\n"
+        )
+        (pages_dir / f"{number:0{width}d}.html").write_text(html, encoding="utf-8")
+    return word_count
+
+
+def _install_aspell_stub(bin_dir: Path) -> None:
+    """Кладёт заглушку aspell в bin_dir и ставит каталог первым в PATH текущего процесса."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    script = bin_dir / "aspell"
+    source = _ASPELL_STUB.format(endings=_ENDINGS, lemma_ending=_LEMMA_ENDING)
+    script.write_text(f"#!{sys.executable}\n{source}", encoding="utf-8")
+    script.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+def _max_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_stage(name: str, func: Callable[[], Any], trace_memory: bool) -> tuple[dict[str, Any], Any]:
+    """Время этапа и память; вывод этапа в stdout подавляется."""
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+    finally:
+        seconds = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        if trace_memory:
+            tracemalloc.stop()
+    stats: dict[str, Any] = {"seconds": round(seconds, 4), "max_rss_mb": _max_rss_mb()}
+    if trace_memory:
+        stats["traced_peak_mb"] = round(traced_peak / (1024 * 1024), 1)
+    print(f"bench: {name:<14} {seconds:9.3f}s  max_rss={stats['max_rss_mb']}MB")
+    return stats, result
+
+
+def _latency_stats(latencies: list[float], empty: int) -> dict[str, Any]:
+    """Перцентили в миллисекундах (интерполяция между соседними наблюдениями)."""
+    millis = sorted(latency * 1000 for latency in latencies)
+    if len(millis) > 1:
+        cuts = statistics.quantiles(millis, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = millis[0]
+    return {
+        "count": len(millis),
+        "empty": empty,
+        "mean_ms": round(statistics.fmean(millis), 4),
+        "p50_ms": round(p50, 4),
+        "p95_ms": round(p95, 4),
+        "p99_ms": round(p99, 4),
+        "max_ms": round(millis[-1], 4),
+    }
+
+
+def _boolean_queries(index_path: Path, count: int, rnd: random.Random) -> list[str]:
+    """AND, OR, AND NOT, фразы и NEAR по леммам индекса; чаще берутся частые леммы."""
+    index, _all_docs = _read_inverted_index(index_path)
+    by_df = sorted(index, key=lambda term: (-len(index[term]), term))
+    cum_weights: list[float] = []
+    total = 0.0
+    for rank in range(1, len(by_df) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    templates = ("{} AND {}", "{} OR {}", "{} AND NOT {}", '"{} {}"', "{} NEAR/5 {}", "({} OR {}) AND {}")
+    queries: list[str] = []
+    for j in range(count):
+        template = templates[j % len(templates)]
+        terms = rnd.choices(by_df, cum_weights=cum_weights, k=template.count("{}"))
+        queries.append(template.format(*terms))
+    return queries
+
+
+def _vector_queries(pages_dir: Path, count: int, rnd: random.Random) -> list[str]:
+    """Запросы из 1–4 словоформ, взятых из текста страниц корпуса."""
+    pages = sorted(pages_dir.glob("*.html"))
+    queries: list[str] = []
+    for _ in range(count):
+        html = rnd.choice(pages).read_text(encoding="utf-8")
+        article = html[html.index("<article>") + len("<article>") : html.index("</article>")]
+        page_words = [word.strip(".") for word in article.replace("<p>", " ").replace("</p>", " ").split()]
+        queries.append(" ".join(rnd.sample(page_words, min(len(page_words), rnd.randint(1, 4)))))
+    return queries
+
+
+def _print_baseline(baseline: dict[str, Any], results: dict[str, Any]) -> None:
+    changed = sorted(
+        name for name, value in results["params"].items() if baseline.get("params", {}).get(name) != value
+    )
+    if changed:
+        print(f"bench: baseline was run with different parameters: {', '.join(changed)}")
+    for name, stats in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old and old.get("seconds"):
+            ratio = stats["seconds"] / old["seconds"]
+            print(f"bench: baseline {name:<14} {old['seconds']:9.3f}s -> {stats['seconds']:9.3f}s  x{ratio:.2f}")
+    for kind, stats in results["queries"].items():
+        old = baseline.get("queries", {}).get(kind)
+        if old and old.get("p95_ms"):
+            ratio = stats["p95_ms"] / old["p95_ms"]
+            print(
+                f"bench: baseline {kind + ' p95':<14} {old['p95_ms']:9.3f}ms -> {stats['p95_ms']:9.3f}ms  x{ratio:.2f}"
+            )
+
+
+def bench_pipeline(
+    out_path: Path,
+    docs: int = 1000,
+    words: int = 300,
+    vocabulary: int = 20000,
+    queries: int = 200,
+    top_k: int = 10,
+    seed: int = 42,
+    workers: int = 1,
+    aspell: str = ASPELL_AUTO,
+    backend: str = VECTOR_BACKEND_PYTHON,
+    vector_format: str = VECTOR_INDEX_V2,
+    work_dir: Path | None = None,
+    baseline_path: Path | None = None,
+    trace_memory: bool = False,
+) -> int:
+    """
+    Прогоняет конвейер на синтетическом корпусе и пишет результаты в out_path (JSON).
+
+    work_dir — каталог для корпуса и артефактов; по умолчанию временный, удаляется
+    после прогона.
+    """
+    for name, value in (("docs", docs), ("words", words), ("vocabulary", vocabulary), ("queries", queries)):
+        if value < 1:
+            print(f"bench: --{name} must be >= 1", file=sys.stderr)
+            return 1
+    if workers < 1 or top_k < 1:
+        print("bench: --workers and --top-k must be >= 1", file=sys.stderr)
+        return 1
+    if aspell not in ASPELL_MODES:
+        print(f"bench: unknown aspell mode: {aspell}", file=sys.stderr)
+        return 1
+    baseline: dict[str, Any] | None = None
+    if baseline_path is not None:
+        try:
+            baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            print(f"bench: cannot read baseline {baseline_path}: {exc}", file=sys.stderr)
+            return 1
+
+    has_aspell = shutil.which("aspell") is not None
+    if aspell == ASPELL_SYSTEM and not has_aspell:
+        print("bench: aspell not found (use --aspell stub)", file=sys.stderr)
+        return 1
+    use_stub = aspell == ASPELL_STUB or (aspell == ASPELL_AUTO and not has_aspell)
+    if use_stub and os.name == "nt":
+        print("bench: aspell stub requires a POSIX system; install aspell and use --aspell system", file=sys.stderr)
+        return 1
+
+    temp_dir = None
+    if work_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="crawler-bench-")
+        work_dir = Path(temp_dir)
+    pages_dir = work_dir / "pages"
+    tokens_dir = work_dir / "tokens"
+    lemmas_dir = work_dir / "lemmas"
+    tfidf_dir = work_dir / "tfidf"
+    index_path = work_dir / "inverted_index.txt"
+    vector_dir = work_dir / "vector_index"
+    saved_path = os.environ.get("PATH", "")
+    try:
+        if use_stub:
+            # Пул aspell процесса мог подняться с настоящим aspell: закрываем, чтобы взялась заглушка.
+            close_aspell_pools()
+            _install_aspell_stub(work_dir / "bin")
+        print(
+            f"bench: docs={docs} words~{words} vocabulary={vocabulary} seed={seed} workers={workers} "
+            f"aspell={'stub' if use_stub else 'system'} backend={backend} format={vector_format}"
+        )
+
+        stages: dict[str, dict[str, Any]] = {}
+        stages["generate"], word_count = _run_stage(
+            "generate", lambda: generate_corpus(pages_dir, docs, words, vocabulary, seed), trace_memory
+        )
+        pipeline: list[tuple[str, Callable[[], Any]]] = [
+            (
+                "analyze",
+                lambda: analyze(
+                    pages_dir, tokens_dir, lemmas_dir, workers=workers, full=True, counts=True, positions=True
+                ),
+            ),
+            ("tfidf", lambda: build_tfidf_for_corpus(tokens_dir, lemmas_dir, tfidf_dir, workers=workers)),
+            (
+                "build_index",
+                lambda: build_inverted_index(lemmas_dir, index_path, binary=True, tokens_dir=tokens_dir),
+            ),
+        ]
+        for name, func in pipeline:
+            stats, code = _run_stage(name, func, trace_memory)
+            stages[name] = stats
+            if code != 0:
+                print(f"bench: stage {name} failed with exit code {code}", file=sys.stderr)
+                return 1
+        # Payload построения не держим: поиск работает с индексом, загруженным с диска.
+        stages["vector_index"] = _run_stage(
+            "vector_index", lambda: build_vector_index(tfidf_dir, vector_dir, index_format=vector_format), trace_memory
+        )[0]
+
+        # Загрузка индексов — как у долгоживущего процесса поиска: один раз перед запросами.
+        dict_path = index_path.with_suffix(".dict")
+
+        def load_boolean() -> tuple[Any, Any]:
+            index = _load_index(dict_path)
+            return index, _load_positional_index(dict_path, index)
+
+        def load_vector() -> Any:
+            vector_index = load_vector_index(vector_dir)
+            prepare_vector_index(vector_index, backend)
+            return vector_index
+
+        stages["boolean_load"], (boolean_index, positions) = _run_stage("boolean_load", load_boolean, trace_memory)
+        stages["vector_load"], vector_index = _run_stage("vector_load", load_vector, trace_memory)
+
+        rnd = random.Random(seed + 1)
+        boolean_latencies: list[float] = []
+        boolean_empty = 0
+        for query in _boolean_queries(index_path, queries, rnd):
+            started = time.perf_counter()
+            tokens = _tokenize_query(query)
+            parser = _BooleanQueryParser(
+                tokens=tokens, index=boolean_index, positions=positions if _query_has_positions(tokens) else None
+            )
+            found = boolean_index.doc_names(parser.parse())
+            boolean_latencies.append(time.perf_counter() - started)
+            boolean_empty += not found
+
+        vector_latencies: list[float] = []
+        vector_empty = 0
+        for query in _vector_queries(pages_dir, queries, rnd):
+            started = time.perf_counter()
+            try:
+                ranked = search_in_loaded_index(query, top_k, vector_index, backend=backend)
+            except ValueError:
+                ranked = []
+            vector_latencies.append(time.perf_counter() - started)
+            vector_empty += not ranked
+
+        html_bytes = sum(path.stat().st_size for path in pages_dir.glob("*.html"))
+        results: dict[str, Any] = {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {
+                "docs": docs,
+                "words": words,
+                "vocabulary": vocabulary,
+                "queries": queries,
+                "top_k": top_k,
+                "seed": seed,
+                "workers": workers,
+                "aspell": ASPELL_STUB if use_stub else ASPELL_SYSTEM,
+                "backend": backend,
+                "vector_format": vector_format,
+                "trace_memory": trace_memory,
+            },
+            "corpus": {"docs": docs, "words": word_count, "html_mb": round(html_bytes / (1024 * 1024), 1)},
+            "stages": stages,
+            "queries": {
+                "boolean": _latency_stats(boolean_latencies, boolean_empty),
+                "vector": _latency_stats(vector_latencies, vector_empty),
+            },
+        }
+    except (RuntimeError, ValueError) as exc:
+        print(f"bench: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        os.environ["PATH"] = saved_path
+        if use_stub:
+            close_aspell_pools()
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for kind, stats in results["queries"].items():
+        print(
+            f"bench: {kind + ' query':<14} p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms "
+            f"p99={stats['p99_ms']:.3f}ms empty={stats['empty']}/{stats['count']}"
+        )
+    if baseline is not None:
+        _print_baseline(baseline, results)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"bench: results = {out_path}")
+    return 0
@@ -0,0 +1,171 @@
+"""
+Общие примитивы бинарных индексов: секции с выравниванием, таблица строк в mmap
+и varint-кодирование возрастающих списков номеров.
+
+Файл состоит из заголовка фиксированной длины и секций-массивов. Массивы читаются
+через memoryview.cast прямо из mmap, без создания Python-объекта на каждый элемент.
+"""
+
+import mmap
+import os
+import sys
+from array import array
+from itertools import accumulate
+from pathlib import Path
+
+_ALIGNMENT = 8
+
+
+def check_byte_order() -> None:
+    """Бинарные индексы пишутся в little-endian; на других платформах читать их нельзя."""
+    if sys.byteorder != "little":
+        raise ValueError("binary index formats require a little-endian platform")
+
+
+def new_generation() -> int:
+    """
+    Случайный идентификатор сборки (u64). Файлы одного индекса пишутся и подменяются
+    по отдельности; одинаковый идентификатор в их заголовках показывает, что они из одной сборки.
+    """
+    return int.from_bytes(os.urandom(8), "little")
+
+
+class SectionWriter:
+    """Накапливает секции файла; каждая начинается с границы в 8 байт."""
+
+    def __init__(self, header_size: int) -> None:
+        self._chunks: list[bytes] = []
+        self._size = header_size
+
+    def add(self, data: bytes | array) -> tuple[int, int]:
+        """Добавляет секцию, возвращает (смещение, длина в байтах)."""
+        payload = data.tobytes() if isinstance(data, array) else bytes(data)
+        padding = (-self._size) % _ALIGNMENT
+        if padding:
+            self._chunks.append(b"\0" * padding)
+            self._size += padding
+        offset = self._size
+        self._chunks.append(payload)
+        self._size += len(payload)
+        return offset, len(payload)
+
+    def write(self, path: Path, header: bytes) -> None:
+        """Пишет файл атомарно: временный файл + rename (читатели с mmap не ломаются)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(header)
+            for chunk in self._chunks:
+                f.write(chunk)
+        tmp_path.replace(path)
+
+
+def map_file(path: Path) -> memoryview:
+    """Отображает файл в память только для чтения."""
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)
+
+
+def section(view: memoryview, offset: int, length: int, fmt: str | None = None) -> memoryview:
+    """Срез секции; с fmt ("I", "Q", "f") — типизированный массив поверх тех же байт."""
+    if offset + length > len(view):
+        raise ValueError("binary index is truncated")
+    part = view[offset : offset + length]
+    return part.cast(fmt) if fmt is not None else part
+
+
+def pack_string_table(strings: list[str]) -> tuple[array, bytes]:
+    """
+    Упаковывает строки в (offsets uint32[n + 1], blob UTF-8).
+
+    Для поиска по таблице строки должны быть отсортированы по UTF-8 байтам
+    (это совпадает с порядком по кодовым точкам).
+    """
+    offsets = array("I", [0])
+    parts: list[bytes] = []
+    total = 0
+    for value in strings:
+        encoded = value.encode("utf-8")
+        parts.append(encoded)
+        total += len(encoded)
+        offsets.append(total)
+    return offsets, b"".join(parts)
+
+
+class StringTable:
+    """Таблица строк поверх mmap: доступ по номеру и двоичный поиск по отсортированным строкам."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i] : self._offsets[i + 1]])
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+    def to_list(self) -> list[str]:
+        """Все строки таблицы разом (для частого доступа по номеру)."""
+        blob = bytes(self._blob)
+        offsets = self._offsets.tolist()
+        return [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def find(self, value: str) -> int:
+        """Номер строки или -1, если её нет."""
+        key = value.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.raw(lo) == key:
+            return lo
+        return -1
+
+
+def encode_varint_deltas(values: list[int]) -> bytes:
+    """
+    Кодирует возрастающую последовательность неотрицательных чисел разностями в varint
+    (7 бит на байт, старший бит — «есть продолжение»).
+    """
+    out = bytearray()
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_varint_deltas(data: bytes | memoryview) -> list[int]:
+    """Обратное к encode_varint_deltas."""
+    raw = bytes(data)
+    if not raw:
+        return []
+    if max(raw) < 0x80:
+        # Все разности однобайтовые (типично для длинных плотных списков): суммируем в C.
+        return list(accumulate(raw))
+    values: list[int] = []
+    current = 0
+    delta = 0
+    shift = 0
+    for byte in raw:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        current += delta
+        values.append(current)
+        delta = 0
+        shift = 0
+    return values
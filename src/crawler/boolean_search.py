@@ -2,9 +2,28 @@
 import re
 import sys
 from pathlib import Path
+from typing import Iterable
+
+from .binary_format import new_generation
+from .inverted_index_binary import (
+    BinaryInvertedIndex,
+    binary_index_paths,
+    is_binary_inverted_index,
+    write_binary_inverted_index,
+)
+from .positional_index import (
+    PositionalIndex,
+    near_spans,
+    phrase_starts,
+    positional_index_path,
+    write_positional_index,
+)
+from .postings import DocSet
+from .term_counts import counts_path, load_term_positions
 
 OPERATORS = {"AND", "OR", "NOT"}
 TERM_RE = re.compile(r"[A-Za-zА-Яа-яЁё-]+")
+NEAR_RE = re.compile(r"NEAR/(\d+)(?![A-Za-zА-Яа-яЁё0-9-])", re.IGNORECASE)
 
 
 def _doc_id_from_lemma_file(path: Path) -> str:
@@ -57,8 +76,50 @@ def _write_inverted_index(path: Path, index: dict[str, set[str]]) -> None:
     path.write_text(content, encoding="utf-8")
 
 
-def build_index(lemmas_dir: Path, out_path: Path) -> int:
-    """Строит инвертированный индекс по леммам и записывает в out_path."""
+def _parse_lemma_groups(path: Path) -> dict[str, list[str]]:
+    """Строки "лемма токен1 ... токенN" файла лемм."""
+    groups: dict[str, list[str]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        parts = line.strip().lower().split()
+        if parts:
+            groups[parts[0]] = parts[1:]
+    return groups
+
+
+def _build_positional_postings(
+    lemmas_dir: Path,
+    tokens_dir: Path,
+    doc_names: list[str],
+) -> dict[str, list[tuple[int, list[int]]]]:
+    """
+    Позиции лемм по документам из *_lemmas.txt и <id>_counts.txt (analyze --positions):
+    позиции леммы в документе — объединение позиций всех её токенов.
+    """
+    postings: dict[str, list[tuple[int, list[int]]]] = {}
+    for doc, name in enumerate(doc_names):
+        stem = Path(name).stem
+        token_counts_path = counts_path(tokens_dir, stem)
+        if not token_counts_path.is_file():
+            raise ValueError(f"no token positions for {name}: {token_counts_path} not found (run analyze --positions)")
+        token_positions = load_term_positions(token_counts_path)
+        if token_positions is None:
+            raise ValueError(f"{token_counts_path} has no positions (run analyze --positions)")
+        for lemma, tokens in _parse_lemma_groups(lemmas_dir / f"{stem}_lemmas.txt").items():
+            positions = sorted(position for token in tokens for position in token_positions.get(token, ()))
+            if positions:
+                postings.setdefault(lemma, []).append((doc, positions))
+    return postings
+
+
+def build_index(lemmas_dir: Path, out_path: Path, binary: bool = False, tokens_dir: Path | None = None) -> int:
+    """
+    Строит инвертированный индекс по леммам и записывает в out_path.
+
+    При binary=True рядом дополнительно пишется бинарный индекс для mmap
+    (out_path с расширениями .dict и .postings). Если задан tokens_dir, по позициям
+    токенов из <id>_counts.txt строится позиционный индекс (out_path с расширением
+    .positions) для фразовых запросов и NEAR.
+    """
     if not lemmas_dir.exists():
         print(f"build-index: lemmas directory not found: {lemmas_dir}", file=sys.stderr)
         return 1
@@ -67,12 +128,28 @@ def build_index(lemmas_dir: Path, out_path: Path) -> int:
         return 1
 
     try:
-        index, _all_docs = _build_inverted_index_from_lemmas(lemmas_dir)
+        index, all_docs = _build_inverted_index_from_lemmas(lemmas_dir)
     except ValueError as e:
         print(f"build-index: {e}", file=sys.stderr)
         return 1
 
     _write_inverted_index(out_path, index)
+    # Один идентификатор сборки на .dict, .postings и .positions: поиск не смешает файлы разных сборок.
+    generation = new_generation()
+    if binary:
+        dict_path, _postings_path = binary_index_paths(out_path)
+        postings_path = write_binary_inverted_index(dict_path, index, all_docs, generation)
+        print(f"build-index: binary index = {dict_path}, {postings_path}")
+    if tokens_dir is not None:
+        doc_names = sorted(all_docs)
+        try:
+            positional = _build_positional_postings(lemmas_dir, tokens_dir, doc_names)
+        except ValueError as e:
+            print(f"build-index: {e}", file=sys.stderr)
+            return 1
+        positions_path = positional_index_path(out_path)
+        write_positional_index(positions_path, positional, doc_names, generation)
+        print(f"build-index: positional index = {positions_path}")
     return 0
 
 
@@ -119,6 +196,27 @@ def _tokenize_query(query: str) -> list[tuple[str, str]]:
             tokens.append(("RPAREN", ch))
             i += 1
             continue
+        if ch == '"':
+            end = query.find('"', i + 1)
+            if end < 0:
+                raise ValueError(f"unterminated phrase at position {i + 1}")
+            words = query[i + 1 : end].split()
+            for word in words:
+                if not TERM_RE.fullmatch(word):
+                    raise ValueError(f"invalid word in phrase at position {i + 1}: '{word}'")
+            if not words:
+                raise ValueError(f"empty phrase at position {i + 1}")
+            tokens.append(("PHRASE", " ".join(word.lower() for word in words)))
+            i = end + 1
+            continue
+
+        near = NEAR_RE.match(query, i)
+        if near:
+            if int(near.group(1)) < 1:
+                raise ValueError(f"NEAR distance must be >= 1 at position {i + 1}")
+            tokens.append(("NEAR", near.group(1)))
+            i = near.end()
+            continue
 
         match = TERM_RE.match(query, i)
         if not match:
@@ -137,16 +235,78 @@ def _tokenize_query(query: str) -> list[tuple[str, str]]:
     return tokens
 
 
+class _TextInvertedIndex:
+    """
+    Текстовый индекс в целочисленном виде: документы пронумерованы в порядке имён,
+    у каждой леммы — возрастающий список номеров. Интерфейс как у BinaryInvertedIndex.
+    """
+
+    def __init__(self, index: dict[str, set[str]], all_docs: set[str]) -> None:
+        self._doc_names = sorted(all_docs)
+        numbers = {name: i for i, name in enumerate(self._doc_names)}
+        self._postings = {term: sorted(numbers[doc] for doc in docs) for term, docs in index.items()}
+        self._sets: dict[str, DocSet] = {}
+
+    @property
+    def document_count(self) -> int:
+        return len(self._doc_names)
+
+    def doc_name(self, number: int) -> str:
+        return self._doc_names[number]
+
+    def doc_names(self, numbers: Iterable[int]) -> list[str]:
+        names = self._doc_names
+        return [names[number] for number in numbers]
+
+    def doc_set(self, term: str) -> DocSet:
+        doc_set = self._sets.get(term)
+        if doc_set is None:
+            doc_set = DocSet.from_sorted(self._postings.get(term, []), len(self._doc_names))
+            self._sets[term] = doc_set
+        return doc_set
+
+    def doc_numbers(self, term: str) -> list[int]:
+        return self._postings.get(term, [])
+
+    def doc_frequency(self, term: str) -> int:
+        return len(self._postings.get(term, ()))
+
+
+# Узлы разобранного запроса: ("TERM", лемма), ("PHRASE", [леммы]), ("NEAR", (k, узел, узел)),
+# ("NOT", узел), ("AND" | "OR", [узлы]).
+_QueryNode = tuple
+
+# Узлы, для которых кроме документов нужны позиции лемм.
+_POSITIONAL = {"PHRASE", "NEAR"}
+
+
+def _query_has_positions(tokens: list[tuple[str, str]]) -> bool:
+    return any(kind in ("PHRASE", "NEAR") for kind, _value in tokens)
+
+
 class _BooleanQueryParser:
+    """
+    Разбирает запрос в дерево и вычисляет его над номерами документов.
+
+    План вычисления AND: сначала пересекаются самые короткие списки (по DF, до
+    декодирования), пустой промежуточный результат прекращает вычисление, а операнды
+    вида NOT B вычитаются из результата — дополнение B при этом не строится.
+
+    Фразы и NEAR сначала заменяются пересечением документов своих лемм; позиции
+    читаются и сливаются только для документов, оставшихся после всех более дешёвых
+    операндов конъюнкции.
+    """
+
     def __init__(
         self,
         tokens: list[tuple[str, str]],
-        index: dict[str, set[str]],
-        all_docs: set[str],
+        index: _TextInvertedIndex | BinaryInvertedIndex,
+        positions: PositionalIndex | None = None,
     ) -> None:
         self.tokens = tokens
         self.index = index
-        self.all_docs = all_docs
+        self.positions = positions
+        self.universe = index.document_count
         self.pos = 0
 
     def _peek(self) -> tuple[str, str] | None:
@@ -167,46 +327,198 @@ class _BooleanQueryParser:
             raise ValueError(f"expected {expected_kind}")
         return token
 
-    def parse(self) -> set[str]:
-        result = self._parse_or()
+    def parse(self) -> DocSet:
+        tree = self._parse_or()
         if self._peek() is not None:
             raise ValueError("unexpected tail in query")
-        return result
+        return self._evaluate(tree)
 
-    def _parse_or(self) -> set[str]:
-        result = self._parse_and()
+    def _parse_or(self) -> _QueryNode:
+        operands = [self._parse_and()]
         while self._accept("OR") is not None:
-            result = result | self._parse_and()
-        return result
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else ("OR", operands)
 
-    def _parse_and(self) -> set[str]:
-        result = self._parse_not()
+    def _parse_and(self) -> _QueryNode:
+        operands = [self._parse_not()]
         while self._accept("AND") is not None:
-            result = result & self._parse_not()
-        return result
+            operands.append(self._parse_not())
+        return operands[0] if len(operands) == 1 else ("AND", operands)
 
-    def _parse_not(self) -> set[str]:
+    def _parse_not(self) -> _QueryNode:
         if self._accept("NOT") is not None:
-            return self.all_docs - self._parse_not()
-        return self._parse_primary()
-
-    def _parse_primary(self) -> set[str]:
+            return ("NOT", self._parse_not())
+        return self._parse_near()
+
+    def _parse_near(self) -> _QueryNode:
+        left = self._parse_primary()
+        while True:
+            near = self._accept("NEAR")
+            if near is None:
+                return left
+            right = self._parse_primary()
+            for operand in (left, right):
+                if operand[0] not in ("TERM", "PHRASE", "NEAR"):
+                    raise ValueError("NEAR operands must be terms or phrases")
+            left = ("NEAR", (int(near[1]), left, right))
+
+    def _parse_primary(self) -> _QueryNode:
         term = self._accept("TERM")
         if term is not None:
             # Индекс по леммам: ищем термин как есть (пользователь вводит лемму)
-            return set(self.index.get(term[1].lower(), set()))
+            return ("TERM", term[1].lower())
+
+        phrase = self._accept("PHRASE")
+        if phrase is not None:
+            words = phrase[1].split()
+            return ("TERM", words[0]) if len(words) == 1 else ("PHRASE", words)
 
         if self._accept("LPAREN") is not None:
             expr = self._parse_or()
             self._expect("RPAREN")
             return expr
 
-        raise ValueError("expected TERM, NOT or '('")
+        raise ValueError("expected TERM, phrase, NOT or '('")
+
+    def _terms(self, node: _QueryNode) -> list[str]:
+        """Леммы фразы или NEAR."""
+        kind = node[0]
+        if kind == "TERM":
+            return [node[1]]
+        if kind == "PHRASE":
+            return node[1]
+        _distance, left, right = node[1]
+        return self._terms(left) + self._terms(right)
+
+    def _estimate(self, node: _QueryNode) -> int:
+        """Оценка размера результата узла без декодирования списков."""
+        kind = node[0]
+        if kind == "TERM":
+            return self.index.doc_frequency(node[1])
+        if kind in _POSITIONAL:
+            return min(self.index.doc_frequency(term) for term in self._terms(node))
+        if kind == "NOT":
+            return self.universe - self._estimate(node[1])
+        sizes = [self._estimate(child) for child in node[1]]
+        return min(sizes) if kind == "AND" else min(self.universe, sum(sizes))
+
+    def _evaluate(self, node: _QueryNode, within: DocSet | None = None) -> DocSet:
+        """Документы узла; для фраз и NEAR позиции проверяются только внутри within."""
+        kind = node[0]
+        if kind == "TERM":
+            return self.index.doc_set(node[1])
+        if kind in _POSITIONAL:
+            candidates = self._candidates(node)
+            if within is not None:
+                candidates = candidates.intersection(within)
+            return self._verify(node, candidates)
+        if kind == "NOT":
+            return self._evaluate(node[1]).complement()
+        if kind == "OR":
+            result = self._evaluate(node[1][0])
+            for child in node[1][1:]:
+                result = result.union(self._evaluate(child))
+            return result
+        return self._evaluate_and(node[1])
+
+    def _evaluate_and(self, operands: list[_QueryNode]) -> DocSet:
+        positive = sorted((child for child in operands if child[0] != "NOT"), key=self._estimate)
+        negative = sorted((child[1] for child in operands if child[0] == "NOT"), key=self._estimate, reverse=True)
+
+        result: DocSet | None = None
+        for child in positive:
+            # Для фраз и NEAR пока берём только документы со всеми их леммами.
+            current = self._candidates(child) if child[0] in _POSITIONAL else self._evaluate(child)
+            result = current if result is None else result.intersection(current)
+            if not len(result):
+                return result
+
+        if result is None:
+            # Одни отрицания: NOT A AND NOT B = NOT (A OR B), дополнение строится один раз.
+            excluded = self._evaluate(negative[0])
+            for child in negative[1:]:
+                excluded = excluded.union(self._evaluate(child))
+            return excluded.complement()
+
+        for child in negative:
+            result = result.difference(self._evaluate(child, within=result))
+            if not len(result):
+                return result
+
+        # Позиции сливаются только для документов, прошедших все остальные операнды.
+        for child in positive:
+            if child[0] in _POSITIONAL:
+                result = self._verify(child, result)
+                if not len(result):
+                    break
+        return result
+
+    def _candidates(self, node: _QueryNode) -> DocSet:
+        """Документы, содержащие все леммы фразы или NEAR (надмножество результата)."""
+        result: DocSet | None = None
+        for term in sorted(set(self._terms(node)), key=self.index.doc_frequency):
+            current = self.index.doc_set(term)
+            result = current if result is None else result.intersection(current)
+            if not len(result):
+                break
+        assert result is not None
+        return result
+
+    def _verify(self, node: _QueryNode, candidates: DocSet) -> DocSet:
+        """Оставляет кандидатов, в которых фраза или NEAR действительно встречается."""
+        if self.positions is None:
+            raise ValueError("phrase and NEAR queries need a positional index (build-index --positions)")
+        matched = [doc for doc in candidates.ids() if self._spans(node, doc)]
+        return DocSet.from_sorted(matched, self.universe)
+
+    def _spans(self, node: _QueryNode, doc: int) -> list[tuple[int, int]]:
+        """Вхождения узла в документ как отрезки позиций (start, end) по возрастанию start."""
+        assert self.positions is not None
+        kind = node[0]
+        if kind == "TERM":
+            return [(position, position) for position in self.positions.positions(node[1], doc)]
+        if kind == "PHRASE":
+            terms = node[1]
+            starts = self.positions.positions(terms[0], doc)
+            for offset, term in enumerate(terms[1:], start=1):
+                if not starts:
+                    break
+                starts = phrase_starts(starts, self.positions.positions(term, doc), offset)
+            return [(start, start + len(terms) - 1) for start in starts]
+        distance, left, right = node[1]
+        left_spans = self._spans(left, doc)
+        if not left_spans:
+            return []
+        return near_spans(left_spans, self._spans(right, doc), distance)
+
+
+def _load_index(index_path: Path) -> _TextInvertedIndex | BinaryInvertedIndex:
+    """Текстовый индекс читается целиком; бинарный (.dict) только отображается в память."""
+    if index_path.is_file() and is_binary_inverted_index(index_path):
+        return BinaryInvertedIndex(index_path)
+    index, all_docs = _read_inverted_index(index_path)
+    return _TextInvertedIndex(index, all_docs)
+
+
+def _load_positional_index(
+    index_path: Path,
+    index: _TextInvertedIndex | BinaryInvertedIndex,
+) -> PositionalIndex:
+    """
+    Позиционный индекс рядом с index_path; нумерация документов должна совпадать, а с
+    бинарным индексом — и идентификатор сборки.
+    """
+    positions = PositionalIndex(positional_index_path(index_path))
+    if isinstance(index, BinaryInvertedIndex) and positions.generation != index.generation:
+        raise ValueError("positional index is from a different build than the binary index (rebuild in progress?)")
+    if positions.doc_name_list() != index.doc_names(range(index.document_count)):
+        raise ValueError("positional index does not match the inverted index (rebuild with build-index --positions)")
+    return positions
 
 
 def search(index_path: Path, query: str | None = None) -> int:
     try:
-        index, all_docs = _read_inverted_index(index_path)
+        index = _load_index(index_path)
     except ValueError as e:
         print(f"search: {e}", file=sys.stderr)
         return 1
@@ -219,8 +531,20 @@ def search(index_path: Path, query: str | None = None) -> int:
 
     try:
         tokens = _tokenize_query(query)
-        parser = _BooleanQueryParser(tokens=tokens, index=index, all_docs=all_docs)
-        docs = sorted(parser.parse())
+    except ValueError as e:
+        print(f"search: invalid query: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        positions = _load_positional_index(index_path, index) if _query_has_positions(tokens) else None
+    except ValueError as e:
+        print(f"search: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        parser = _BooleanQueryParser(tokens=tokens, index=index, positions=positions)
+        # Номера документов упорядочены как имена: выдача уже отсортирована.
+        docs = index.doc_names(parser.parse())
     except ValueError as e:
         print(f"search: invalid query: {e}", file=sys.stderr)
         return 1
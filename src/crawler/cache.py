@@ -0,0 +1,113 @@
+"""Ограниченный по размеру LRU-кэш со статистикой попаданий и необязательным TTL."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterator, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Кэш на OrderedDict: при переполнении вытесняется самый давно использованный ключ.
+
+    С ttl (секунды) запись живёт не дольше ttl с момента put: устаревшая запись при get
+    удаляется и считается промахом. Потокобезопасен; считает попадания и промахи,
+    чтобы по hit_ratio подбирать размер.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl if ttl is not None and ttl > 0 else None
+        self._clock = clock
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._expires: dict[K, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if self.ttl is not None and self._clock() >= self._expires[key]:
+                del self._data[key]
+                del self._expires[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = self._clock() + self.ttl
+            while len(self._data) > self.maxsize:
+                evicted, _value = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+
+    def resize(self, maxsize: int) -> None:
+        """Меняет размер; лишние давно использованные записи вытесняются сразу (0 — очищает кэш)."""
+        with self._lock:
+            self.maxsize = max(0, maxsize)
+            while len(self._data) > self.maxsize:
+                evicted, _value = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+
+    def items(self) -> Iterator[tuple[K, V]]:
+        """Снимок содержимого от давно использованных к недавним (без устаревших записей)."""
+        with self._lock:
+            if self.ttl is None:
+                snapshot = list(self._data.items())
+            else:
+                now = self._clock()
+                snapshot = [(key, value) for key, value in self._data.items() if now < self._expires[key]]
+        return iter(snapshot)
+
+    def clear(self, reset_stats: bool = True) -> None:
+        """Удаляет все записи; с reset_stats=False счётчики попаданий и промахов сохраняются."""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            if reset_stats:
+                self.hits = 0
+                self.misses = 0
+                self.expired = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        stats: dict[str, int | float] = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
+        if self.ttl is not None:
+            stats["ttl"] = self.ttl
+            stats["expired"] = self.expired
+        return stats
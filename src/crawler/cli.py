@@ -2,25 +2,48 @@ import argparse
 import sys
 from pathlib import Path
 
+from .download import DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_MAX_BYTES, DEFAULT_POOL_SIZE
+from .run import DEFAULT_CONCURRENCY, DEFAULT_PER_HOST_LIMIT
+from .storage import DEFAULT_INDEX_FLUSH_EVERY
 from .run import run as run_crawler
 from .validate import validate as validate_crawler
 from .package import package as package_crawler
 from .text_processing import analyze as analyze_text
+from .lemmatizer import DEFAULT_LEMMA_CACHE_SIZE, configure_aspell_pool, configure_lemma_cache
 from .boolean_search import build_index as build_inverted_index
 from .boolean_search import search as search_inverted_index
 from .tfidf import build_tfidf_for_corpus as build_tfidf_corpus
+from .bench import bench_tokenizer
+from .bench_pipeline import ASPELL_AUTO, ASPELL_MODES, bench_pipeline
+from .vector_search import VECTOR_INDEX_V1, VECTOR_INDEX_V2, _vector_index_path
+from .vector_search import VECTOR_BACKEND_NUMPY, VECTOR_BACKEND_PYTHON, VECTOR_BACKENDS
+from .vector_matrix import MATRIX_BACKEND_AVAILABLE
 from .vector_search import build_vector_index as build_vector_search_index
+from .vector_search import convert_vector_index as convert_vector_search_index
 from .vector_search import load_vector_index as load_vector_search_index
+from .vector_search import search_batch as search_batch_in_vector_index
 from .vector_search import search_in_loaded_index as search_in_vector_index
 
 
 def _cmd_run(args: argparse.Namespace) -> int:
     """Подкоманда run: запуск краулера по URL из файла с сохранением в out_dir и индексом."""
+    if args.concurrency < 1:
+        print("run: --concurrency must be >= 1", file=sys.stderr)
+        return 1
     return run_crawler(
         input_path=Path(args.input),
         out_dir=Path(args.out),
         index_path=Path(args.index),
         limit=args.limit,
+        concurrency=args.concurrency,
+        per_host_limit=args.per_host_limit,
+        pool_size=args.pool_size,
+        backoff_base=args.backoff_base,
+        backoff_max=args.backoff_max,
+        fetch_state_path=Path(args.fetch_state) if args.fetch_state else None,
+        refetch=args.refetch,
+        max_bytes=args.max_bytes,
+        index_flush_every=args.index_flush_every,
     )
 
 
@@ -44,10 +67,21 @@ def _cmd_package(args: argparse.Namespace) -> int:
 
 def _cmd_analyze(args: argparse.Namespace) -> int:
     """Подкоманда analyze: токенизация и группировка токенов по леммам."""
+    if args.workers < 1:
+        print("analyze: --workers must be >= 1", file=sys.stderr)
+        return 1
+    configure_lemma_cache(args.lemma_cache_size)
+    configure_aspell_pool(args.workers)
     return analyze_text(
         pages_dir=Path(args.pages),
         tokens_dir=Path(args.tokens),
         lemmas_dir=Path(args.lemmas),
+        lemma_cache_path=Path(args.lemma_cache) if args.lemma_cache else None,
+        workers=args.workers,
+        full=args.full,
+        manifest_path=Path(args.manifest) if args.manifest else None,
+        counts=args.counts,
+        positions=args.positions,
     )
 
 
@@ -56,6 +90,8 @@ def _cmd_build_index(args: argparse.Namespace) -> int:
     return build_inverted_index(
         lemmas_dir=Path(args.lemmas),
         out_path=Path(args.out),
+        binary=args.binary,
+        tokens_dir=Path(args.tokens) if args.positions else None,
     )
 
 
@@ -72,6 +108,9 @@ def _cmd_tfidf(args: argparse.Namespace) -> int:
     tokens_dir = Path(args.tokens)
     lemmas_dir = Path(args.lemmas)
     out_dir = Path(args.out)
+    if args.workers < 1:
+        print("tfidf: --workers must be >= 1", file=sys.stderr)
+        return 1
 
     print(f"tfidf: tokens_dir = {tokens_dir}")
     print(f"tfidf: lemmas_dir = {lemmas_dir}")
@@ -81,6 +120,38 @@ def _cmd_tfidf(args: argparse.Namespace) -> int:
         tokens_dir=tokens_dir,
         lemmas_dir=lemmas_dir,
         out_dir=out_dir,
+        workers=args.workers,
+    )
+
+
+def _cmd_bench_tokenizer(args: argparse.Namespace) -> int:
+    """Подкоманда bench-tokenizer: скорость токенизатора analyze до и после объединения этапов."""
+    return bench_tokenizer(
+        pages_dir=Path(args.pages),
+        repeat=args.repeat,
+    )
+
+
+_VECTOR_INDEX_FORMATS = {"v1": VECTOR_INDEX_V1, "v2": VECTOR_INDEX_V2}
+
+
+def _cmd_bench(args: argparse.Namespace) -> int:
+    """Подкоманда bench: время этапов конвейера и задержки поиска на синтетическом корпусе."""
+    return bench_pipeline(
+        out_path=Path(args.out),
+        docs=args.docs,
+        words=args.words,
+        vocabulary=args.vocabulary,
+        queries=args.queries,
+        top_k=args.top_k,
+        seed=args.seed,
+        workers=args.workers,
+        aspell=args.aspell,
+        backend=args.backend,
+        vector_format=_VECTOR_INDEX_FORMATS[args.format],
+        work_dir=Path(args.work) if args.work else None,
+        baseline_path=Path(args.baseline) if args.baseline else None,
+        trace_memory=args.trace_memory,
     )
 
 
@@ -92,7 +163,11 @@ def _cmd_build_vector_index(args: argparse.Namespace) -> int:
     print(f"build-vector-index: tfidf_dir = {tfidf_dir}")
     print(f"build-vector-index: out_dir   = {out_dir}")
     try:
-        payload = build_vector_search_index(tfidf_dir=tfidf_dir, index_dir=out_dir)
+        payload = build_vector_search_index(
+            tfidf_dir=tfidf_dir,
+            index_dir=out_dir,
+            index_format=_VECTOR_INDEX_FORMATS[args.format],
+        )
     except ValueError as e:
         print(f"build-vector-index: {e}", file=sys.stderr)
         return 1
@@ -101,7 +176,7 @@ def _cmd_build_vector_index(args: argparse.Namespace) -> int:
     idf_map = payload.get("idf_map", {})
     print(f"build-vector-index: indexed documents = {len(doc_vectors) if isinstance(doc_vectors, dict) else 0}")
     print(f"build-vector-index: vocabulary size = {len(idf_map) if isinstance(idf_map, dict) else 0}")
-    print(f"build-vector-index: index file = {out_dir / 'vector_index.json'}")
+    print(f"build-vector-index: index file = {_vector_index_path(out_dir)}")
     return 0
 
 
@@ -144,7 +219,11 @@ def _cmd_vector_index(args: argparse.Namespace) -> int:
     print(f"vector-index: tfidf_dir = {tfidf_dir}")
     print(f"vector-index: out_dir   = {out_dir}")
     try:
-        payload = build_vector_search_index(tfidf_dir=tfidf_dir, index_dir=out_dir)
+        payload = build_vector_search_index(
+            tfidf_dir=tfidf_dir,
+            index_dir=out_dir,
+            index_format=_VECTOR_INDEX_FORMATS[args.format],
+        )
     except ValueError as e:
         print(f"vector-index: {e}", file=sys.stderr)
         return 1
@@ -153,7 +232,23 @@ def _cmd_vector_index(args: argparse.Namespace) -> int:
     idf_map = payload.get("idf_map", {})
     print(f"vector-index: indexed documents = {len(doc_vectors) if isinstance(doc_vectors, dict) else 0}")
     print(f"vector-index: vocabulary size = {len(idf_map) if isinstance(idf_map, dict) else 0}")
-    print(f"vector-index: index file = {out_dir / 'vector_index.json'}")
+    print(f"vector-index: index file = {_vector_index_path(out_dir)}")
+    return 0
+
+
+def _cmd_vector_index_convert(args: argparse.Namespace) -> int:
+    """Подкоманда vector-index-convert: перевод vector_index.json (v1) в vector_index.bin (v2)."""
+    index_dir = Path(args.index_dir)
+    try:
+        target_path = convert_vector_search_index(index_dir=index_dir)
+    except FileNotFoundError as e:
+        print(f"vector-index-convert: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"vector-index-convert: {e}", file=sys.stderr)
+        return 1
+
+    print(f"vector-index-convert: index file = {target_path}")
     return 0
 
 
@@ -163,6 +258,13 @@ def _cmd_vector_search(args: argparse.Namespace) -> int:
     corpus_index_path = Path(args.index)
     query = args.query
     top_k = args.top
+    backend = args.backend
+    if (query is None) == (args.queries_file is None):
+        print("vector-search: pass either a query or --queries-file", file=sys.stderr)
+        return 1
+    if backend == VECTOR_BACKEND_NUMPY and not MATRIX_BACKEND_AVAILABLE:
+        print("vector-search: numpy/scipy are not installed, using the python backend", file=sys.stderr)
+        backend = VECTOR_BACKEND_PYTHON
 
     try:
         vector_index = load_vector_search_index(index_dir=index_dir)
@@ -176,8 +278,17 @@ def _cmd_vector_search(args: argparse.Namespace) -> int:
         print(f"vector-search: {e}", file=sys.stderr)
         return 1
 
+    if args.queries_file is not None:
+        return _vector_search_batch(Path(args.queries_file), top_k, vector_index, corpus_index_path, backend)
+
     try:
-        results = search_in_vector_index(query=query, top_k=top_k, vector_index=vector_index)
+        results = search_in_vector_index(
+            query=query,
+            top_k=top_k,
+            vector_index=vector_index,
+            exhaustive=args.exhaustive,
+            backend=backend,
+        )
     except ValueError as e:
         print(f"vector-search: {e}", file=sys.stderr)
         return 1
@@ -194,8 +305,56 @@ def _cmd_vector_search(args: argparse.Namespace) -> int:
     return 0
 
 
+def _vector_search_batch(
+    queries_path: Path,
+    top_k: int,
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+    corpus_index_path: Path,
+    backend: str,
+) -> int:
+    """
+    vector-search --queries-file: запросы по одному в строке, пустые строки пропускаются.
+
+    Вывод: "<номер строки> <doc_id> <score> <url>" на каждый документ выдачи; ошибки
+    отдельных запросов печатаются в stderr, и команда завершается с кодом 1.
+    """
+    if not queries_path.is_file():
+        print(f"vector-search: queries file not found: {queries_path}", file=sys.stderr)
+        return 1
+    numbered = [
+        (line_number, line.strip())
+        for line_number, line in enumerate(queries_path.read_text(encoding="utf-8").splitlines(), start=1)
+        if line.strip()
+    ]
+
+    try:
+        batch = search_batch_in_vector_index(
+            [query for _line_number, query in numbered],
+            top_k=top_k,
+            vector_index=vector_index,
+            backend=backend,
+        )
+        url_map = _read_url_index(corpus_index_path)
+    except ValueError as e:
+        print(f"vector-search: {e}", file=sys.stderr)
+        return 1
+
+    failed = 0
+    for (line_number, _query), (results, error) in zip(numbered, batch):
+        if error is not None:
+            print(f"vector-search: line {line_number}: {error}", file=sys.stderr)
+            failed += 1
+            continue
+        for doc_id, score in results:
+            print(f"{line_number} {doc_id} {score:.6f} {url_map.get(doc_id, '')}")
+    return 1 if failed else 0
+
+
 def _build_parser() -> argparse.ArgumentParser:
-    """Собирает парсер с подкомандами run, validate, package, analyze, build-index, search, tfidf, build-vector-index, vector-index, vector-search."""
+    """
+    Собирает парсер с подкомандами run, validate, package, analyze, build-index, search, tfidf,
+    build-vector-index, vector-index, vector-index-convert, vector-search, bench-tokenizer, bench.
+    """
     parser = argparse.ArgumentParser(
         prog="crawler",
         description="CLI для краулера.",
@@ -207,6 +366,58 @@ def _build_parser() -> argparse.ArgumentParser:
     run_parser.add_argument("--out", required=True, help="каталог для сохранения страниц (0001.html, …)")
     run_parser.add_argument("--index", required=True, help="файл индекса (filename<TAB>url)")
     run_parser.add_argument("--limit", type=int, default=100, help="нужное число успешных скачиваний (по умолчанию: 100)")
+    run_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"число одновременных запросов; больше 1 — асинхронная загрузка через aiohttp (по умолчанию: {DEFAULT_CONCURRENCY})",
+    )
+    run_parser.add_argument(
+        "--per-host-limit",
+        type=int,
+        default=DEFAULT_PER_HOST_LIMIT,
+        help=f"максимум одновременных соединений с одним хостом, 0 — без ограничения (по умолчанию: {DEFAULT_PER_HOST_LIMIT})",
+    )
+    run_parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f"размер пула keep-alive соединений на хост в последовательном режиме (по умолчанию: {DEFAULT_POOL_SIZE})",
+    )
+    run_parser.add_argument(
+        "--backoff-base",
+        type=float,
+        default=DEFAULT_BACKOFF_BASE,
+        help=f"пауза после первой неудачной попытки, секунды; дальше удваивается со случайным разбросом (по умолчанию: {DEFAULT_BACKOFF_BASE})",
+    )
+    run_parser.add_argument(
+        "--backoff-max",
+        type=float,
+        default=DEFAULT_BACKOFF_MAX,
+        help=f"максимальная пауза между попытками и предельный Retry-After, секунды (по умолчанию: {DEFAULT_BACKOFF_MAX})",
+    )
+    run_parser.add_argument(
+        "--fetch-state",
+        default=None,
+        help="файл состояния загрузок (ETag, Last-Modified, хэши страниц); по умолчанию fetch_state.json рядом с --index",
+    )
+    run_parser.add_argument(
+        "--refetch",
+        action="store_true",
+        help="скачать все страницы заново без условных запросов (If-None-Match / If-Modified-Since)",
+    )
+    run_parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help=f"предельный размер страницы в байтах, большие ответы обрываются и пропускаются (по умолчанию: {DEFAULT_MAX_BYTES})",
+    )
+    run_parser.add_argument(
+        "--index-flush-every",
+        type=int,
+        default=DEFAULT_INDEX_FLUSH_EVERY,
+        help=f"сбрасывать строки index.txt на диск каждые K страниц (по умолчанию: {DEFAULT_INDEX_FLUSH_EVERY})",
+    )
     validate_parser = subparsers.add_parser("validate", help="проверить индекс и страницы")
     validate_parser.add_argument("--pages", required=True, help="каталог со страницами (0001.html, …)")
     validate_parser.add_argument("--index", required=True, help="файл индекса (filename<TAB>url)")
@@ -227,6 +438,43 @@ def _build_parser() -> argparse.ArgumentParser:
         required=True,
         help="каталог для лемм по страницам (файлы вида 0001_lemmas.txt)",
     )
+    analyze_parser.add_argument(
+        "--lemma-cache",
+        default=None,
+        help="файл кэша токен -> лемма между запусками (строки токен<TAB>лемма); по умолчанию кэш только в памяти",
+    )
+    analyze_parser.add_argument(
+        "--lemma-cache-size",
+        type=int,
+        default=DEFAULT_LEMMA_CACHE_SIZE,
+        help=f"максимальное число записей LRU-кэша лемм, 0 — без кэша (по умолчанию: {DEFAULT_LEMMA_CACHE_SIZE})",
+    )
+    analyze_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="число процессов для разбора HTML и процессов aspell (по умолчанию: 1 — последовательно)",
+    )
+    analyze_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="пересчитать все страницы, не глядя в манифест прошлого прогона",
+    )
+    analyze_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="файл манифеста инкрементального прогона (по умолчанию: analyze_manifest.json рядом с --tokens)",
+    )
+    analyze_parser.add_argument(
+        "--counts",
+        action="store_true",
+        help="дополнительно писать число вхождений токенов (файлы вида 0001_counts.txt в каталоге --tokens)",
+    )
+    analyze_parser.add_argument(
+        "--positions",
+        action="store_true",
+        help="писать в 0001_counts.txt ещё и позиции токенов (включает --counts)",
+    )
     build_index_parser = subparsers.add_parser("build-index", help="построить инвертированный индекс по леммам")
     build_index_parser.add_argument(
         "--lemmas",
@@ -238,8 +486,27 @@ def _build_parser() -> argparse.ArgumentParser:
         required=True,
         help="выходной TXT с инвертированным индексом (лемма -> документы)",
     )
+    build_index_parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="дополнительно записать бинарный индекс для mmap (<out>.dict и <out>.postings)",
+    )
+    build_index_parser.add_argument(
+        "--positions",
+        action="store_true",
+        help="дополнительно записать позиционный индекс <out>.positions для фраз и NEAR (нужен analyze --positions)",
+    )
+    build_index_parser.add_argument(
+        "--tokens",
+        default="output/tokens",
+        help="каталог с файлами 0001_counts.txt для --positions (по умолчанию: output/tokens)",
+    )
     search_parser = subparsers.add_parser("search", help="выполнить булев поиск по инвертированному индексу")
-    search_parser.add_argument("--index", required=True, help="файл инвертированного индекса")
+    search_parser.add_argument(
+        "--index",
+        required=True,
+        help="файл инвертированного индекса: текстовый (inverted_index.txt) или бинарный (inverted_index.dict)",
+    )
     search_parser.add_argument(
         "--query",
         required=False,
@@ -265,6 +532,12 @@ def _build_parser() -> argparse.ArgumentParser:
         default="output/tfidf",
         help="каталог для TF-IDF файлов (tfidf_terms_<id>.txt, tfidf_lemmas_<id>.txt, по умолчанию: output/tfidf)",
     )
+    tfidf_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="число процессов для записи файлов TF-IDF (по умолчанию: 1 — последовательно)",
+    )
 
     vector_index_parser = subparsers.add_parser(
         "build-vector-index",
@@ -280,6 +553,12 @@ def _build_parser() -> argparse.ArgumentParser:
         default="output/vector_index",
         help="каталог для сохранения векторного индекса (по умолчанию: output/vector_index)",
     )
+    vector_index_parser.add_argument(
+        "--format",
+        choices=sorted(_VECTOR_INDEX_FORMATS),
+        default="v1",
+        help="формат индекса: v1 — JSON (vector_index.json), v2 — бинарный для mmap (vector_index.bin); по умолчанию: v1",
+    )
 
     vector_index_alias_parser = subparsers.add_parser(
         "vector-index",
@@ -295,6 +574,22 @@ def _build_parser() -> argparse.ArgumentParser:
         default="output/vector_index",
         help="каталог для сохранения векторного индекса (по умолчанию: output/vector_index)",
     )
+    vector_index_alias_parser.add_argument(
+        "--format",
+        choices=sorted(_VECTOR_INDEX_FORMATS),
+        default="v1",
+        help="формат индекса: v1 — JSON (vector_index.json), v2 — бинарный для mmap (vector_index.bin); по умолчанию: v1",
+    )
+
+    vector_index_convert_parser = subparsers.add_parser(
+        "vector-index-convert",
+        help="перевести векторный индекс из JSON (v1) в бинарный формат (v2)",
+    )
+    vector_index_convert_parser.add_argument(
+        "--index-dir",
+        default="output/vector_index",
+        help="каталог с vector_index.json; рядом будет записан vector_index.bin (по умолчанию: output/vector_index)",
+    )
 
     vector_search_parser = subparsers.add_parser(
         "vector-search",
@@ -302,7 +597,12 @@ def _build_parser() -> argparse.ArgumentParser:
     )
     vector_search_parser.add_argument(
         "query",
-        help="текстовый поисковый запрос",
+        nargs="?",
+        help="текстовый поисковый запрос (или --queries-file)",
+    )
+    vector_search_parser.add_argument(
+        "--queries-file",
+        help="файл с запросами по одному в строке: все запросы ищутся одной пачкой",
     )
     vector_search_parser.add_argument(
         "--top",
@@ -320,6 +620,106 @@ def _build_parser() -> argparse.ArgumentParser:
         default="output/index.txt",
         help="путь к index.txt (filename<TAB>url, по умолчанию: output/index.txt)",
     )
+    vector_search_parser.add_argument(
+        "--exhaustive",
+        action="store_true",
+        help="считать score всех документов без отсечения MaxScore (для сравнения, выдача совпадает)",
+    )
+    vector_search_parser.add_argument(
+        "--backend",
+        choices=VECTOR_BACKENDS,
+        default=VECTOR_BACKEND_PYTHON,
+        help="python — списки документов в чистом Python; numpy — разреженная матрица NumPy/SciPy "
+        "(без них — python; выдача совпадает, по умолчанию: python)",
+    )
+
+    bench_tokenizer_parser = subparsers.add_parser(
+        "bench-tokenizer",
+        help="сравнить скорость прежнего и текущего токенизатора на сохранённых страницах",
+    )
+    bench_tokenizer_parser.add_argument(
+        "--pages",
+        default="output/pages",
+        help="каталог со страницами (по умолчанию: output/pages)",
+    )
+    bench_tokenizer_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="число прогонов, берётся лучший (по умолчанию: 3)",
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="прогнать analyze, tfidf, индексы и поиск на синтетическом корпусе и записать замеры в JSON",
+    )
+    bench_parser.add_argument("--docs", type=int, default=1000, help="число страниц корпуса (по умолчанию: 1000)")
+    bench_parser.add_argument(
+        "--words",
+        type=int,
+        default=300,
+        help="среднее число слов на странице (по умолчанию: 300)",
+    )
+    bench_parser.add_argument(
+        "--vocabulary",
+        type=int,
+        default=20000,
+        help="число основ слов в словаре корпуса (по умолчанию: 20000)",
+    )
+    bench_parser.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="число булевых и векторных запросов для перцентилей (по умолчанию: 200)",
+    )
+    bench_parser.add_argument("--top-k", type=int, default=10, help="top-K векторного поиска (по умолчанию: 10)")
+    bench_parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="seed генератора корпуса и запросов (по умолчанию: 42)",
+    )
+    bench_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="--workers для analyze и tfidf (по умолчанию: 1)",
+    )
+    bench_parser.add_argument(
+        "--aspell",
+        choices=ASPELL_MODES,
+        default=ASPELL_AUTO,
+        help="system — установленный aspell, stub — заглушка без словаря, auto — aspell, если он есть "
+        "(по умолчанию: auto)",
+    )
+    bench_parser.add_argument(
+        "--backend",
+        choices=VECTOR_BACKENDS,
+        default=VECTOR_BACKEND_PYTHON,
+        help="backend векторного поиска (по умолчанию: python)",
+    )
+    bench_parser.add_argument(
+        "--format",
+        choices=sorted(_VECTOR_INDEX_FORMATS),
+        default="v2",
+        help="формат векторного индекса (по умолчанию: v2)",
+    )
+    bench_parser.add_argument(
+        "--work",
+        default=None,
+        help="каталог для корпуса и артефактов (по умолчанию: временный, удаляется после прогона)",
+    )
+    bench_parser.add_argument(
+        "--out",
+        default="output/bench/results.json",
+        help="файл результатов JSON (по умолчанию: output/bench/results.json)",
+    )
+    bench_parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    bench_parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="мерить пик памяти этапов через tracemalloc (время этапов при этом завышено)",
+    )
 
     return parser
 
@@ -342,7 +742,10 @@ def main() -> int:
         "tfidf": _cmd_tfidf,
         "build-vector-index": _cmd_build_vector_index,
         "vector-index": _cmd_vector_index,
+        "vector-index-convert": _cmd_vector_index_convert,
         "vector-search": _cmd_vector_search,
+        "bench-tokenizer": _cmd_bench_tokenizer,
+        "bench": _cmd_bench,
     }
     handler = handlers[args.command]
     return handler(args)
@@ -1,41 +1,443 @@
-from typing import Optional
+import asyncio
+import codecs
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
 
+import aiohttp
+import chardet
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, RequestException
 
+# Размер пула keep-alive соединений общей сессии (на хост).
+DEFAULT_POOL_SIZE = 10
+# Экспоненциальная пауза между попытками: случайная в [0, min(max, base * 2^attempt)].
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
 
-def download_html(url: str, timeout: float, retries: int) -> str:
+# Статусы, после которых сервер просит подождать и может прислать Retry-After.
+_THROTTLE_STATUSES = {429, 503}
+
+# Предельный размер тела ответа: страницы больше считаем мусором (архивы, дампы).
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+# Content-Type, которые сохраняем как HTML. Ответ без Content-Type тоже принимаем.
+_HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+_CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+# Сколько байт начала документа смотреть в поисках <meta charset> и отдавать chardet.
+_SNIFF_BYTES = 4096
+_DETECT_BYTES = 64 * 1024
+
+
+class PageRejectedError(Exception):
+    """Ответ получен, но страницу сохранять нельзя (не HTML или слишком большая); не повторяется."""
+
+
+def _check_content_type(url: str, content_type: str | None) -> None:
+    if not content_type:
+        return
+    mime = content_type.split(";", 1)[0].strip().lower()
+    if mime and mime not in _HTML_CONTENT_TYPES:
+        raise PageRejectedError(f"Unsupported Content-Type {mime!r} at {url}")
+
+
+def _check_content_length(url: str, content_length: str | None, max_bytes: int) -> None:
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise PageRejectedError(f"Response at {url} is {content_length} bytes, limit is {max_bytes}")
+
+
+def _append_chunk(url: str, body: bytearray, chunk: bytes, max_bytes: int) -> None:
+    body += chunk
+    if len(body) > max_bytes:
+        raise PageRejectedError(f"Response at {url} exceeds {max_bytes} bytes")
+
+
+def _known_codec(name: str | None) -> str | None:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def decode_html(body: bytes, content_type: str | None) -> str:
+    """
+    Декодирует тело страницы.
+
+    Порядок: charset из Content-Type, BOM, <meta charset> в начале документа,
+    строгий UTF-8. chardet вызывается только если всё это не дало ответа.
+    """
+    match = _CHARSET_RE.search(content_type or "")
+    encoding = _known_codec(match.group(1)) if match else None
+    if encoding is None:
+        for bom, name in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+            if body.startswith(bom):
+                encoding = name
+                break
+    if encoding is None:
+        meta = _META_CHARSET_RE.search(body[:_SNIFF_BYTES])
+        encoding = _known_codec(meta.group(1).decode("ascii")) if meta else None
+    if encoding is None:
+        try:
+            return body.decode("utf-8")
+        except UnicodeDecodeError:
+            encoding = _known_codec(chardet.detect(body[:_DETECT_BYTES]).get("encoding")) or "utf-8"
+    return body.decode(encoding, errors="replace")
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def make_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Создаёт сессию requests с пулом keep-alive соединений.
+
+    Повторы делает сам download_html (с паузами), поэтому у адаптера max_retries=0.
+
+    Args:
+        pool_size: Сколько соединений держать открытыми на один хост.
+
+    Returns:
+        Новая сессия.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Общая на процесс сессия: соединения с одним хостом переиспользуются между страницами."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF_BASE, cap: float = DEFAULT_BACKOFF_MAX) -> float:
+    """
+    Пауза перед повтором номер attempt + 1 (full jitter).
+
+    Args:
+        attempt: Номер неудачной попытки, с нуля.
+        base: Пауза первой попытки в секундах.
+        cap: Верхняя граница паузы.
+
+    Returns:
+        Случайная пауза из [0, min(cap, base * 2^attempt)].
+    """
+    return random.uniform(0.0, min(cap, base * (2**attempt)))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Разбирает заголовок Retry-After: число секунд или HTTP-дата.
+
+    Returns:
+        Пауза в секундах (не меньше 0) или None, если заголовка нет или он некорректен.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_delay(
+    status: int | None,
+    headers: Mapping[str, str] | None,
+    attempt: int,
+    backoff_base: float,
+    backoff_max: float,
+) -> float | None:
+    """
+    Пауза перед следующей попыткой или None, если повторять бессмысленно.
+
+    На 429/503 с Retry-After ждём столько, сколько просит сервер; если он просит
+    больше backoff_max, не тратим попытки и сразу сдаёмся.
+    """
+    if status in _THROTTLE_STATUSES and headers is not None:
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after if retry_after <= backoff_max else None
+    return backoff_delay(attempt, backoff_base, backoff_max)
+
+
+class FetchResult:
+    """Результат загрузки: текст страницы (None, если сервер ответил 304) и валидаторы кэша."""
+
+    __slots__ = ("html", "etag", "last_modified")
+
+    def __init__(self, html: str | None, etag: str | None, last_modified: str | None) -> None:
+        self.html = html
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self) -> bool:
+        return self.html is None
+
+
+def _conditional_headers(etag: str | None, last_modified: str | None) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def download_html(
+    url: str,
+    timeout: float,
+    retries: int,
+    session: requests.Session | None = None,
+    backoff_base: float = DEFAULT_BACKOFF_BASE,
+    backoff_max: float = DEFAULT_BACKOFF_MAX,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> str:
     """
     Загружает страницу по URL и возвращает её HTML-текст.
+
+    Запросы идут через сессию с пулом соединений. Ответы 5xx, 429 и сетевые ошибки
+    повторяются с экспоненциальной паузой со случайным разбросом; на 429/503 пауза
+    берётся из Retry-After.
+
+    Тело читается потоково, кусками: ответ не HTML или больше max_bytes обрывается
+    сразу (PageRejectedError). Кодировка — из заголовков или документа, chardet
+    только если она там не указана и текст не UTF-8.
+
+    Args:
+        url: URL страницы для загрузки.
+        timeout: Таймаут запроса в секундах.
+        retries: Сколько раз повторять запрос при неудаче.
+        session: Сессия requests; по умолчанию общая (get_session()).
+        backoff_base: Пауза после первой неудачи (верхняя граница), секунды.
+        backoff_max: Максимальная пауза между попытками, секунды.
+        max_bytes: Предельный размер тела ответа в байтах.
+
+    Returns:
+        Текст страницы.
+
+    Raises:
+        Exception: Если после всех попыток загрузка не удалась.
+    """
+    result = fetch_html(
+        url,
+        timeout,
+        retries,
+        session=session,
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+        max_bytes=max_bytes,
+    )
+    assert result.html is not None
+    return result.html
+
+
+def fetch_html(
+    url: str,
+    timeout: float,
+    retries: int,
+    session: requests.Session | None = None,
+    backoff_base: float = DEFAULT_BACKOFF_BASE,
+    backoff_max: float = DEFAULT_BACKOFF_MAX,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> FetchResult:
+    """
+    Как download_html, но с условным запросом и валидаторами кэша в результате.
+
     Args:
         url: URL страницы для загрузки.
         timeout: Таймаут запроса в секундах.
         retries: Сколько раз повторять запрос при неудаче.
+        session: Сессия requests; по умолчанию общая (get_session()).
+        backoff_base: Пауза после первой неудачи (верхняя граница), секунды.
+        backoff_max: Максимальная пауза между попытками, секунды.
+        etag: ETag прошлой загрузки (If-None-Match).
+        last_modified: Last-Modified прошлой загрузки (If-Modified-Since).
+        max_bytes: Предельный размер тела ответа в байтах.
 
     Returns:
-        Текст ответа (response.text).
+        FetchResult; при ответе 304 Not Modified html равен None.
 
     Raises:
+        PageRejectedError: Ответ не HTML или больше max_bytes.
         Exception: Если после всех попыток загрузка не удалась.
     """
+    http = session if session is not None else get_session()
+    headers = _conditional_headers(etag, last_modified)
     last_error: Optional[Exception] = None
     attempts = retries + 1
 
     for attempt in range(attempts):
         try:
-            response = requests.get(url, timeout=timeout)
-            if response.status_code >= 500:
-                last_error = Exception(
-                    f"HTTP {response.status_code} at {url} (attempt {attempt + 1}/{attempts})"
-                )
-                continue
-            response.raise_for_status()
-            return response.text
+            with http.get(url, timeout=timeout, headers=headers, stream=True) as response:
+                if response.status_code >= 500 or response.status_code == 429:
+                    last_error = Exception(
+                        f"HTTP {response.status_code} at {url} (attempt {attempt + 1}/{attempts})"
+                    )
+                    delay = _retry_delay(response.status_code, response.headers, attempt, backoff_base, backoff_max)
+                else:
+                    response.raise_for_status()
+                    validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    if response.status_code == 304 and headers:
+                        return FetchResult(None, validators[0] or etag, validators[1] or last_modified)
+                    content_type = response.headers.get("Content-Type")
+                    _check_content_type(url, content_type)
+                    _check_content_length(url, response.headers.get("Content-Length"), max_bytes)
+                    body = bytearray()
+                    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                        _append_chunk(url, body, chunk, max_bytes)
+                    return FetchResult(decode_html(bytes(body), content_type), *validators)
         except RequestException as e:
             if isinstance(e, HTTPError) and e.response is not None and e.response.status_code < 500:
                 raise
             last_error = e
-            continue
+            delay = _retry_delay(None, None, attempt, backoff_base, backoff_max)
+
+        if attempt + 1 < attempts:
+            if delay is None:
+                break
+            time.sleep(delay)
+
+    msg = f"Failed to download {url} after {attempts} attempt(s)"
+    if last_error is not None:
+        msg += f": {last_error}"
+    raise Exception(msg)
+
+
+async def download_html_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: float,
+    retries: int,
+    backoff_base: float = DEFAULT_BACKOFF_BASE,
+    backoff_max: float = DEFAULT_BACKOFF_MAX,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> str:
+    """
+    Асинхронный вариант download_html поверх общей aiohttp-сессии.
+
+    Правила те же: ответы 5xx, 429 и сетевые ошибки повторяются с паузой
+    (Retry-After на 429/503), остальные 4xx — сразу ошибка.
+    Соединения переиспользуются пулом сессии (TCPConnector).
+
+    Args:
+        session: Сессия aiohttp с настроенными лимитами соединений.
+        url: URL страницы для загрузки.
+        timeout: Таймаут запроса в секундах.
+        retries: Сколько раз повторять запрос при неудаче.
+        backoff_base: Пауза после первой неудачи (верхняя граница), секунды.
+        backoff_max: Максимальная пауза между попытками, секунды.
+        max_bytes: Предельный размер тела ответа в байтах.
+
+    Returns:
+        Текст страницы.
+
+    Raises:
+        Exception: Если после всех попыток загрузка не удалась.
+    """
+    result = await fetch_html_async(
+        session, url, timeout, retries, backoff_base=backoff_base, backoff_max=backoff_max, max_bytes=max_bytes
+    )
+    assert result.html is not None
+    return result.html
+
+
+async def fetch_html_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: float,
+    retries: int,
+    backoff_base: float = DEFAULT_BACKOFF_BASE,
+    backoff_max: float = DEFAULT_BACKOFF_MAX,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> FetchResult:
+    """
+    Асинхронный вариант fetch_html (условный запрос, валидаторы кэша в результате).
+
+    Args:
+        session: Сессия aiohttp с настроенными лимитами соединений.
+        url: URL страницы для загрузки.
+        timeout: Таймаут подключения и каждого чтения в секундах (как у requests в fetch_html).
+        retries: Сколько раз повторять запрос при неудаче.
+        backoff_base: Пауза после первой неудачи (верхняя граница), секунды.
+        backoff_max: Максимальная пауза между попытками, секунды.
+        etag: ETag прошлой загрузки (If-None-Match).
+        last_modified: Last-Modified прошлой загрузки (If-Modified-Since).
+        max_bytes: Предельный размер тела ответа в байтах.
+
+    Returns:
+        FetchResult; при ответе 304 Not Modified html равен None.
+
+    Raises:
+        PageRejectedError: Ответ не HTML или больше max_bytes.
+        Exception: Если после всех попыток загрузка не удалась.
+    """
+    headers = _conditional_headers(etag, last_modified)
+    last_error: Optional[Exception] = None
+    attempts = retries + 1
+    # Как у requests: таймаут на соединение и на каждое чтение, а не на весь запрос. total
+    # учитывал бы и ожидание свободного соединения в пуле коннектора, где при скользящем
+    # окне run._run_concurrent часть запросов стоит в очереди, и загрузку длинного тела.
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    for attempt in range(attempts):
+        try:
+            async with session.get(url, timeout=client_timeout, headers=headers) as response:
+                if response.status >= 500 or response.status == 429:
+                    last_error = Exception(
+                        f"HTTP {response.status} at {url} (attempt {attempt + 1}/{attempts})"
+                    )
+                    delay = _retry_delay(response.status, response.headers, attempt, backoff_base, backoff_max)
+                else:
+                    response.raise_for_status()
+                    validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    if response.status == 304 and headers:
+                        return FetchResult(None, validators[0] or etag, validators[1] or last_modified)
+                    content_type = response.headers.get("Content-Type")
+                    _check_content_type(url, content_type)
+                    _check_content_length(url, response.headers.get("Content-Length"), max_bytes)
+                    body = bytearray()
+                    async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                        _append_chunk(url, body, chunk, max_bytes)
+                    return FetchResult(decode_html(bytes(body), content_type), *validators)
+        except aiohttp.ClientResponseError as e:
+            if e.status < 500:
+                raise
+            last_error = e
+            delay = _retry_delay(None, None, attempt, backoff_base, backoff_max)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_error = e
+            delay = _retry_delay(None, None, attempt, backoff_base, backoff_max)
+
+        if attempt + 1 < attempts:
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
 
     msg = f"Failed to download {url} after {attempts} attempt(s)"
     if last_error is not None:
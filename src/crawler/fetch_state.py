@@ -0,0 +1,78 @@
+"""
+Состояние загрузок между запусками краулера (fetch_state.json рядом с index.txt).
+
+Для каждого URL хранятся ETag и Last-Modified последнего ответа, SHA-256 сохранённого
+HTML, время загрузки и имя файла. По ним повторный run отправляет условные запросы
+и не переписывает файлы страниц, содержимое которых не изменилось.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+FETCH_STATE_FORMAT = "fetch-state-v1"
+FETCH_STATE_FILENAME = "fetch_state.json"
+
+
+def default_fetch_state_path(index_path: Path) -> Path:
+    """Состояние лежит рядом с индексом (output/fetch_state.json)."""
+    return index_path.parent / FETCH_STATE_FILENAME
+
+
+def content_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class FetchStateStore:
+    """Записи по URL: etag, last_modified, sha256, fetched_at, filename."""
+
+    def __init__(self) -> None:
+        self.entries: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "FetchStateStore":
+        """Читает состояние; отсутствующий или испорченный файл — пустое состояние."""
+        store = cls()
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return store
+        if not isinstance(payload, dict) or payload.get("format") != FETCH_STATE_FORMAT:
+            return store
+        urls = payload.get("urls")
+        if isinstance(urls, dict):
+            store.entries = {
+                url: entry
+                for url, entry in urls.items()
+                if isinstance(entry, dict) and isinstance(entry.get("sha256"), str) and isinstance(entry.get("filename"), str)
+            }
+        return store
+
+    def get(self, url: str) -> dict[str, Any] | None:
+        return self.entries.get(url)
+
+    def update(self, url: str, etag: str | None, last_modified: str | None, sha256: str, filename: str) -> None:
+        self.entries[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": sha256,
+            "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "filename": filename,
+        }
+
+    def retain(self, urls: list[str]) -> None:
+        """Забывает URL, которых больше нет во входном списке."""
+        keep = set(urls)
+        self.entries = {url: entry for url, entry in self.entries.items() if url in keep}
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "format": FETCH_STATE_FORMAT,
+            "urls": {url: self.entries[url] for url in sorted(self.entries)},
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
@@ -0,0 +1,190 @@
+"""
+Бинарный инвертированный индекс для булева поиска.
+
+Два файла рядом с текстовым inverted_index.txt:
+- inverted_index.dict — словарь: отсортированные леммы (двоичный поиск), DF и байтовые
+  смещения списков в файле postings, плюс таблица имён документов (номер -> "0001.html");
+- inverted_index.postings — списки номеров документов по леммам: редкие — разности
+  в varint, частые (см. postings.is_dense) — битовой картой на все документы.
+
+Оба файла отображаются в память через mmap: запрос декодирует только списки своих лемм.
+Файлы подменяются по отдельности, поэтому в заголовке каждого записан идентификатор
+сборки: словарь и postings из разных сборок (поиск во время пересборки) не открываются.
+"""
+
+import struct
+from array import array
+from pathlib import Path
+from typing import Iterable
+
+from .binary_format import (
+    SectionWriter,
+    StringTable,
+    check_byte_order,
+    decode_varint_deltas,
+    encode_varint_deltas,
+    map_file,
+    new_generation,
+    pack_string_table,
+    section,
+)
+from .postings import DocSet, is_dense
+
+BINARY_DICT_SUFFIX = ".dict"
+BINARY_POSTINGS_SUFFIX = ".postings"
+
+_DICT_MAGIC = b"INVIDX03"
+_POSTINGS_MAGIC = b"INVPST03"
+# Общий префикс сигнатур всех версий словаря: прежнюю версию не читаем как текстовый индекс.
+_DICT_MAGIC_PREFIX = b"INVIDX"
+_SECTIONS = ("term_offsets", "term_blob", "doc_freq", "postings_offsets", "doc_offsets", "doc_blob")
+# magic, n_terms, n_docs, generation, затем (offset, length) на каждую секцию.
+_HEADER = struct.Struct("<8sIIQ" + "QQ" * len(_SECTIONS))
+# magic, generation; дальше списки документов.
+_POSTINGS_HEADER = struct.Struct("<8sQ")
+
+
+def binary_index_paths(out_path: Path) -> tuple[Path, Path]:
+    """Пути словаря и postings для текстового индекса out_path (inverted_index.txt)."""
+    return out_path.with_suffix(BINARY_DICT_SUFFIX), out_path.with_suffix(BINARY_POSTINGS_SUFFIX)
+
+
+def write_binary_inverted_index(
+    dict_path: Path,
+    index: dict[str, set[str]],
+    all_docs: set[str],
+    generation: int | None = None,
+) -> Path:
+    """
+    Сохраняет индекс лемма -> документы в бинарном виде. Возвращает путь к postings.
+
+    Документам присваиваются номера в порядке сортировки имён, поэтому возрастающий
+    список номеров соответствует отсортированному списку имён. generation — идентификатор
+    сборки для заголовков (по умолчанию новый); его же получает позиционный индекс этой сборки.
+    """
+    check_byte_order()
+    if generation is None:
+        generation = new_generation()
+    postings_path = dict_path.with_suffix(BINARY_POSTINGS_SUFFIX)
+    doc_names = sorted(all_docs)
+    doc_numbers = {name: i for i, name in enumerate(doc_names)}
+    terms = sorted(index)
+
+    doc_freq = array("I")
+    postings_offsets = array("Q")
+    postings = bytearray(_POSTINGS_HEADER.pack(_POSTINGS_MAGIC, generation))
+    for term in terms:
+        numbers = sorted(doc_numbers[doc] for doc in index[term])
+        doc_freq.append(len(numbers))
+        postings_offsets.append(len(postings))
+        if is_dense(len(numbers), len(doc_names)):
+            postings += DocSet.from_sorted(numbers, len(doc_names)).to_bitmap()
+        else:
+            postings += encode_varint_deltas(numbers)
+    postings_offsets.append(len(postings))
+
+    term_offsets, term_blob = pack_string_table(terms)
+    doc_offsets, doc_blob = pack_string_table(doc_names)
+
+    writer = SectionWriter(_HEADER.size)
+    placements: list[int] = []
+    for data in (term_offsets, term_blob, doc_freq, postings_offsets, doc_offsets, doc_blob):
+        placements.extend(writer.add(data))
+
+    # Каждый файл подменяется атомарно, но пара — нет: между двумя rename читатель может
+    # увидеть словарь одной сборки и postings другой. Такую пару отвергает проверка generation.
+    postings_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = postings_path.with_suffix(postings_path.suffix + ".tmp")
+    tmp_path.write_bytes(bytes(postings))
+    tmp_path.replace(postings_path)
+    writer.write(dict_path, _HEADER.pack(_DICT_MAGIC, len(terms), len(doc_names), generation, *placements))
+    return postings_path
+
+
+def is_binary_inverted_index(path: Path) -> bool:
+    """Проверяет сигнатуру словаря бинарного индекса."""
+    try:
+        with path.open("rb") as f:
+            return f.read(len(_DICT_MAGIC_PREFIX)) == _DICT_MAGIC_PREFIX
+    except OSError:
+        return False
+
+
+class BinaryInvertedIndex:
+    """Бинарный инвертированный индекс, отображённый в память."""
+
+    def __init__(self, dict_path: Path) -> None:
+        check_byte_order()
+        postings_path = dict_path.with_suffix(BINARY_POSTINGS_SUFFIX)
+        if not postings_path.is_file():
+            raise ValueError(f"postings file not found: {postings_path}")
+
+        view = map_file(dict_path)
+        if len(view) < _HEADER.size:
+            raise ValueError("invalid binary index: file is too short")
+        fields = _HEADER.unpack_from(view, 0)
+        magic, n_terms, n_docs, generation = fields[:4]
+        if magic != _DICT_MAGIC:
+            if magic.startswith(_DICT_MAGIC_PREFIX):
+                raise ValueError("unsupported binary index version (rebuild with build-index --binary)")
+            raise ValueError("invalid binary index format")
+        placements = dict(zip(_SECTIONS, zip(fields[4::2], fields[5::2])))
+        self.generation = generation
+
+        def part(name: str, fmt: str | None = None) -> memoryview:
+            offset, length = placements[name]
+            return section(view, offset, length, fmt)
+
+        self._terms = StringTable(part("term_offsets", "I"), part("term_blob"))
+        self._doc_freq = part("doc_freq", "I")
+        self._postings_offsets = part("postings_offsets", "Q")
+        self._doc_names = StringTable(part("doc_offsets", "I"), part("doc_blob"))
+        self._doc_name_list: list[str] | None = None
+        if len(self._terms) != n_terms or len(self._doc_names) != n_docs:
+            raise ValueError("invalid binary index: section sizes do not match header")
+
+        self._postings = map_file(postings_path)
+        if len(self._postings) < _POSTINGS_HEADER.size:
+            raise ValueError("invalid binary postings format")
+        postings_magic, postings_generation = _POSTINGS_HEADER.unpack_from(self._postings, 0)
+        if postings_magic != _POSTINGS_MAGIC:
+            raise ValueError("invalid binary postings format")
+        if postings_generation != generation:
+            raise ValueError(
+                "binary index files are from different builds (index is being rebuilt? retry the query)"
+            )
+        if n_terms and self._postings_offsets[n_terms] > len(self._postings):
+            raise ValueError("binary postings file is truncated")
+
+    @property
+    def document_count(self) -> int:
+        return len(self._doc_names)
+
+    def doc_name(self, number: int) -> str:
+        return self._doc_names[number]
+
+    def doc_names(self, numbers: Iterable[int]) -> list[str]:
+        """Имена документов по номерам; таблица имён декодируется один раз при первом вызове."""
+        if self._doc_name_list is None:
+            self._doc_name_list = self._doc_names.to_list()
+        names = self._doc_name_list
+        return [names[number] for number in numbers]
+
+    def doc_set(self, term: str) -> DocSet:
+        """Документы леммы (пустое множество, если леммы нет)."""
+        universe = len(self._doc_names)
+        i = self._terms.find(term)
+        if i < 0:
+            return DocSet(universe, ids=[])
+        data = self._postings[self._postings_offsets[i] : self._postings_offsets[i + 1]]
+        if is_dense(self._doc_freq[i], universe):
+            return DocSet.from_bitmap(data, universe)
+        return DocSet(universe, ids=decode_varint_deltas(data))
+
+    def doc_numbers(self, term: str) -> list[int]:
+        """Возрастающий список номеров документов леммы (пустой, если леммы нет)."""
+        return self.doc_set(term).ids()
+
+    def doc_frequency(self, term: str) -> int:
+        i = self._terms.find(term)
+        return self._doc_freq[i] if i >= 0 else 0
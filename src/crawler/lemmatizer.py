@@ -0,0 +1,275 @@
+"""
+Пул долгоживущих процессов aspell в pipe-режиме (aspell -a).
+
+Вместо запуска aspell на каждый вызов держим открытыми один или несколько
+процессов и отправляем им токены построчно. Ответ aspell на каждую входную
+строку — ноль или больше строк-результатов и пустая строка-разделитель,
+по ней и режем поток ответов на группы.
+"""
+
+import atexit
+import os
+import queue
+import subprocess
+import threading
+from pathlib import Path
+
+from .cache import LRUCache
+
+DEFAULT_ASPELL_WORKERS = 1
+DEFAULT_LEMMA_CACHE_SIZE = 200_000
+
+# Сколько строк отправляем aspell до чтения ответов. Ограничение нужно, чтобы
+# aspell не заблокировался на переполненном stdout, пока мы ещё пишем в stdin.
+_PIPE_BATCH = 64
+
+_RESPONSE_PREFIXES = {"*", "+", "&", "#", "-", "?"}
+
+
+class _AspellWorker:
+    """Один процесс `aspell -d <dictionary> -a` с открытыми stdin/stdout."""
+
+    def __init__(self, dictionary: str) -> None:
+        self.dictionary = dictionary
+        self._proc: subprocess.Popen[str] | None = None
+        self._start()
+
+    def _start(self) -> None:
+        try:
+            proc = subprocess.Popen(
+                ["aspell", "-d", self.dictionary, "-a"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+            )
+        except OSError as exc:
+            raise RuntimeError(f"failed to start aspell: {exc}") from exc
+
+        assert proc.stdout is not None
+        header = proc.stdout.readline()
+        if not header.startswith("@(#)"):
+            # Процесс не дошёл до pipe-режима (нет словаря, неверные флаги и т.п.).
+            proc.kill()
+            _out, err = proc.communicate()
+            raise RuntimeError((err or "").strip() or "aspell failed")
+        self._proc = proc
+
+    def close(self) -> None:
+        proc = self._proc
+        self._proc = None
+        if proc is None:
+            return
+        try:
+            if proc.stdin is not None:
+                proc.stdin.close()
+            proc.wait(timeout=1.0)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        for stream in (proc.stdout, proc.stderr):
+            if stream is not None:
+                stream.close()
+
+    def restart(self) -> None:
+        self.close()
+        self._start()
+
+    def check(self, tokens: list[str]) -> list[list[str]]:
+        """Возвращает ответы aspell (строки-результаты) для каждого токена по порядку."""
+        proc = self._proc
+        if proc is None or proc.stdin is None or proc.stdout is None:
+            raise RuntimeError("aspell worker is not running")
+
+        groups: list[list[str]] = []
+        for start in range(0, len(tokens), _PIPE_BATCH):
+            batch = tokens[start : start + _PIPE_BATCH]
+            # "^" экранирует строку: aspell не примет токен за управляющую команду.
+            proc.stdin.write("".join(f"^{token}\n" for token in batch))
+            proc.stdin.flush()
+            for _token in batch:
+                current: list[str] = []
+                while True:
+                    line = proc.stdout.readline()
+                    if line == "":
+                        raise EOFError("aspell closed its output")
+                    line = line.rstrip("\n")
+                    if line == "":
+                        break
+                    if line[0] in _RESPONSE_PREFIXES:
+                        current.append(line.strip())
+                groups.append(current)
+        return groups
+
+
+class AspellPool:
+    """
+    Пул процессов aspell для одного словаря.
+
+    Каждый запрос занимает свободный процесс целиком, поэтому параллельные
+    запросы (например, из потоков WEB-сервера) не перемешивают ответы.
+    Упавший процесс перезапускается, запрос повторяется один раз.
+    После fork() дочерний процесс не трогает процессы родителя и поднимает свои.
+    """
+
+    def __init__(self, dictionary: str = "ru", workers: int = DEFAULT_ASPELL_WORKERS) -> None:
+        self.dictionary = dictionary
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._all: list[_AspellWorker] = []
+        self._idle: queue.Queue[_AspellWorker] = queue.Queue()
+        self.restarts = 0
+
+    def _reset_after_fork(self) -> None:
+        # Пайпы унаследованы от родителя: закрывать их нельзя, просто забываем.
+        self._pid = os.getpid()
+        self._all = []
+        self._idle = queue.Queue()
+
+    def _acquire(self) -> _AspellWorker:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self._all) < self.workers:
+                worker = _AspellWorker(self.dictionary)
+                self._all.append(worker)
+                return worker
+            idle = self._idle
+        return idle.get()
+
+    def _release(self, worker: _AspellWorker) -> None:
+        with self._lock:
+            if worker in self._all:
+                self._idle.put(worker)
+
+    def _discard(self, worker: _AspellWorker) -> None:
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+        worker.close()
+
+    def check(self, tokens: list[str]) -> list[list[str]]:
+        """Прогоняет токены через aspell; результат — группа строк ответа на каждый токен."""
+        if not tokens:
+            return []
+        worker = self._acquire()
+        try:
+            try:
+                groups = worker.check(tokens)
+            except (OSError, EOFError, ValueError):
+                # Процесс упал или пайп сломан: поднимаем заново и повторяем запрос.
+                self.restarts += 1
+                worker.restart()
+                groups = worker.check(tokens)
+        except (OSError, EOFError, ValueError) as exc:
+            self._discard(worker)
+            raise RuntimeError(f"aspell worker failed: {exc}") from exc
+        except BaseException:
+            self._discard(worker)
+            raise
+        self._release(worker)
+        return groups
+
+    def close(self) -> None:
+        with self._lock:
+            workers = self._all if self._pid == os.getpid() else []
+            self._all = []
+            self._idle = queue.Queue()
+        for worker in workers:
+            worker.close()
+
+
+_pools: dict[str, AspellPool] = {}
+_pools_lock = threading.Lock()
+_configured_workers = DEFAULT_ASPELL_WORKERS
+
+
+def configure_aspell_pool(workers: int) -> None:
+    """Задаёт число процессов aspell для пулов, создаваемых после вызова."""
+    global _configured_workers
+    _configured_workers = max(1, workers)
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.workers = _configured_workers
+
+
+def get_aspell_pool(dictionary: str = "ru") -> AspellPool:
+    """Общий на процесс пул aspell для словаря: его используют analyze, поиск и WEB-интерфейс."""
+    with _pools_lock:
+        pool = _pools.get(dictionary)
+        if pool is None:
+            pool = AspellPool(dictionary=dictionary, workers=_configured_workers)
+            _pools[dictionary] = pool
+        return pool
+
+
+def close_aspell_pools() -> None:
+    """Останавливает все процессы aspell текущего процесса."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_aspell_pools)
+
+
+_lemma_caches: dict[str, LRUCache[str, str]] = {}
+_lemma_cache_size = DEFAULT_LEMMA_CACHE_SIZE
+
+
+def configure_lemma_cache(maxsize: int) -> None:
+    """Задаёт размер LRU-кэша токен -> лемма (0 отключает кэш)."""
+    global _lemma_cache_size
+    _lemma_cache_size = max(0, maxsize)
+    with _pools_lock:
+        for cache in _lemma_caches.values():
+            cache.resize(_lemma_cache_size)
+
+
+def get_lemma_cache(dictionary: str = "ru") -> LRUCache[str, str]:
+    """Общий на процесс кэш токен -> лемма для словаря: один и тот же для analyze и поиска."""
+    with _pools_lock:
+        cache = _lemma_caches.get(dictionary)
+        if cache is None:
+            cache = LRUCache(_lemma_cache_size)
+            _lemma_caches[dictionary] = cache
+        return cache
+
+
+def load_lemma_cache(path: Path, dictionary: str = "ru") -> int:
+    """
+    Подгружает кэш с диска (строки "токен<TAB>лемма"). Возвращает число загруженных записей.
+
+    Отсутствующий файл — не ошибка: кэш просто остаётся холодным.
+    """
+    if not path.exists() or not path.is_file():
+        return 0
+    cache = get_lemma_cache(dictionary)
+    loaded = 0
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if "\t" not in line:
+            continue
+        token, lemma = line.split("\t", 1)
+        if token and lemma:
+            cache.put(token, lemma)
+            loaded += 1
+    return loaded
+
+
+def save_lemma_cache(path: Path, dictionary: str = "ru") -> int:
+    """Сохраняет кэш на диск в порядке давности использования. Возвращает число записей."""
+    cache = get_lemma_cache(dictionary)
+    lines = [f"{token}\t{lemma}\n" for token, lemma in cache.items()]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text("".join(lines), encoding="utf-8")
+    tmp_path.replace(path)
+    return len(lines)
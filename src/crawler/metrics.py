@@ -0,0 +1,287 @@
+"""
+Счётчики и гистограммы длительностей этапов поиска в текстовом формате Prometheus.
+
+По умолчанию метрики выключены: time_stage отдаёт общий пустой контекстный менеджер,
+inc и observe сразу возвращаются — на запрос это несколько проверок флага. Включает их
+configure_metrics (WEB-сервер — если не задано METRICS_ENABLED=0).
+
+Значения хранятся в памяти процесса. Несколько процессов (рабочие процессы gunicorn)
+сводятся через общий каталог multiprocess_dir: каждый процесс сохраняет свои значения
+в отдельный файл (фоновый поток — не чаще раза в FLUSH_INTERVAL секунд, и flush_metrics),
+а render_prometheus складывает файлы всех процессов, в том числе своего. Значения других
+процессов отстают не больше чем на FLUSH_INTERVAL, но никогда не убывают между ответами
+разных процессов. Файлы завершившихся процессов остаются, поэтому счётчики не убывают и при
+перезапуске рабочих процессов. После fork дочерний процесс начинает с нуля: значения
+родителя учтены в файле родителя.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from pathlib import Path
+from typing import ContextManager
+
+# Границы корзин гистограмм в секундах: от долей миллисекунды (токенизация) до секунд
+# (загрузка индекса, холодный aspell).
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Метрика -> (тип, описание). inc/observe принимают только имена отсюда.
+METRICS = {
+    "search_stage_seconds": ("histogram", "Duration of a search stage"),
+    "search_request_seconds": ("histogram", "Duration of a search HTTP request"),
+    "search_queries_total": ("counter", "Search queries received"),
+    "search_empty_results_total": ("counter", "Search queries that returned no documents"),
+    "search_cache_hits_total": ("counter", "Search result cache hits"),
+    "search_cache_misses_total": ("counter", "Search result cache misses"),
+    "index_reloads_total": ("counter", "Index file loads (initial load and reloads after a rebuild)"),
+}
+
+_Labels = tuple[tuple[str, str], ...]
+
+_enabled = False
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_counters: dict[tuple[str, _Labels], float] = {}
+_histograms: dict[tuple[str, _Labels], "_Histogram"] = {}
+_NO_TIMER = nullcontext()
+
+FLUSH_INTERVAL = 1.0
+_FILE_PREFIX = "metrics_"
+_multiprocess_dir: Path | None = None
+_process_file: Path | None = None
+# Есть значения, ещё не сохранённые в файл процесса.
+_dirty = False
+_flusher_started = False
+
+
+class _Histogram:
+    """Число наблюдений по корзинам (не накопленное) и их сумма."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(DEFAULT_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # Корзина le включает границу: первая граница, не меньшая value.
+        self.counts[bisect_left(DEFAULT_BUCKETS, value)] += 1
+        self.sum += value
+
+
+class _StageTimer:
+    def __init__(self, stage: str) -> None:
+        self._stage = stage
+        self._started = 0.0
+
+    def __enter__(self) -> None:
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        observe("search_stage_seconds", time.perf_counter() - self._started, stage=self._stage)
+
+
+def configure_metrics(enabled: bool, multiprocess_dir: Path | None = None) -> None:
+    """
+    Включает или выключает сбор метрик в текущем процессе.
+
+    multiprocess_dir — общий каталог файлов процессов (см. описание модуля); без него
+    render_prometheus отдаёт только значения текущего процесса.
+    """
+    global _enabled, _multiprocess_dir, _process_file
+    with _lock:
+        _enabled = enabled
+        _multiprocess_dir = multiprocess_dir
+        _process_file = None
+
+
+def metrics_enabled() -> bool:
+    return _enabled
+
+
+def reset_metrics() -> None:
+    global _dirty
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _dirty = _multiprocess_dir is not None
+
+
+def _after_fork_in_child() -> None:
+    # Блокировки могли быть захвачены другим потоком родителя в момент fork.
+    global _lock, _flush_lock, _process_file, _dirty, _flusher_started
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _process_file = None
+    _dirty = False
+    # Потоки после fork не продолжаются: поток сохранения запустится заново.
+    _flusher_started = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _flusher() -> None:
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_metrics()
+
+
+def _mark_dirty() -> None:
+    """Вызывается под _lock после изменения значений."""
+    global _dirty, _flusher_started
+    _dirty = True
+    if _multiprocess_dir is not None and not _flusher_started:
+        _flusher_started = True
+        threading.Thread(target=_flusher, name="metrics-flush", daemon=True).start()
+
+
+def _key(name: str, labels: dict[str, str]) -> tuple[str, _Labels]:
+    if name not in METRICS:
+        raise ValueError(f"unknown metric: {name}")
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels: str) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+        _mark_dirty()
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _Histogram()
+            _histograms[key] = histogram
+        histogram.observe(seconds)
+        _mark_dirty()
+
+
+def time_stage(stage: str) -> ContextManager[None]:
+    """Контекстный менеджер: время блока попадает в search_stage_seconds{stage=...}."""
+    if not _enabled:
+        return _NO_TIMER
+    return _StageTimer(stage)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: _Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) if extra is None else [*labels, extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _snapshot() -> tuple[dict[tuple[str, _Labels], float], dict[tuple[str, _Labels], tuple[list[int], float]]]:
+    """Копия значений процесса; вызывается под _lock."""
+    return dict(_counters), {key: (list(h.counts), h.sum) for key, h in _histograms.items()}
+
+
+def flush_metrics() -> None:
+    """
+    Сохраняет значения процесса в его файл в multiprocess_dir (атомарно, через rename).
+
+    Без multiprocess_dir или без новых значений ничего не делает. Кроме фонового потока
+    её вызывают render_prometheus и launcher: после загрузки индекса и при выходе процесса.
+    """
+    global _dirty, _process_file
+    if _multiprocess_dir is None or not _dirty:
+        return
+    with _flush_lock:
+        with _lock:
+            if _multiprocess_dir is None or not _dirty:
+                return
+            if _process_file is None:
+                # Случайный суффикс: pid может достаться новому процессу, а файл старого должен остаться.
+                _process_file = _multiprocess_dir / f"{_FILE_PREFIX}{os.getpid()}_{os.urandom(4).hex()}.json"
+            path = _process_file
+            counters, histograms = _snapshot()
+            _dirty = False
+        payload = {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [
+                [name, list(labels), counts, total] for (name, labels), (counts, total) in histograms.items()
+            ],
+        }
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+def _read_process_files(
+    directory: Path,
+) -> tuple[dict[tuple[str, _Labels], float], dict[tuple[str, _Labels], tuple[list[int], float]]]:
+    """Сумма значений из файлов всех процессов в directory."""
+    counters: dict[tuple[str, _Labels], float] = {}
+    histograms: dict[tuple[str, _Labels], tuple[list[int], float]] = {}
+    for path in sorted(directory.glob(f"{_FILE_PREFIX}*.json")):
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in payload.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in payload.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = (list(counts), total)
+            else:
+                histograms[key] = ([a + b for a, b in zip(merged[0], counts)], merged[1] + total)
+    return counters, histograms
+
+
+def render_prometheus() -> str:
+    """
+    Все метрики в текстовом формате Prometheus 0.0.4: значения текущего процесса или,
+    с multiprocess_dir, сумма по файлам всех процессов.
+
+    Свои значения тоже берутся из файла (после flush_metrics): иначе процесс показал бы
+    счётчик больше, чем следующий ответ другого процесса, читающего этот файл.
+    """
+    directory = _multiprocess_dir
+    if directory is None:
+        with _lock:
+            counters, histograms = _snapshot()
+    else:
+        flush_metrics()
+        counters, histograms = _read_process_files(directory)
+
+    lines: list[str] = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', repr(bound)))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
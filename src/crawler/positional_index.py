@@ -0,0 +1,198 @@
+"""
+Позиционный индекс для фразовых запросов и NEAR в булевом поиске
+(inverted_index.positions рядом с inverted_index.txt).
+
+Для каждой леммы хранится список документов (номера по возрастанию, как в
+inverted_index.dict) и для каждого документа — позиции леммы в потоке токенов
+страницы, сжатые разностями в varint. Позиции берутся из <id>_counts.txt,
+записанных analyze --positions: позиции леммы — объединение позиций её токенов.
+
+Раскладка (little-endian): заголовок _HEADER, затем секции с выравниванием 8 байт.
+Файл отображается в память; запрос декодирует только позиции своих лемм в
+документах-кандидатах. В заголовке — идентификатор сборки (generation), тот же, что
+у бинарного индекса inverted_index.dict этой сборки.
+"""
+
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from .binary_format import (
+    SectionWriter,
+    StringTable,
+    check_byte_order,
+    decode_varint_deltas,
+    encode_varint_deltas,
+    map_file,
+    new_generation,
+    pack_string_table,
+    section,
+)
+
+POSITIONS_SUFFIX = ".positions"
+
+_MAGIC = b"INVPOS02"
+_SECTIONS = (
+    "term_offsets",
+    "term_blob",
+    "term_ptr",
+    "entry_docs",
+    "entry_ptr",
+    "position_blob",
+    "doc_offsets",
+    "doc_blob",
+)
+# magic, n_terms, n_docs, n_entries, generation, затем (offset, length) на каждую секцию.
+_HEADER = struct.Struct("<8sIIQQ" + "QQ" * len(_SECTIONS))
+
+
+def positional_index_path(index_path: Path) -> Path:
+    """Путь позиционного индекса для inverted_index.txt или inverted_index.dict."""
+    return index_path.with_suffix(POSITIONS_SUFFIX)
+
+
+def write_positional_index(
+    path: Path,
+    postings: dict[str, list[tuple[int, list[int]]]],
+    doc_names: list[str],
+    generation: int | None = None,
+) -> None:
+    """
+    Сохраняет позиционный индекс.
+
+    postings: лемма -> [(номер документа, возрастающие позиции), ...] по возрастанию
+    номеров; doc_names — имена документов в порядке номеров; generation — идентификатор
+    сборки бинарного индекса (по умолчанию новый).
+    """
+    check_byte_order()
+    if generation is None:
+        generation = new_generation()
+    terms = sorted(postings)
+    term_ptr = array("Q", [0])
+    entry_docs = array("I")
+    entry_ptr = array("Q", [0])
+    blob = bytearray()
+    for term in terms:
+        for doc, positions in postings[term]:
+            entry_docs.append(doc)
+            blob += encode_varint_deltas(positions)
+            entry_ptr.append(len(blob))
+        term_ptr.append(len(entry_docs))
+
+    term_offsets, term_blob = pack_string_table(terms)
+    doc_offsets, doc_blob = pack_string_table(doc_names)
+    writer = SectionWriter(_HEADER.size)
+    placements: list[int] = []
+    for data in (term_offsets, term_blob, term_ptr, entry_docs, entry_ptr, bytes(blob), doc_offsets, doc_blob):
+        placements.extend(writer.add(data))
+    writer.write(path, _HEADER.pack(_MAGIC, len(terms), len(doc_names), len(entry_docs), generation, *placements))
+
+
+class PositionalIndex:
+    """Позиционный индекс, отображённый в память."""
+
+    def __init__(self, path: Path) -> None:
+        check_byte_order()
+        if not path.is_file():
+            raise ValueError(f"positional index not found: {path} (build it with build-index --positions)")
+        view = map_file(path)
+        if len(view) < _HEADER.size:
+            raise ValueError("invalid positional index: file is too short")
+        fields = _HEADER.unpack_from(view, 0)
+        magic, n_terms, n_docs, n_entries, generation = fields[:5]
+        if magic != _MAGIC:
+            raise ValueError("invalid positional index format (rebuild with build-index --positions)")
+        placements = dict(zip(_SECTIONS, zip(fields[5::2], fields[6::2])))
+        self.generation = generation
+
+        def part(name: str, fmt: str | None = None) -> memoryview:
+            offset, length = placements[name]
+            return section(view, offset, length, fmt)
+
+        self._terms = StringTable(part("term_offsets", "I"), part("term_blob"))
+        self._term_ptr = part("term_ptr", "Q")
+        self._entry_docs = part("entry_docs", "I")
+        self._entry_ptr = part("entry_ptr", "Q")
+        self._blob = part("position_blob")
+        self._doc_names = StringTable(part("doc_offsets", "I"), part("doc_blob"))
+        if (
+            len(self._terms) != n_terms
+            or len(self._doc_names) != n_docs
+            or len(self._term_ptr) != n_terms + 1
+            or len(self._entry_docs) != n_entries
+            or len(self._entry_ptr) != n_entries + 1
+        ):
+            raise ValueError("invalid positional index: section sizes do not match header")
+        self._term_numbers: dict[str, int] = {}
+
+    @property
+    def document_count(self) -> int:
+        return len(self._doc_names)
+
+    def doc_name_list(self) -> list[str]:
+        return self._doc_names.to_list()
+
+    def _term_number(self, term: str) -> int:
+        number = self._term_numbers.get(term)
+        if number is None:
+            number = self._terms.find(term)
+            self._term_numbers[term] = number
+        return number
+
+    def positions(self, term: str, doc: int) -> list[int]:
+        """Позиции леммы в документе по возрастанию (пустой список, если её там нет)."""
+        i = self._term_number(term)
+        if i < 0:
+            return []
+        start, end = self._term_ptr[i], self._term_ptr[i + 1]
+        # Номера документов в списке леммы возрастают: ищем двоичным поиском.
+        j = bisect_left(self._entry_docs, doc, start, end)
+        if j == end or self._entry_docs[j] != doc:
+            return []
+        return decode_varint_deltas(self._blob[self._entry_ptr[j] : self._entry_ptr[j + 1]])
+
+
+def phrase_starts(starts: list[int], positions: list[int], offset: int) -> list[int]:
+    """
+    Начала фразы, у которых на позиции start + offset стоит следующее слово.
+
+    Оба списка возрастают, поэтому пересечение — один проход двумя указателями.
+    """
+    out: list[int] = []
+    i = j = 0
+    while i < len(starts) and j < len(positions):
+        expected = starts[i] + offset
+        if positions[j] < expected:
+            j += 1
+        elif positions[j] > expected:
+            i += 1
+        else:
+            out.append(starts[i])
+            i += 1
+            j += 1
+    return out
+
+
+def near_spans(left: list[tuple[int, int]], right: list[tuple[int, int]], distance: int) -> list[tuple[int, int]]:
+    """
+    Пары вхождений (start, end) из left и right, между которыми не больше distance
+    слов в любом порядке; для каждой пары — охватывающий отрезок.
+
+    Отрезки включают концы: между end и start следующего вхождения start - end - 1 слов,
+    поэтому позиции могут отличаться не больше чем на distance + 1. Списки отсортированы
+    по start: для вхождения из left правые вхождения, начавшиеся дальше
+    end + distance + 1, уже не подходят, и перебор по ним прерывается.
+    """
+    gap = distance + 1
+    spans: set[tuple[int, int]] = set()
+    for left_start, left_end in left:
+        for right_start, right_end in right:
+            if right_start > left_end + gap:
+                break
+            if right_start == left_start and right_end == left_end:
+                # Одно и то же вхождение (NEAR леммы с самой собой) — не пара.
+                continue
+            if left_start - right_end <= gap:
+                spans.add((min(left_start, right_start), max(left_end, right_end)))
+    return sorted(spans)
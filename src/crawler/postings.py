@@ -0,0 +1,180 @@
+"""
+Множества документов для булева поиска на целочисленных номерах.
+
+Документы нумеруются 0..N-1 в порядке сортировки имён ("0001.html", ...), поэтому
+возрастающий список номеров сразу даёт отсортированную выдачу. Редкие списки
+хранятся как отсортированные списки номеров, частые — битовой картой (Python int,
+бит i — документ i): для них AND/OR/NOT выполняются одной операцией над числом.
+"""
+
+from bisect import bisect_left
+from collections import deque
+from itertools import compress, repeat
+from typing import Iterator
+
+# Список плотный, если в нём не меньше 1/_DENSE_FACTOR всех документов: битовая карта
+# занимает N/8 байт, а список — около 8 байт на номер.
+_DENSE_FACTOR = 32
+
+# Во сколько раз один список должен быть длиннее другого, чтобы пересекать
+# галопирующим поиском, а не через хеш-множество.
+_GALLOP_RATIO = 8
+
+# Перевод флагов документов (байт 0/1 на документ) в двоичную запись числа и обратно:
+# преобразования идут через bytes.translate и int(..., 2), без цикла по битам в Python.
+_FLAGS_TO_DIGITS = bytes.maketrans(b"\0\1", b"01")
+_DIGITS_TO_FLAGS = bytes.maketrans(b"01", b"\0\1")
+
+
+def is_dense(count: int, universe: int) -> bool:
+    """Хранить ли список из count номеров битовой картой."""
+    return count > 0 and count * _DENSE_FACTOR >= universe
+
+
+def gallop_intersect(small: list[int], large: list[int]) -> list[int]:
+    """
+    Пересечение двух возрастающих списков галопирующим поиском.
+
+    Для каждого номера из короткого списка позиция в длинном ищется экспоненциальным
+    шагом от предыдущей найденной и затем двоичным поиском: O(m log(n / m)).
+    """
+    out: list[int] = []
+    n = len(large)
+    lo = 0
+    for value in small:
+        bound = 1
+        while lo + bound < n and large[lo + bound] < value:
+            bound *= 2
+        lo = bisect_left(large, value, lo, min(lo + bound + 1, n))
+        if lo == n:
+            break
+        if large[lo] == value:
+            out.append(value)
+            lo += 1
+    return out
+
+
+def _bits_from_ids(ids: list[int], universe: int) -> int:
+    flags = bytearray(universe)
+    deque(map(flags.__setitem__, ids, repeat(1)), maxlen=0)
+    # Старший бит числа — последний документ, поэтому флаги разворачиваем.
+    return int(flags[::-1].translate(_FLAGS_TO_DIGITS) or b"0", 2)
+
+
+def _flags_from_bits(bits: int, universe: int) -> bytes:
+    """Байт 0/1 на каждый документ: flags[i] — входит ли документ i."""
+    return format(bits, f"0{universe}b").encode("ascii")[::-1].translate(_DIGITS_TO_FLAGS)
+
+
+def _ids_from_bits(bits: int, universe: int) -> list[int]:
+    return list(compress(range(universe), _flags_from_bits(bits, universe)))
+
+
+class DocSet:
+    """
+    Неизменяемое множество номеров документов из диапазона [0, universe).
+
+    Внутри либо отсортированный список номеров, либо битовая карта — по плотности.
+    """
+
+    __slots__ = ("universe", "_ids", "_bits")
+
+    def __init__(self, universe: int, ids: list[int] | None = None, bits: int | None = None) -> None:
+        self.universe = universe
+        self._ids = ids
+        self._bits = bits
+
+    @classmethod
+    def from_sorted(cls, ids: list[int], universe: int) -> "DocSet":
+        """Из возрастающего списка номеров; плотные списки сразу переводятся в битовую карту."""
+        if is_dense(len(ids), universe):
+            return cls(universe, bits=_bits_from_ids(ids, universe))
+        return cls(universe, ids=ids)
+
+    @classmethod
+    def from_bitmap(cls, data: bytes | memoryview, universe: int) -> "DocSet":
+        """Из битовой карты little-endian (см. to_bitmap)."""
+        return cls._from_bits(int.from_bytes(data, "little"), universe)
+
+    @classmethod
+    def _from_bits(cls, bits: int, universe: int) -> "DocSet":
+        if bits.bit_count() * _DENSE_FACTOR < universe:
+            return cls(universe, ids=_ids_from_bits(bits, universe))
+        return cls(universe, bits=bits)
+
+    @property
+    def is_dense(self) -> bool:
+        return self._bits is not None
+
+    def __len__(self) -> int:
+        if self._bits is not None:
+            return self._bits.bit_count()
+        assert self._ids is not None
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids())
+
+    def ids(self) -> list[int]:
+        """Номера документов по возрастанию."""
+        if self._bits is not None:
+            return _ids_from_bits(self._bits, self.universe)
+        assert self._ids is not None
+        return self._ids
+
+    def to_bitmap(self) -> bytes:
+        """Битовая карта little-endian: бит i байта i // 8 — документ i."""
+        return self._as_bits().to_bytes((self.universe + 7) // 8, "little")
+
+    def _as_bits(self) -> int:
+        if self._bits is not None:
+            return self._bits
+        assert self._ids is not None
+        return _bits_from_ids(self._ids, self.universe)
+
+    def intersection(self, other: "DocSet") -> "DocSet":
+        if self._bits is not None and other._bits is not None:
+            return DocSet._from_bits(self._bits & other._bits, self.universe)
+        if self._bits is not None:
+            return other.intersection(self)
+        assert self._ids is not None
+        if other._bits is not None:
+            # Редкий список против битовой карты: проверяем биты по номерам.
+            flags = _flags_from_bits(other._bits, self.universe)
+            return DocSet(self.universe, ids=[doc for doc in self._ids if flags[doc]])
+        assert other._ids is not None
+        small, large = sorted((self._ids, other._ids), key=len)
+        if not small:
+            return DocSet(self.universe, ids=[])
+        if len(large) >= _GALLOP_RATIO * len(small):
+            return DocSet(self.universe, ids=gallop_intersect(small, large))
+        return DocSet(self.universe, ids=sorted(set(small).intersection(large)))
+
+    def union(self, other: "DocSet") -> "DocSet":
+        if self._bits is not None or other._bits is not None:
+            return DocSet._from_bits(self._as_bits() | other._as_bits(), self.universe)
+        assert self._ids is not None and other._ids is not None
+        if not other._ids:
+            return self
+        if not self._ids:
+            return other
+        return DocSet.from_sorted(sorted(set(self._ids).union(other._ids)), self.universe)
+
+    def difference(self, other: "DocSet") -> "DocSet":
+        """self минус other: A AND NOT B без построения дополнения B."""
+        if self._bits is not None:
+            return DocSet._from_bits(self._bits & ~other._as_bits(), self.universe)
+        assert self._ids is not None
+        if not self._ids or not len(other):
+            return self
+        if other._bits is not None:
+            flags = _flags_from_bits(other._bits, self.universe)
+            return DocSet(self.universe, ids=[doc for doc in self._ids if not flags[doc]])
+        assert other._ids is not None
+        excluded = set(other._ids)
+        return DocSet(self.universe, ids=[doc for doc in self._ids if doc not in excluded])
+
+    def complement(self) -> "DocSet":
+        """Все документы, кроме self (нужно только для NOT вне конъюнкции)."""
+        full = (1 << self.universe) - 1
+        return DocSet._from_bits(full & ~self._as_bits(), self.universe)
@@ -1,13 +1,31 @@
+import asyncio
 import logging
 from pathlib import Path
 
-from .download import download_html
-from .storage import append_index, save_page
+import aiohttp
+import requests
+
+from .download import (
+    DEFAULT_BACKOFF_BASE,
+    DEFAULT_BACKOFF_MAX,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_POOL_SIZE,
+    FetchResult,
+    fetch_html,
+    fetch_html_async,
+    make_session,
+)
+from .fetch_state import FetchStateStore, content_sha256, default_fetch_state_path
+from .storage import DEFAULT_INDEX_FLUSH_EVERY, CrawlStorage, make_filename
 
 # Таймаут и ретраи для download_html
 DEFAULT_TIMEOUT = 30.0
 DEFAULT_RETRIES = 2
 
+# Параллельная загрузка: 1 — последовательный режим через requests.
+DEFAULT_CONCURRENCY = 1
+DEFAULT_PER_HOST_LIMIT = 4
+
 
 def _read_urls(input_path: Path) -> list[str]:
     """Читает URL из файла, пропускает пустые."""
@@ -22,6 +40,15 @@ def run(
     limit: int,
     timeout: float = DEFAULT_TIMEOUT,
     retries: int = DEFAULT_RETRIES,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    backoff_base: float = DEFAULT_BACKOFF_BASE,
+    backoff_max: float = DEFAULT_BACKOFF_MAX,
+    fetch_state_path: Path | None = None,
+    refetch: bool = False,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    index_flush_every: int = DEFAULT_INDEX_FLUSH_EVERY,
 ) -> int:
     """
     Читает URL из input_path, скачивает до limit страниц
@@ -30,6 +57,25 @@ def run(
     При ошибке загрузки URL логирует и пропускает. Если успешных скачиваний
     набралось меньше limit из‑за нехватки URL — возвращает ненулевой код.
 
+    При concurrency > 1 страницы качаются асинхронно (aiohttp): одновременно
+    не больше concurrency запросов и не больше per_host_limit на один хост.
+    Номера файлов и порядок index.txt при этом те же, что у последовательного
+    режима: они определяются порядком URL во входном файле.
+
+    Последовательный режим держит одну сессию requests с пулом из pool_size
+    keep-alive соединений. В обоих режимах неудачные попытки повторяются с паузой
+    от backoff_base до backoff_max секунд (на 429/503 — по Retry-After).
+
+    Состояние загрузок (по умолчанию fetch_state.json рядом с index_path) хранит
+    ETag/Last-Modified и хэш каждой страницы: повторный run отправляет условные
+    запросы, на 304 берёт страницу из уже сохранённого файла и не переписывает
+    файлы, содержимое которых не изменилось. refetch=True отключает условные запросы.
+
+    Ответы не-HTML и больше max_bytes байт обрываются при загрузке и пропускаются.
+
+    Страницы пишутся атомарно, index.txt держится открытым и дописывается пачками
+    по index_flush_every строк (см. CrawlStorage).
+
     Returns:
         0 при успехе (набрано limit успешных), иначе 1.
     """
@@ -37,26 +83,56 @@ def run(
     logger = logging.getLogger(__name__)
     urls = _read_urls(input_path)
 
-    # Каждый run начинаем с пустого индекса
-    if index_path.exists():
-        index_path.write_text("", encoding="utf-8")
+    if fetch_state_path is None:
+        fetch_state_path = default_fetch_state_path(index_path)
+    state = FetchStateStore.load(fetch_state_path)
+    # Каждый run начинаем с пустого индекса (CrawlStorage.open)
+    storage = CrawlStorage(out_dir, index_path, flush_every=index_flush_every).open()
+    committer = _PageCommitter(storage, state, conditional=not refetch)
 
-    success_count = 0
-    next_n = 1
-
-    for url in urls:
-        if success_count >= limit:
-            break
-        try:
-            html = download_html(url, timeout=timeout, retries=retries)
-            save_page(out_dir, next_n, html)
-            append_index(index_path, next_n, url)
-            success_count += 1
-            next_n += 1
-        except Exception as e:
-            logger.warning("Skip URL %s: %s", url, e)
-            continue
+    try:
+        if concurrency > 1:
+            asyncio.run(
+                _run_concurrent(
+                    urls,
+                    committer,
+                    limit,
+                    timeout=timeout,
+                    retries=retries,
+                    concurrency=concurrency,
+                    per_host_limit=per_host_limit,
+                    backoff_base=backoff_base,
+                    backoff_max=backoff_max,
+                    max_bytes=max_bytes,
+                )
+            )
+        else:
+            with make_session(pool_size) as session:
+                _run_sequential(
+                    urls,
+                    committer,
+                    limit,
+                    timeout=timeout,
+                    retries=retries,
+                    session=session,
+                    backoff_base=backoff_base,
+                    backoff_max=backoff_max,
+                    max_bytes=max_bytes,
+                )
+    finally:
+        # Сначала index.txt, потом состояние: состояние не должно опережать индекс.
+        storage.close()
+        state.retain(urls)
+        state.save(fetch_state_path)
 
+    success_count = committer.success_count
+    logger.info(
+        "Saved %d pages: downloaded %d, not modified (304) %d, files left untouched %d.",
+        success_count,
+        committer.downloaded,
+        committer.not_modified,
+        committer.unchanged,
+    )
     if success_count < limit:
         logger.error(
             "Not enough URLs: got %d successful downloads, need %d (URLs exhausted).",
@@ -65,3 +141,186 @@ def run(
         )
         return 1
     return 0
+
+
+class _PageCommitter:
+    """
+    Сохраняет загруженные страницы под очередными номерами и ведёт состояние загрузок.
+
+    Файл страницы переписывается, только если его содержимое отличается от нового:
+    у неизменившихся страниц остаётся прежний mtime, и инкрементальный analyze их пропускает.
+    """
+
+    def __init__(self, storage: CrawlStorage, state: FetchStateStore, conditional: bool) -> None:
+        self.storage = storage
+        self.state = state
+        self.conditional = conditional
+        self.next_n = 1
+        self.success_count = 0
+        self.downloaded = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+    def validators(self, url: str) -> tuple[str | None, str | None]:
+        """ETag и Last-Modified прошлой загрузки для условного запроса."""
+        entry = self.state.get(url)
+        if not self.conditional or entry is None:
+            return None, None
+        return entry.get("etag"), entry.get("last_modified")
+
+    def _previous_copy(self, url: str) -> bytes | None:
+        # Файл прошлой загрузки мог быть перезаписан другой страницей (номера сдвинулись)
+        # или изменён вручную: берём его, только если хэш совпадает с записанным.
+        entry = self.state.get(url)
+        if entry is None:
+            return None
+        path = self.storage.out_dir / entry["filename"]
+        if not path.is_file():
+            return None
+        data = path.read_bytes()
+        return data if content_sha256(data) == entry["sha256"] else None
+
+    def commit(self, url: str, result: FetchResult) -> bool:
+        """
+        Сохраняет страницу и строку индекса.
+
+        Returns:
+            False, если сервер ответил 304, а сохранённой копии нет: тогда страницу
+            нужно скачать заново без условных заголовков.
+        """
+        if result.html is None:
+            data = self._previous_copy(url)
+            if data is None:
+                return False
+            self.not_modified += 1
+        else:
+            data = result.html.encode("utf-8")
+            self.downloaded += 1
+
+        digest = content_sha256(data)
+        n = self.next_n
+        path = self.storage.page_path(n)
+        if path.is_file() and content_sha256(path.read_bytes()) == digest:
+            self.unchanged += 1
+        else:
+            self.storage.save_page(n, data.decode("utf-8"))
+        self.storage.append_index(n, url)
+        self.state.update(url, result.etag, result.last_modified, digest, make_filename(n))
+        self.next_n += 1
+        self.success_count += 1
+        return True
+
+
+def _run_sequential(
+    urls: list[str],
+    committer: _PageCommitter,
+    limit: int,
+    timeout: float,
+    retries: int,
+    session: requests.Session,
+    backoff_base: float,
+    backoff_max: float,
+    max_bytes: int,
+) -> None:
+    """Скачивает URL по одному."""
+    logger = logging.getLogger(__name__)
+
+    for url in urls:
+        if committer.success_count >= limit:
+            break
+        try:
+            etag, last_modified = committer.validators(url)
+            result = fetch_html(
+                url,
+                timeout=timeout,
+                retries=retries,
+                session=session,
+                backoff_base=backoff_base,
+                backoff_max=backoff_max,
+                etag=etag,
+                last_modified=last_modified,
+                max_bytes=max_bytes,
+            )
+            if not committer.commit(url, result):
+                result = fetch_html(
+                    url,
+                    timeout=timeout,
+                    retries=retries,
+                    session=session,
+                    backoff_base=backoff_base,
+                    backoff_max=backoff_max,
+                    max_bytes=max_bytes,
+                )
+                committer.commit(url, result)
+        except Exception as e:
+            logger.warning("Skip URL %s: %s", url, e)
+            continue
+
+
+async def _run_concurrent(
+    urls: list[str],
+    committer: _PageCommitter,
+    limit: int,
+    timeout: float,
+    retries: int,
+    concurrency: int,
+    per_host_limit: int,
+    backoff_base: float,
+    backoff_max: float,
+    max_bytes: int,
+) -> None:
+    """
+    Скачивает URL параллельно, а сохраняет строго в порядке URL.
+
+    Загрузки запускаются скользящим окном: впереди самого раннего ещё не сохранённого
+    URL выполняется не больше 2 * concurrency задач, поэтому в памяти держится
+    ограниченное число страниц. Как только набрано limit успешных страниц,
+    оставшиеся загрузки отменяются.
+    """
+    logger = logging.getLogger(__name__)
+    window = 2 * concurrency
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=max(0, per_host_limit))
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        def fetch(url: str, conditional: bool) -> "asyncio.Future[FetchResult]":
+            etag, last_modified = committer.validators(url) if conditional else (None, None)
+            return asyncio.ensure_future(
+                fetch_html_async(
+                    session,
+                    url,
+                    timeout=timeout,
+                    retries=retries,
+                    backoff_base=backoff_base,
+                    backoff_max=backoff_max,
+                    etag=etag,
+                    last_modified=last_modified,
+                    max_bytes=max_bytes,
+                )
+            )
+
+        pending: dict[int, asyncio.Future[FetchResult]] = {}
+        scheduled = 0
+
+        def schedule() -> None:
+            nonlocal scheduled
+            while scheduled < len(urls) and len(pending) < window:
+                pending[scheduled] = fetch(urls[scheduled], conditional=True)
+                scheduled += 1
+
+        try:
+            for i, url in enumerate(urls):
+                if committer.success_count >= limit:
+                    break
+                schedule()
+                task = pending.pop(i)
+                try:
+                    result = await task
+                    if not committer.commit(url, result):
+                        committer.commit(url, await fetch(url, conditional=False))
+                except Exception as e:
+                    logger.warning("Skip URL %s: %s", url, e)
+        finally:
+            for task in pending.values():
+                task.cancel()
+            await asyncio.gather(*pending.values(), return_exceptions=True)
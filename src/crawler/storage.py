@@ -1,4 +1,10 @@
+import os
 from pathlib import Path
+from types import TracebackType
+from typing import TextIO
+
+# Через сколько строк буфер index.txt сбрасывается на диск.
+DEFAULT_INDEX_FLUSH_EVERY = 32
 
 
 def make_filename(n: int) -> str:
@@ -51,3 +57,96 @@ def append_index(index_path: Path, n: int, url: str) -> None:
     line = f"{make_filename(n)}\t{url}\n"
     with index_path.open("a", encoding="utf-8") as f:
         f.write(line)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Пишет файл через временный файл и rename: читатель видит либо старую, либо новую версию."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CrawlStorage:
+    """
+    Запись результата краулера: страницы и index.txt.
+
+    Каталог страниц создаётся один раз при открытии, index.txt держится открытым,
+    строки индекса копятся в буфере и сбрасываются каждые flush_every строк и при
+    закрытии. Страница пишется атомарно (временный файл + rename) до того, как
+    её строка попадёт в буфер, поэтому при падении index.txt ссылается только
+    на полностью записанные файлы.
+
+    Использование::
+
+        with CrawlStorage(out_dir, index_path) as storage:
+            storage.save_page(1, html)
+            storage.append_index(1, url)
+    """
+
+    def __init__(self, out_dir: Path, index_path: Path, flush_every: int = DEFAULT_INDEX_FLUSH_EVERY) -> None:
+        self.out_dir = out_dir
+        self.index_path = index_path
+        self.flush_every = max(1, flush_every)
+        self._pending: list[str] = []
+        self._index: TextIO | None = None
+
+    def open(self) -> "CrawlStorage":
+        """Создаёт каталоги и начинает index.txt заново (каждый run строит индекс с нуля)."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._index = self.index_path.open("w", encoding="utf-8", newline="\n")
+        return self
+
+    def __enter__(self) -> "CrawlStorage":
+        return self.open()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def page_path(self, n: int) -> Path:
+        return self.out_dir / make_filename(n)
+
+    def save_page(self, n: int, html: str) -> Path:
+        """
+        Сохраняет страницу в UTF-8 атомарно.
+
+        Args:
+            n: Номер страницы (определяет имя файла).
+            html: Содержимое страницы.
+
+        Returns:
+            Путь к сохранённому файлу.
+        """
+        path = self.page_path(n)
+        _write_atomic(path, html.encode("utf-8"))
+        return path
+
+    def append_index(self, n: int, url: str) -> None:
+        """Добавляет строку "0001.html<TAB>url" в буфер индекса."""
+        self._pending.append(f"{make_filename(n)}\t{url}\n")
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._index is None:
+            raise ValueError("storage is not open")
+        if self._pending:
+            self._index.write("".join(self._pending))
+            self._pending.clear()
+        self._index.flush()
+
+    def close(self) -> None:
+        if self._index is None:
+            return
+        try:
+            self.flush()
+            os.fsync(self._index.fileno())
+        finally:
+            self._index.close()
+            self._index = None
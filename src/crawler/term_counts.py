@@ -0,0 +1,81 @@
+"""
+Частоты и позиции токенов документа (<id>_counts.txt рядом с <id>_tokens.txt).
+
+*_tokens.txt по формату задания содержит каждый токен один раз, поэтому частота
+термина из него не восстанавливается. Файл частот хранит её явно:
+
+    <токен><пробел><число вхождений>[<пробел><позиции>]\\n
+
+Позиции — номера токена в потоке токенов документа (после отбрасывания стоп-слов и
+коротких слов, с 0), записанные разностями через запятую: "3,4,10" означает позиции
+3, 7 и 17. Строки отсортированы по токену.
+"""
+
+from collections import Counter, defaultdict
+from pathlib import Path
+
+COUNTS_SUFFIX = "_counts"
+
+
+def counts_path(tokens_dir: Path, doc_id: str) -> Path:
+    return tokens_dir / f"{doc_id}{COUNTS_SUFFIX}.txt"
+
+
+def _encode_positions(positions: list[int]) -> str:
+    previous = 0
+    deltas: list[str] = []
+    for position in positions:
+        deltas.append(str(position - previous))
+        previous = position
+    return ",".join(deltas)
+
+
+def _decode_positions(field: str) -> list[int]:
+    positions: list[int] = []
+    current = 0
+    for delta in field.split(","):
+        current += int(delta)
+        positions.append(current)
+    return positions
+
+
+def write_term_counts(path: Path, tokens: list[str], positions: bool = False) -> None:
+    """Пишет частоты (и при positions=True — позиции) потока токенов документа."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines: list[str] = []
+    if positions:
+        by_token: dict[str, list[int]] = defaultdict(list)
+        for position, token in enumerate(tokens):
+            by_token[token].append(position)
+        for token in sorted(by_token):
+            token_positions = by_token[token]
+            lines.append(f"{token} {len(token_positions)} {_encode_positions(token_positions)}\n")
+    else:
+        counts = Counter(tokens)
+        for token in sorted(counts):
+            lines.append(f"{token} {counts[token]}\n")
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def load_term_counts(path: Path) -> dict[str, int]:
+    """Частоты токенов документа; позиции, если они есть, не разбираются."""
+    counts: dict[str, int] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) < 2:
+            continue
+        counts[parts[0].lower()] = int(parts[1])
+    return counts
+
+
+def load_term_positions(path: Path) -> dict[str, list[int]] | None:
+    """Позиции токенов документа; None, если файл записан без позиций."""
+    positions: dict[str, list[int]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) < 2:
+            continue
+        if len(parts) < 3:
+            return None
+        positions[parts[0].lower()] = _decode_positions(parts[2])
+    return positions
@@ -1,10 +1,21 @@
+import hashlib
 import re
 import shutil
-import subprocess
 import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html import unescape
 from html.parser import HTMLParser
 from pathlib import Path
+from typing import Iterable, Iterator
+
+from .analyze_manifest import AnalyzeManifest, default_manifest_path
+from .lemmatizer import get_aspell_pool, get_lemma_cache, load_lemma_cache, save_lemma_cache
+from .term_counts import counts_path, write_term_counts
+
+# Версия правил токенизации и лемматизации. Увеличивается при любом изменении, которое
+# меняет содержимое *_tokens.txt / *_lemmas.txt: тогда analyze пересчитывает все страницы.
+ANALYZER_VERSION = 1
 
 TOKEN_RE = re.compile(r"[А-Яа-яЁё]+(?:-[А-Яа-яЁё]+)?")
 
@@ -190,8 +201,25 @@ RU_STOPWORDS = {
 STOPWORDS = RU_STOPWORDS
 
 
+def _text_tokens(text: str) -> list[str]:
+    """
+    Токены фрагмента текста по порядку: кириллица (допускается один дефис внутри),
+    длиннее двух символов, без стоп-слов.
+
+    Совпадение TOKEN_RE не начинается и не заканчивается дефисом, поэтому отдельная
+    обрезка дефисов и повторная проверка токена регулярным выражением не нужны.
+    """
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 2 and token not in STOPWORDS]
+
+
 class _ArticleExtractor(HTMLParser):
-    """Вытаскивает текст статьи; при отсутствии блока статьи — весь видимый текст."""
+    """
+    Токены текста статьи; при отсутствии блока статьи — токены всего видимого текста.
+
+    Текст не собирается в одну строку: каждый фрагмент из handle_data сразу разбивается
+    на токены. Фрагменты между тегами раньше склеивались через пробел, так что токены
+    и прежде не переходили через границу фрагмента.
+    """
 
     _SKIP_TAGS = {"script", "style", "noscript", "svg"}
 
@@ -199,8 +227,9 @@ class _ArticleExtractor(HTMLParser):
         super().__init__(convert_charrefs=True)
         self._skip_depth = 0
         self._capture_depth = 0
-        self._article_chunks: list[str] = []
-        self._fallback_chunks: list[str] = []
+        self._has_article = False
+        self._article_tokens: list[str] = []
+        self._fallback_tokens: list[str] = []
 
     def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
         if tag in self._SKIP_TAGS:
@@ -237,47 +266,103 @@ class _ArticleExtractor(HTMLParser):
         if self._skip_depth > 0:
             return
         if data and not data.isspace():
-            # Всегда копим fallback-текст, чтобы не потерять данные при нестандартной верстке.
-            self._fallback_chunks.append(data)
+            tokens = _text_tokens(data)
+            # Всегда копим fallback-токены, чтобы не потерять данные при нестандартной верстке.
+            self._fallback_tokens.extend(tokens)
             if self._capture_depth > 0:
-                self._article_chunks.append(data)
-
-    def get_text(self) -> str:
-        if self._article_chunks:
-            return " ".join(self._article_chunks)
-        return " ".join(self._fallback_chunks)
-
-
-def _extract_text(html: str) -> str:
-    # Небольшой встроенный HTML-парсер без внешних зависимостей.
-    parser = _ArticleExtractor()
-    parser.feed(html)
-    parser.close()
-    return parser.get_text()
-
-
-def _is_russian_token(token: str) -> bool:
-    return bool(re.fullmatch(r"[А-Яа-яЁё]+(?:-[А-Яа-яЁё]+)?", token))
-
-
-def _collect_unique_tokens(texts: list[str]) -> list[str]:
-    tokens: set[str] = set()
-    for text in texts:
-        for raw in TOKEN_RE.findall(text.lower()):
-            token = raw.strip("-")
-            if not token or len(token) <= 2:
-                continue
-            if not _is_russian_token(token):
-                continue
-            if token in STOPWORDS:
-                continue
-            # set автоматически убирает дубликаты между документами.
-            tokens.add(token)
-    return sorted(tokens)
-
+                # Блок статьи найден, даже если в нём нет ни одного токена.
+                self._has_article = True
+                self._article_tokens.extend(tokens)
+
+    def get_tokens(self) -> list[str]:
+        """Токены в порядке появления в документе (с повторами)."""
+        if self._has_article:
+            return self._article_tokens
+        return self._fallback_tokens
+
+
+# Разметка, которую _scan_markup разбирает сам: теги с атрибутами в обычной записи
+# (имя, затем ="..." / '...' / значение без кавычек), закрывающие теги, комментарии,
+# <!DOCTYPE>/<!...> и <?...>. Границы и имена тегов совпадают с HTMLParser.
+_MARKUP_RE = re.compile(
+    r"""<(?:
+        (?P<start>[a-zA-Z][^\t\n\r\f />\x00]*)
+        (?P<attrs>(?:\s+[^\s"'>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'=<>`]+))?)*)
+        \s*(?P<empty>/?)>
+      | /(?P<end>[a-zA-Z][-.a-zA-Z0-9:_]*)\s*>
+      | !--.*?--\s*>
+      | !(?!--|\[)[^>]*>
+      | \?[^>]*>
+    )""",
+    re.VERBOSE | re.DOTALL,
+)
+_ATTR_RE = re.compile(r"""\s+([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?""")
+# Содержимое script/style не размечается: оно тянется до закрывающего тега.
+_RAW_TEXT_END = {tag: re.compile(rf"</\s*{tag}\s*>", re.IGNORECASE) for tag in HTMLParser.CDATA_CONTENT_ELEMENTS}
+
+
+def _parse_attrs(raw: str) -> list[tuple[str, str | None]]:
+    """Атрибуты тега в виде HTMLParser: имя в нижнем регистре, значение без кавычек или None."""
+    attrs: list[tuple[str, str | None]] = []
+    for found in _ATTR_RE.finditer(raw):
+        name, value = found.group(1, 2)
+        if value is not None and value[:1] in ("'", '"'):
+            value = value[1:-1]
+        attrs.append((name.lower(), unescape(value) if value else value))
+    return attrs
+
+
+def _scan_markup(html: str, extractor: _ArticleExtractor) -> bool:
+    """
+    Быстрый разбор документа вместо HTMLParser.feed: вызывает у extractor те же
+    handle_starttag / handle_endtag / handle_data, что и HTMLParser, но без учёта
+    номеров строк и без разбора атрибутов, которые extractor не читает.
 
-def _is_cyrillic(token: str) -> bool:
-    return bool(re.search(r"[А-Яа-яЁё]", token))
+    Возвращает False, если встретилась разметка вне поддерживаемого подмножества
+    (одиночный "<", незакрытый тег или script, <![CDATA[ и т. п.): тогда документ
+    нужно разобрать HTMLParser заново.
+    """
+    find = html.find
+    match = _MARKUP_RE.match
+    pos = 0
+    while True:
+        lt = find("<", pos)
+        text = html[pos:] if lt < 0 else html[pos:lt]
+        if text:
+            extractor.handle_data(unescape(text) if "&" in text else text)
+        if lt < 0:
+            return True
+        found = match(html, lt)
+        if found is None:
+            return False
+        pos = found.end()
+        tag, raw_attrs, empty, end_tag = found.group("start", "attrs", "empty", "end")
+        if tag is not None:
+            tag = tag.lower()
+            # Извлекатель смотрит только на class="... field-name-body ...".
+            attrs = _parse_attrs(raw_attrs) if "field-name-body" in raw_attrs or "&" in raw_attrs else []
+            extractor.handle_starttag(tag, attrs)
+            if empty:
+                extractor.handle_endtag(tag)
+            elif tag in _RAW_TEXT_END:
+                closing = _RAW_TEXT_END[tag].search(html, pos)
+                if closing is None:
+                    return False
+                # Текст внутри script/style извлекатель всё равно пропускает.
+                extractor.handle_endtag(tag)
+                pos = closing.end()
+        elif end_tag is not None:
+            extractor.handle_endtag(end_tag.lower())
+
+
+def _extract_tokens(html: str) -> list[str]:
+    extractor = _ArticleExtractor()
+    if not _scan_markup(html, extractor):
+        # Нестандартная разметка: разбираем документ встроенным HTMLParser.
+        extractor = _ArticleExtractor()
+        extractor.feed(html)
+        extractor.close()
+    return extractor.get_tokens()
 
 
 def _parse_aspell_response(token: str, response_lines: list[str]) -> str:
@@ -295,61 +380,53 @@ def _parse_aspell_response(token: str, response_lines: list[str]) -> str:
     return token
 
 
-def _aspell_lemmas(tokens: list[str], dictionary: str) -> dict[str, str]:
+def _aspell_lemmas(tokens: list[str], dictionary: str, parallel: int = 1) -> dict[str, str]:
+    """
+    Леммы токенов через кэш и пул aspell.
+
+    При parallel > 1 некэшированные токены делятся на части и проверяются одновременно
+    несколькими процессами пула (размер пула задаётся configure_aspell_pool).
+    """
     if not tokens:
         return {}
 
-    proc = subprocess.run(
-        ["aspell", "-d", dictionary, "-a"],
-        input="\n".join(tokens) + "\n",
-        capture_output=True,
-        text=True,
-        check=False,
-    )
-    if proc.returncode != 0:
-        raise RuntimeError(proc.stderr.strip() or "aspell failed")
-
-    lines = proc.stdout.splitlines()
-    if lines and lines[0].startswith("@(#)"):
-        lines = lines[1:]
-
-    # В pipe-режиме aspell отделяет ответы пустыми строками: собираем группы по токенам.
-    groups: list[list[str]] = []
-    current: list[str] = []
-    for line in lines:
-        if line == "":
-            groups.append(current)
-            current = []
-            continue
-        if line[0] in {"*", "+", "&", "#", "-", "?"}:
-            current.append(line.strip())
-    if current:
-        groups.append(current)
-    if len(groups) < len(tokens):
-        # Защита от редких расхождений в выводе aspell.
-        groups.extend([[] for _ in range(len(tokens) - len(groups))])
-
-    result: dict[str, str] = {}
-    for token, responses in zip(tokens, groups):
-        result[token] = _parse_aspell_response(token, responses)
-    return result
-
-
-def _group_by_lemmas(tokens: list[str]) -> dict[str, list[str]]:
-    if shutil.which("aspell") is None:
-        raise RuntimeError("aspell is required to build lemma groups")
-
-    ru_tokens = [token for token in tokens if _is_cyrillic(token)]
-    hyphen_tokens = [token for token in tokens if "-" in token]
-
-    # Составные слова через дефис не всегда корректно лемматизируются aspell:
-    # оставляем их "как есть", чтобы не получить случайные леммы.
-    ru_tokens = [token for token in ru_tokens if "-" not in token]
-
-    token_to_lemma: dict[str, str] = {}
-    token_to_lemma.update(_aspell_lemmas(ru_tokens, "ru"))
-    token_to_lemma.update({token: token for token in hyphen_tokens})
-
+    # В aspell уходят только токены, которых ещё нет в общем LRU-кэше.
+    cache = get_lemma_cache(dictionary)
+    known: dict[str, str] = {}
+    unseen: list[str] = []
+    for token in tokens:
+        lemma = cache.get(token)
+        if lemma is None:
+            unseen.append(token)
+        else:
+            known[token] = lemma
+
+    # Процессы aspell живут в общем пуле: не платим за fork/exec и загрузку словаря на каждый вызов.
+    pool = get_aspell_pool(dictionary)
+    if parallel > 1 and len(unseen) >= 2 * parallel:
+        size = -(-len(unseen) // parallel)
+        chunks = [unseen[start : start + size] for start in range(0, len(unseen), size)]
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            groups = [group for part in executor.map(pool.check, chunks) for group in part]
+    else:
+        groups = pool.check(unseen)
+    for token, responses in zip(unseen, groups):
+        lemma = _parse_aspell_response(token, responses)
+        cache.put(token, lemma)
+        known[token] = lemma
+
+    return {token: known[token] for token in tokens}
+
+
+def _lemma_candidates(tokens: Iterable[str]) -> list[str]:
+    # Токены приходят из _text_tokens и уже состоят из кириллицы (TOKEN_RE), отдельная
+    # проверка не нужна. Составные слова через дефис не всегда корректно лемматизируются
+    # aspell: оставляем их "как есть", чтобы не получить случайные леммы.
+    return [token for token in tokens if "-" not in token]
+
+
+def _group_tokens(tokens: list[str], token_to_lemma: dict[str, str]) -> dict[str, list[str]]:
+    """Группирует токены документа по леммам; токены без леммы остаются сами себе леммой."""
     grouped: dict[str, set[str]] = defaultdict(set)
     for token in tokens:
         lemma = token_to_lemma.get(token, token)
@@ -359,6 +436,12 @@ def _group_by_lemmas(tokens: list[str]) -> dict[str, list[str]]:
     return {lemma: sorted(grouped[lemma]) for lemma in sorted(grouped)}
 
 
+def _group_by_lemmas(tokens: list[str]) -> dict[str, list[str]]:
+    if shutil.which("aspell") is None:
+        raise RuntimeError("aspell is required to build lemma groups")
+    return _group_tokens(tokens, _aspell_lemmas(_lemma_candidates(tokens), "ru"))
+
+
 def _write_tokens(path: Path, tokens: list[str]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     # Формат задания: один токен в строке.
@@ -379,11 +462,80 @@ def _write_lemma_groups(path: Path, lemma_groups: dict[str, list[str]]) -> None:
     path.write_text(content, encoding="utf-8")
 
 
-def analyze(pages_dir: Path, tokens_dir: Path, lemmas_dir: Path) -> int:
+# Сколько страниц лемматизируется одним пакетом: общие для страниц токены уходят
+# в aspell один раз, а память под токены пакета остаётся ограниченной.
+_ANALYZE_BATCH = 256
+
+
+def analyzer_signature() -> str:
+    """Сигнатура токенизатора для манифеста: версия правил, регулярное выражение и стоп-слова."""
+    digest = hashlib.sha256()
+    digest.update(f"{ANALYZER_VERSION}\n{TOKEN_RE.pattern}\n".encode("utf-8"))
+    digest.update("\n".join(sorted(STOPWORDS)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _output_paths(stem: str, tokens_dir: Path, lemmas_dir: Path) -> tuple[Path, Path]:
+    return tokens_dir / f"{stem}_tokens.txt", lemmas_dir / f"{stem}_lemmas.txt"
+
+
+def _tokenize_page(html_path: Path) -> list[str]:
+    """Этапы страницы, не зависящие от aspell: чтение, извлечение текста, поток токенов."""
+    return _extract_tokens(html_path.read_text(encoding="utf-8"))
+
+
+def _tokenized_pages(html_files: list[Path], workers: int) -> Iterator[list[str]]:
+    """Потоки токенов страниц в порядке html_files; при workers > 1 разбор идёт в пуле процессов."""
+    if workers <= 1:
+        yield from map(_tokenize_page, html_files)
+        return
+    chunksize = max(1, min(64, len(html_files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_tokenize_page, html_files, chunksize=chunksize)
+
+
+def _batches(html_files: list[Path], tokens: Iterator[list[str]]) -> Iterator[list[tuple[Path, list[str]]]]:
+    batch: list[tuple[Path, list[str]]] = []
+    for item in zip(html_files, tokens):
+        batch.append(item)
+        if len(batch) >= _ANALYZE_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def analyze(
+    pages_dir: Path,
+    tokens_dir: Path,
+    lemmas_dir: Path,
+    lemma_cache_path: Path | None = None,
+    workers: int = 1,
+    full: bool = False,
+    manifest_path: Path | None = None,
+    counts: bool = False,
+    positions: bool = False,
+) -> int:
     """
     Читает HTML-файлы из pages_dir и для каждого файла строит:
     - отдельный список уникальных токенов без служебных слов и мусора;
     - отдельную группировку токенов по леммам.
+
+    Если задан lemma_cache_path, кэш токен -> лемма читается оттуда перед обработкой
+    и сохраняется обратно после неё: повторный прогон отправляет в aspell только новые токены.
+
+    При workers > 1 HTML разбирается в workers процессах, а лемматизация идёт пакетами
+    страниц через workers процессов aspell. Файлы пишутся в порядке страниц и совпадают
+    побайтно с последовательным прогоном.
+
+    Прогон инкрементальный: манифест (по умолчанию output/analyze_manifest.json) хранит
+    хэши страниц и сигнатуру токенизатора, поэтому обрабатываются только новые и
+    изменённые страницы, а артефакты удалённых страниц удаляются. full=True
+    пересчитывает всё заново.
+
+    При counts=True рядом с токенами пишется <id>_counts.txt с числом вхождений каждого
+    токена (см. term_counts), при positions=True — ещё и с позициями токенов; по нему
+    tfidf считает настоящие частоты терминов.
     """
     if not pages_dir.exists():
         print(f"analyze: pages directory not found: {pages_dir}", file=sys.stderr)
@@ -406,15 +558,69 @@ def analyze(pages_dir: Path, tokens_dir: Path, lemmas_dir: Path) -> int:
     tokens_dir.mkdir(parents=True, exist_ok=True)
     lemmas_dir.mkdir(parents=True, exist_ok=True)
 
-    # Этапы для каждой страницы: извлечение текста -> токены -> леммы -> запись артефактов.
+    lemma_cache = get_lemma_cache("ru")
+    if lemma_cache_path is not None:
+        load_lemma_cache(lemma_cache_path, "ru")
+
+    if manifest_path is None:
+        manifest_path = default_manifest_path(tokens_dir)
+    counts_mode = "positions" if positions else "counts" if counts else "off"
+    settings = {"tokens_dir": str(tokens_dir), "lemmas_dir": str(lemmas_dir), "term_counts": counts_mode}
+    manifest = AnalyzeManifest.load(manifest_path, analyzer_signature(), settings)
+
+    # Артефакты страниц, которых больше нет в pages_dir.
+    current_names = {html_path.name for html_path in html_files}
+    removed = sorted(name for name in manifest.pages if name not in current_names)
+    for name in removed:
+        stem = Path(name).stem
+        for path in (*_output_paths(stem, tokens_dir, lemmas_dir), counts_path(tokens_dir, stem)):
+            path.unlink(missing_ok=True)
+        manifest.forget(name)
+
+    unchanged = 0
+    pending: list[Path] = []
     for html_path in html_files:
-        text = _extract_text(html_path.read_text(encoding="utf-8"))
-        tokens = _collect_unique_tokens([text])
-        lemma_groups = _group_by_lemmas(tokens)
+        tokens_path, lemmas_path = _output_paths(html_path.stem, tokens_dir, lemmas_dir)
+        outputs_exist = tokens_path.is_file() and lemmas_path.is_file()
+        if counts_mode != "off":
+            outputs_exist = outputs_exist and counts_path(tokens_dir, html_path.stem).is_file()
+        if not full and manifest.is_unchanged(html_path) and outputs_exist:
+            unchanged += 1
+        else:
+            pending.append(html_path)
+    html_files = pending
+
+    if html_files and shutil.which("aspell") is None:
+        raise RuntimeError("aspell is required to build lemma groups")
 
-        tokens_path = tokens_dir / f"{html_path.stem}_tokens.txt"
-        lemmas_path = lemmas_dir / f"{html_path.stem}_lemmas.txt"
-        _write_tokens(tokens_path, tokens)
-        _write_lemma_groups(lemmas_path, lemma_groups)
+    # Этапы: извлечение текста и токены (параллельно по страницам) -> леммы пакета
+    # страниц одним обращением к aspell -> запись артефактов в порядке страниц.
+    for batch in _batches(html_files, _tokenized_pages(html_files, workers)):
+        unique_tokens = [sorted(set(stream)) for _html_path, stream in batch]
+        candidates = sorted({token for tokens in unique_tokens for token in _lemma_candidates(tokens)})
+        token_to_lemma = _aspell_lemmas(candidates, "ru", parallel=workers)
+        for (html_path, stream), tokens in zip(batch, unique_tokens):
+            tokens_path, lemmas_path = _output_paths(html_path.stem, tokens_dir, lemmas_dir)
+            _write_tokens(tokens_path, tokens)
+            _write_lemma_groups(lemmas_path, _group_tokens(tokens, token_to_lemma))
+            page_counts_path = counts_path(tokens_dir, html_path.stem)
+            if counts_mode == "off":
+                # Файл частот от прошлого прогона с --counts больше не соответствует режиму.
+                page_counts_path.unlink(missing_ok=True)
+            else:
+                write_term_counts(page_counts_path, stream, positions=positions)
+            manifest.record(html_path)
+
+    manifest.save(manifest_path)
+    print(
+        f"analyze: pages={len(current_names)} processed={len(html_files)} "
+        f"unchanged={unchanged} removed={len(removed)}"
+    )
 
+    if lemma_cache_path is not None:
+        save_lemma_cache(lemma_cache_path, "ru")
+    print(
+        f"analyze: lemma cache hits={lemma_cache.hits} misses={lemma_cache.misses} "
+        f"hit_ratio={lemma_cache.hit_ratio:.3f} size={len(lemma_cache)}/{lemma_cache.maxsize}"
+    )
     return 0
@@ -1,9 +1,13 @@
 import math
 import sys
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from typing import Iterable, Mapping
 
+from .term_counts import counts_path, load_term_counts
+
 
 def load_document_tokens(tokens_path: Path) -> list[str]:
     """
@@ -12,8 +16,8 @@ def load_document_tokens(tokens_path: Path) -> list[str]:
     Формат: один токен в строке. Кодировка: UTF-8.
     """
     terms: list[str] = []
-    for line in tokens_path.read_text(encoding="utf-8").splitlines():
-        token = line.strip().lower()
+    for line in tokens_path.read_text(encoding="utf-8").lower().splitlines():
+        token = line.strip()
         if token:
             terms.append(token)
     return terms
@@ -49,10 +53,18 @@ def compute_tf(tokens: list[str]) -> dict[str, float]:
 
     TF(term) = count(term) / total_terms_in_doc.
     """
-    total = len(tokens)
+    return compute_tf_from_counts(Counter(tokens))
+
+
+def compute_tf_from_counts(counts: Mapping[str, int]) -> dict[str, float]:
+    """
+    TF(term) по частотам терминов документа (например, из <id>_counts.txt).
+
+    TF(term) = count(term) / сумма всех count.
+    """
+    total = sum(counts.values())
     if total == 0:
         return {}
-    counts = Counter(tokens)
     return {term: count / total for term, count in counts.items()}
 
 
@@ -91,17 +103,24 @@ def compute_tf_idf_for_document(
     Возвращает (tf_map, idf_map_for_doc_terms, tfidf_map).
     """
     tf_map = compute_tf(tokens)
-    if not tf_map:
-        return {}, {}, {}
+    return tf_map, *_weight_by_idf(tf_map, df=df, n_docs=n_docs, smooth_idf=smooth_idf)
 
+
+def _weight_by_idf(
+    tf_map: Mapping[str, float],
+    *,
+    df: Mapping[str, int],
+    n_docs: int,
+    smooth_idf: bool,
+) -> tuple[dict[str, float], dict[str, float]]:
+    """(idf_map, tfidf_map) для терминов tf_map."""
     idf_map: dict[str, float] = {}
     tfidf_map: dict[str, float] = {}
     for term, tf_value in tf_map.items():
         idf_value = idf(term, df=df, n_docs=n_docs, smooth=smooth_idf)
         idf_map[term] = idf_value
         tfidf_map[term] = tf_value * idf_value
-
-    return tf_map, idf_map, tfidf_map
+    return idf_map, tfidf_map
 
 
 def load_document_lemmas(lemmas_path: Path) -> dict[str, list[str]]:
@@ -154,11 +173,18 @@ def compute_lemma_tf_for_document(
     total_terms = общее число терминов (размер списка tokens с повторами);
     TF(lemma) = lemma_count / total_terms.
     """
-    total = len(tokens)
+    return compute_lemma_tf_from_counts(Counter(tokens), lemma_groups)
+
+
+def compute_lemma_tf_from_counts(
+    counts: Mapping[str, int],
+    lemma_groups: Mapping[str, Iterable[str]],
+) -> dict[str, float]:
+    """То же, что compute_lemma_tf_for_document, по частотам токенов документа."""
+    total = sum(counts.values())
     if total == 0 or not lemma_groups:
         return {}
 
-    counts = Counter(tokens)
     tf_lemma: dict[str, float] = {}
     for lemma, lemma_tokens in lemma_groups.items():
         lemma_count = 0
@@ -184,17 +210,7 @@ def compute_lemma_tf_idf_for_document(
     Возвращает (tf_lemma_map, idf_lemma_map_for_doc_lemmas, tfidf_lemma_map).
     """
     tf_lemma = compute_lemma_tf_for_document(tokens, lemma_groups)
-    if not tf_lemma:
-        return {}, {}, {}
-
-    idf_lemma: dict[str, float] = {}
-    tfidf_lemma: dict[str, float] = {}
-    for lemma, tf_value in tf_lemma.items():
-        idf_value = idf(lemma, df=df_lemma, n_docs=n_docs, smooth=smooth_idf)
-        idf_lemma[lemma] = idf_value
-        tfidf_lemma[lemma] = tf_value * idf_value
-
-    return tf_lemma, idf_lemma, tfidf_lemma
+    return tf_lemma, *_weight_by_idf(tf_lemma, df=df_lemma, n_docs=n_docs, smooth_idf=smooth_idf)
 
 
 def _doc_id_from_stem(stem: str) -> str:
@@ -224,35 +240,90 @@ def _build_doc_maps(
     return tokens_by_id, lemmas_by_id
 
 
-def _write_tfidf_file(
+def _load_lemma_counts(
+    lemmas_path: Path,
+    term_counts: Mapping[str, int] | None,
+) -> tuple[list[str], dict[str, int]]:
+    """
+    Леммы документа (для DF) и число вхождений каждой леммы с ненулевой частотой.
+
+    Разбор строк совпадает с load_document_lemmas (лемма и токены в нижнем регистре,
+    повторы токенов считаются один раз, повтор леммы заменяет прежнюю строку), но без
+    сортировки токенов, которая для подсчёта не нужна. Без частот (term_counts пуст
+    или None) токены не разбираются.
+    """
+    lines = lemmas_path.read_text(encoding="utf-8").lower().splitlines()
+    if not term_counts:
+        lemmas: dict[str, None] = {}
+        for line in lines:
+            parts = line.split(None, 1)
+            if parts:
+                lemmas[sys.intern(parts[0])] = None
+        return list(lemmas), {}
+
+    counts: dict[str, int] = {}
+    get = term_counts.get
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        tokens: list[str] | set[str] = parts[1:]
+        if len(tokens) > 1:
+            tokens = set(tokens)
+        counts[sys.intern(parts[0])] = sum([get(token, 0) for token in tokens])
+    return list(counts), {lemma: count for lemma, count in counts.items() if count > 0}
+
+
+def _write_ranked_tfidf(
     path: Path,
-    scores: Mapping[str, float],
+    counts: Mapping[str, int],
+    total: int,
     idf_map: Mapping[str, float],
+    line_prefix: Mapping[str, str],
 ) -> None:
     """
     Записывает файл TF-IDF формата:
         <term_or_lemma><пробел><idf><пробел><tf-idf>\\n
+
+    TF = count / total; IDF и начало строки "<term> <idf> " берутся из таблиц корпуса.
     """
-    path.parent.mkdir(parents=True, exist_ok=True)
+    scores = {term: (count / total) * idf_map[term] for term, count in counts.items()} if total else {}
+    # По убыванию TF-IDF, при равенстве — по термину: сортировка устойчива, поэтому
+    # сначала по термину, затем по score с reverse=True.
+    ranked = sorted(scores.items())
+    ranked.sort(key=itemgetter(1), reverse=True)
+    content = "".join(f"{line_prefix[term]}{score:.6f}\n" for term, score in ranked)
+    path.write_text(content, encoding="utf-8")
 
-    # Сортировка: по убыванию TF-IDF, при равенстве — лексикографически по термину.
-    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
 
-    lines: list[str] = []
-    for term, tfidf_value in ranked:
-        idf_value = idf_map.get(term, 0.0)
-        lines.append(f"{term} {idf_value:.6f} {tfidf_value:.6f}")
+# Таблицы корпуса в процессе записи: (out_dir, term_idf, term_prefix, lemma_idf, lemma_prefix),
+# где *_prefix — готовое начало строки "<term> <idf> " для каждого термина.
+_WRITE_TABLES: tuple[Path, dict[str, float], dict[str, str], dict[str, float], dict[str, str]] | None = None
 
-    content = "\n".join(lines)
-    if content:
-        content += "\n"
-    path.write_text(content, encoding="utf-8")
+
+def _init_write_worker(
+    tables: tuple[Path, dict[str, float], dict[str, str], dict[str, float], dict[str, str]],
+) -> None:
+    global _WRITE_TABLES
+    _WRITE_TABLES = tables
+
+
+def _write_document(item: tuple[str, Mapping[str, int], Mapping[str, int]]) -> str:
+    """Пишет tfidf_terms_<id>.txt и tfidf_lemmas_<id>.txt одного документа."""
+    assert _WRITE_TABLES is not None
+    out_dir, term_idf, term_prefix, lemma_idf, lemma_prefix = _WRITE_TABLES
+    doc_id, term_counts, lemma_counts = item
+    total = sum(term_counts.values())
+    _write_ranked_tfidf(out_dir / f"tfidf_terms_{doc_id}.txt", term_counts, total, term_idf, term_prefix)
+    _write_ranked_tfidf(out_dir / f"tfidf_lemmas_{doc_id}.txt", lemma_counts, total, lemma_idf, lemma_prefix)
+    return doc_id
 
 
 def build_tfidf_for_corpus(
     tokens_dir: Path,
     lemmas_dir: Path,
     out_dir: Path,
+    workers: int = 1,
 ) -> int:
     """
     Строит TF/IDF/TF-IDF по терминам и леммам для всего корпуса и сохраняет результаты в файлы.
@@ -263,6 +334,13 @@ def build_tfidf_for_corpus(
 
     Формат строки:
         <термин_или_лемма><пробел><idf><пробел><tf-idf>\\n
+
+    Если рядом с <id>_tokens.txt лежит <id>_counts.txt (analyze --counts), TF считается
+    по настоящему числу вхождений; иначе каждый токен из *_tokens.txt считается один раз.
+
+    Каждый файл читается один раз: за первый проход копятся DF и частоты документов,
+    затем IDF считается одной таблицей на корпус, и файлы пишутся из частот в памяти.
+    При workers > 1 запись идёт в пуле процессов; результат тот же.
     """
     if not tokens_dir.exists():
         print(f"tfidf: tokens directory not found: {tokens_dir}", file=sys.stderr)
@@ -292,65 +370,77 @@ def build_tfidf_for_corpus(
         )
         return 1
 
-    # DF для терминов и лемм по всему корпусу.
-    term_df, n_docs_terms = compute_df(token_files)
-    lemma_df, n_docs_lemmas = compute_lemma_df(lemma_files)
-
     tokens_by_id, lemmas_by_id = _build_doc_maps(token_files, lemma_files)
     common_ids = sorted(set(tokens_by_id) & set(lemmas_by_id))
     if not common_ids:
         print("tfidf: no matching documents between tokens and lemmas", file=sys.stderr)
         return 1
+    common = set(common_ids)
+
+    # Первый проход: DF по всем файлам корпуса и частоты документов, которые будут записаны.
+    # Частоты держатся в памяти до записи, поэтому строки терминов интернируются: одна
+    # копия на корпус вместо копии в каждом документе.
+    term_df: Counter[str] = Counter()
+    term_counts_by_id: dict[str, Mapping[str, int]] = {}
+    counted_ids: list[str] = []
+    for path in token_files:
+        tokens = load_document_tokens(path)
+        term_df.update(set(tokens))
+        doc_id = _doc_id_from_stem(path.stem)
+        if doc_id not in common or tokens_by_id[doc_id] != path:
+            continue
+        doc_counts_path = counts_path(tokens_dir, doc_id)
+        if doc_counts_path.is_file():
+            counts = load_term_counts(doc_counts_path)
+            term_counts_by_id[doc_id] = {sys.intern(term): count for term, count in counts.items()}
+            counted_ids.append(doc_id)
+        else:
+            term_counts_by_id[doc_id] = Counter(map(sys.intern, tokens))
+
+    lemma_df: Counter[str] = Counter()
+    lemma_counts_by_id: dict[str, dict[str, int]] = {}
+    for path in lemma_files:
+        doc_id = _doc_id_from_stem(path.stem)
+        selected = doc_id in common and lemmas_by_id[doc_id] == path
+        lemmas, lemma_counts = _load_lemma_counts(path, term_counts_by_id.get(doc_id) if selected else None)
+        lemma_df.update(lemmas)
+        if selected:
+            lemma_counts_by_id[doc_id] = lemma_counts
+
+    # IDF один раз на термин/лемму корпуса, вместе с готовым началом строки для файлов.
+    term_idf = compute_idf(term_df, len(token_files))
+    lemma_idf = compute_idf(lemma_df, len(lemma_files))
+    for doc_id in counted_ids:
+        # Файл частот мог разойтись с *_tokens.txt: такие термины получают IDF при DF = 0.
+        for term in term_counts_by_id[doc_id]:
+            if term not in term_idf:
+                term_idf[term] = idf(term, df=term_df, n_docs=len(token_files))
+    tables = (
+        out_dir,
+        term_idf,
+        {term: f"{term} {value:.6f} " for term, value in term_idf.items()},
+        lemma_idf,
+        {lemma: f"{lemma} {value:.6f} " for lemma, value in lemma_idf.items()},
+    )
 
     out_dir.mkdir(parents=True, exist_ok=True)
-
-    processed = 0
-    example_terms_path: Path | None = None
-    example_lemmas_path: Path | None = None
-    for doc_id in common_ids:
-        tokens_path = tokens_by_id[doc_id]
-        lemmas_path = lemmas_by_id[doc_id]
-
-        tokens = load_document_tokens(tokens_path)
-        lemma_groups = load_document_lemmas(lemmas_path)
-
-        # Термины.
-        _tf_terms, idf_terms, tfidf_terms = compute_tf_idf_for_document(
-            tokens,
-            df=term_df,
-            n_docs=n_docs_terms,
-            smooth_idf=True,
-        )
-        terms_out_path = out_dir / f"tfidf_terms_{doc_id}.txt"
-        _write_tfidf_file(terms_out_path, tfidf_terms, idf_terms)
-
-        # Леммы.
-        _tf_lemmas, idf_lemmas, tfidf_lemmas = compute_lemma_tf_idf_for_document(
-            tokens,
-            lemma_groups,
-            df_lemma=lemma_df,
-            n_docs=n_docs_lemmas,
-            smooth_idf=True,
-        )
-        lemmas_out_path = out_dir / f"tfidf_lemmas_{doc_id}.txt"
-        _write_tfidf_file(lemmas_out_path, tfidf_lemmas, idf_lemmas)
-
-        processed += 1
-        if example_terms_path is None:
-            example_terms_path = terms_out_path
-        if example_lemmas_path is None:
-            example_lemmas_path = lemmas_out_path
-
-    print(f"tfidf: processed {processed} documents")
+    items = [(doc_id, term_counts_by_id[doc_id], lemma_counts_by_id[doc_id]) for doc_id in common_ids]
+    if workers <= 1:
+        _init_write_worker(tables)
+        processed = sum(1 for _doc_id in map(_write_document, items))
+    else:
+        chunksize = max(1, min(64, len(items) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_write_worker, initargs=(tables,)) as executor:
+            processed = sum(1 for _doc_id in executor.map(_write_document, items, chunksize=chunksize))
+
+    print(f"tfidf: processed {processed} documents ({len(counted_ids)} with term counts)")
     print(f"tfidf: output directory: {out_dir}")
-    if example_terms_path is not None and example_lemmas_path is not None:
-        print(f"tfidf: example terms file: {example_terms_path}")
-        print(f"tfidf: example lemmas file: {example_lemmas_path}")
+    print(f"tfidf: example terms file: {out_dir / f'tfidf_terms_{common_ids[0]}.txt'}")
+    print(f"tfidf: example lemmas file: {out_dir / f'tfidf_lemmas_{common_ids[0]}.txt'}")
 
     return 0
 
 
-
 def demo_tfidf(tokens_dir: Path, doc_tokens: Path | None = None, top_k: int = 10) -> int:
     """
     Демо-функция: строит df/idf по каталогу токенов и печатает top-K TF-IDF для одного документа.
@@ -0,0 +1,305 @@
+"""
+Бинарный формат векторного индекса vector-index-v2 (output/vector_index/vector_index.bin).
+
+Вместо вложенных JSON-словарей {doc: {term: weight}} индекс хранится массивами:
+словарь лемм (отсортирован, ищется двоичным поиском), таблица doc_id, IDF и верхние
+оценки вклада лемм, списки документов по леммам (uint32 номера документов по
+возрастанию + float32 веса) и float32 нормы документов. Файл отображается в память
+через mmap; при загрузке не создаётся ни одного Python-объекта на запись индекса.
+
+Раскладка (little-endian): заголовок _HEADER, затем секции с выравниванием 8 байт,
+смещения и длины секций записаны в заголовке в порядке _SECTIONS.
+"""
+
+import math
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterator, Mapping
+
+from .binary_format import SectionWriter, StringTable, check_byte_order, map_file, pack_string_table, section
+from .cache import LRUCache
+
+VECTOR_INDEX_V2 = "vector-index-v2"
+VECTOR_INDEX_V2_FILENAME = "vector_index.bin"
+
+_MAGIC = b"VECIDX02"
+_FLAG_PRUNABLE = 1
+_SECTIONS = (
+    "term_offsets",
+    "term_blob",
+    "idf",
+    "term_bounds",
+    "postings_ptr",
+    "posting_docs",
+    "posting_weights",
+    "doc_offsets",
+    "doc_blob",
+    "doc_norms",
+    "source_tfidf_dir",
+)
+# magic, n_terms, n_docs, n_postings, flags, n_idf_terms, затем (offset, length) на каждую секцию.
+_HEADER = struct.Struct("<8sIIQII" + "QQ" * len(_SECTIONS))
+
+# Сколько номеров лемм (в том числе отсутствующих в словаре) помнит lookup.
+_TERM_NUMBER_CACHE_SIZE = 65536
+
+# float32 округляет веса и нормы: завышаем оценку, чтобы она оставалась верхней.
+_BOUND_ROUNDING = 1.0 + 1e-6
+
+
+def write_vector_index_v2(
+    payload: Mapping[str, object],
+    path: Path,
+) -> None:
+    """Сохраняет индекс в формате v1 (doc_vectors/idf_map в памяти) как vector-index-v2."""
+    check_byte_order()
+    doc_vectors = payload.get("doc_vectors")
+    idf_map = payload.get("idf_map")
+    if not isinstance(doc_vectors, dict) or not isinstance(idf_map, dict):
+        raise ValueError("invalid vector index payload: doc_vectors/idf_map are required")
+
+    doc_ids = sorted(doc_vectors)
+    vocabulary: set[str] = set(idf_map)
+    for doc_vector in doc_vectors.values():
+        vocabulary.update(doc_vector)
+    # Порядок строк Python совпадает с порядком UTF-8 байт, по которому ищет StringTable.
+    terms = sorted(vocabulary)
+    term_index = {term: i for i, term in enumerate(terms)}
+
+    docs_by_term = [array("I") for _ in terms]
+    weights_by_term = [array("f") for _ in terms]
+    for doc_number, doc_id in enumerate(doc_ids):
+        for term, weight in doc_vectors[doc_id].items():
+            i = term_index[term]
+            docs_by_term[i].append(doc_number)
+            weights_by_term[i].append(weight)
+
+    doc_norms = array("f", [0.0] * len(doc_ids))
+    squares = [0.0] * len(doc_ids)
+    for docs, weights in zip(docs_by_term, weights_by_term):
+        for doc_number, weight in zip(docs, weights):
+            squares[doc_number] += weight * weight
+    for doc_number, square in enumerate(squares):
+        doc_norms[doc_number] = math.sqrt(square)
+
+    prunable = True
+    postings_ptr = array("Q", [0])
+    posting_docs = array("I")
+    posting_weights = array("f")
+    term_bounds = array("f", [0.0] * len(terms))
+    for i, (docs, weights) in enumerate(zip(docs_by_term, weights_by_term)):
+        best = 0.0
+        for doc_number, weight in zip(docs, weights):
+            if weight < 0.0:
+                prunable = False
+            norm = doc_norms[doc_number]
+            if norm > 0.0 and weight / norm > best:
+                best = weight / norm
+        term_bounds[i] = best * _BOUND_ROUNDING
+        posting_docs.extend(docs)
+        posting_weights.extend(weights)
+        postings_ptr.append(len(posting_docs))
+
+    # Леммы без IDF (встречаются только в документах) помечаем NaN: для запроса их нет.
+    idf = array("f", [float(idf_map[term]) if term in idf_map else math.nan for term in terms])
+
+    term_offsets, term_blob = pack_string_table(terms)
+    doc_offsets, doc_blob = pack_string_table(doc_ids)
+    source = str(payload.get("source_tfidf_dir", "")).encode("utf-8")
+
+    writer = SectionWriter(_HEADER.size)
+    placements: list[int] = []
+    for data in (
+        term_offsets,
+        term_blob,
+        idf,
+        term_bounds,
+        postings_ptr,
+        posting_docs,
+        posting_weights,
+        doc_offsets,
+        doc_blob,
+        doc_norms,
+        source,
+    ):
+        placements.extend(writer.add(data))
+
+    header = _HEADER.pack(
+        _MAGIC,
+        len(terms),
+        len(doc_ids),
+        len(posting_docs),
+        _FLAG_PRUNABLE if prunable else 0,
+        sum(1 for term in terms if term in idf_map),
+        *placements,
+    )
+    writer.write(path, header)
+
+
+def is_vector_index_v2(path: Path) -> bool:
+    """Проверяет сигнатуру файла, не читая его целиком."""
+    try:
+        with path.open("rb") as f:
+            return f.read(len(_MAGIC)) == _MAGIC
+    except OSError:
+        return False
+
+
+class _IdfView(Mapping[str, float]):
+    """IDF лемм поверх mmap: поиск по словарю без построения dict."""
+
+    def __init__(self, index: "BinaryVectorIndex") -> None:
+        self._index = index
+
+    def __getitem__(self, term: str) -> float:
+        i = self._index.lookup(term)
+        if i is None:
+            raise KeyError(term)
+        value = float(self._index._idf[i])
+        if math.isnan(value):
+            raise KeyError(term)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        terms = self._index._terms
+        for i in range(len(terms)):
+            if not math.isnan(self._index._idf[i]):
+                yield terms[i]
+
+    def __len__(self) -> int:
+        return self._index._idf_count
+
+
+class BinaryVectorIndex:
+    """
+    Индекс vector-index-v2, отображённый в память.
+
+    Реализует тот же интерфейс доступа для ранжирования, что и представление
+    vector-index-v1 в vector_search: ключ документа — его номер в таблице doc_id
+    (таблица отсортирована, поэтому порядок номеров совпадает с порядком doc_id),
+    ключ леммы — её номер в словаре.
+    """
+
+    def __init__(self, path: Path) -> None:
+        check_byte_order()
+        view = map_file(path)
+        if len(view) < _HEADER.size:
+            raise ValueError("invalid vector index format: file is too short")
+        fields = _HEADER.unpack_from(view, 0)
+        magic, n_terms, n_docs, n_postings, flags, n_idf_terms = fields[:6]
+        if magic != _MAGIC:
+            raise ValueError("invalid vector index format version")
+        placements = dict(zip(_SECTIONS, zip(fields[6::2], fields[7::2])))
+
+        def part(name: str, fmt: str | None = None) -> memoryview:
+            offset, length = placements[name]
+            return section(view, offset, length, fmt)
+
+        self.path = path
+        self.prunable = bool(flags & _FLAG_PRUNABLE)
+        self._idf_count = n_idf_terms
+        self._terms = StringTable(part("term_offsets", "I"), part("term_blob"))
+        self._idf = part("idf", "f")
+        self._bounds = part("term_bounds", "f")
+        self._ptr = part("postings_ptr", "Q")
+        self._docs = part("posting_docs", "I")
+        self._weights = part("posting_weights", "f")
+        self._doc_ids = StringTable(part("doc_offsets", "I"), part("doc_blob"))
+        self._norms = part("doc_norms", "f")
+        self.source_tfidf_dir = bytes(part("source_tfidf_dir")).decode("utf-8")
+        if (
+            len(self._terms) != n_terms
+            or len(self._doc_ids) != n_docs
+            or len(self._ptr) != n_terms + 1
+            or len(self._docs) != n_postings
+            or len(self._norms) != n_docs
+        ):
+            raise ValueError("invalid vector index payload: section sizes do not match header")
+        self.idf_map = _IdfView(self)
+        self._term_numbers: LRUCache[str, int] = LRUCache(_TERM_NUMBER_CACHE_SIZE)
+
+    @property
+    def document_count(self) -> int:
+        return len(self._doc_ids)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._terms)
+
+    def lookup(self, term: str) -> int | None:
+        # Пересчёт score у границы top-K ищет одни и те же леммы запроса для каждого
+        # документа: номера лемм запоминаются, двоичный поиск по mmap — один раз на лемму.
+        # Кэш ограничен: в долгоживущем WEB-процессе леммы запросов произвольны.
+        i = self._term_numbers.get(term)
+        if i is None:
+            i = self._terms.find(term)
+            self._term_numbers.put(term, i)
+        return i if i >= 0 else None
+
+    def postings(self, term: int) -> Iterator[tuple[int, float]]:
+        start, end = self._ptr[term], self._ptr[term + 1]
+        return zip(self._docs[start:end], self._weights[start:end])
+
+    def posting_count(self, term: int) -> int:
+        return self._ptr[term + 1] - self._ptr[term]
+
+    def upper_bound(self, term: int) -> float:
+        return float(self._bounds[term])
+
+    def probe(self, doc: int, term: int) -> float | None:
+        start, end = self._ptr[term], self._ptr[term + 1]
+        # Номера документов в списке леммы возрастают: ищем двоичным поиском.
+        i = bisect_left(self._docs, doc, start, end)
+        if i < end and self._docs[i] == doc:
+            return float(self._weights[i])
+        return None
+
+    def doc_norm(self, doc: int) -> float:
+        return float(self._norms[doc])
+
+    def finish_score(self, doc: int, query_vector: dict[str, float], query_norm: float, dot: float) -> float:
+        doc_norm = float(self._norms[doc])
+        if doc_norm == 0.0:
+            return 0.0
+        return dot / (query_norm * doc_norm)
+
+    def rescore(self, doc: int, query_vector: dict[str, float], query_norm: float, dot: float) -> float:
+        # dot накоплен в другом порядке: пересобираем его в порядке лемм запроса,
+        # как при обходе без отсечения, чтобы score совпадал до бита. Тот же расчёт
+        # векторно повторяет MatrixIndex._rescore_in_query_order.
+        dot = 0.0
+        for term, query_weight in query_vector.items():
+            handle = self.lookup(term)
+            if handle is None:
+                continue
+            weight = self.probe(doc, handle)
+            if weight is not None:
+                dot = dot + query_weight * weight
+        return self.finish_score(doc, query_vector, query_norm, dot)
+
+    def doc_name(self, doc: int) -> str:
+        return self._doc_ids[doc]
+
+    def doc_names(self) -> Iterator[str]:
+        for i in range(len(self._doc_ids)):
+            yield self._doc_ids[i]
+
+    def column_arrays(self) -> tuple[memoryview, memoryview, memoryview, memoryview]:
+        """
+        (postings_ptr, posting_docs, posting_weights, doc_norms) без копирования:
+        списки документов по леммам — это столбцы матрицы документ × лемма в CSC.
+        """
+        return self._ptr, self._docs, self._weights, self._norms
+
+
+def load_vector_index_v2(path: Path) -> dict[str, object]:
+    """Открывает vector-index-v2 и возвращает payload в духе load_vector_index."""
+    index = BinaryVectorIndex(path)
+    return {
+        "format": VECTOR_INDEX_V2,
+        "source_tfidf_dir": index.source_tfidf_dir,
+        "idf_map": index.idf_map,
+        "index": index,
+    }
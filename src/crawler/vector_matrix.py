@@ -0,0 +1,184 @@
+"""
+Матричный backend векторного поиска (NumPy и SciPy — необязательные зависимости).
+
+Индекс разворачивается в разреженную матрицу документ × лемма, строки которой один раз
+при построении делятся на нормы документов. Score запроса — одно произведение столбцов
+его лемм на вектор весов запроса, пачки запросов — одно произведение на матрицу весов
+(лемма × запрос). Матрица хранится по столбцам (CSC): запрос затрагивает только
+столбцы своих лемм, а не все строки.
+
+Матрица суммирует произведения в другом порядке, чем чистый Python, поэтому её score
+приближённый: документы у границы top-K пересчитываются тем же способом, что и при
+полном переборе, и выдача совпадает с ним до бита.
+"""
+
+from typing import Any, Callable, Sequence
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # без NumPy/SciPy поиск идёт по чистому Python
+    np = None
+    sparse = None
+
+MATRIX_BACKEND_AVAILABLE = np is not None
+
+# Относительный запас у границы top-K: приближённый score отличается от точного
+# на единицы последнего бита, запас на порядки больше.
+_BOUNDARY_SLACK = 1e-9
+# Сколько запросов пачки умножается за раз: результат — плотная матрица документ × запрос.
+_BATCH_CHUNK = 64
+
+
+class MatrixIndex:
+    """
+    Нормированная матрица документ × лемма для одного загруженного индекса.
+
+    doc_keys[row] — ключ документа строки в представлении индекса (doc_id для v1,
+    номер документа для v2); строки идут в порядке ключей, как и при ранжировании.
+    column_of(лемма) — номер столбца или None.
+
+    query_order_rescore=True означает, что точный score представления — это сумма
+    weight * query_weight в порядке лемм запроса (так считает vector-index-v2), а номера
+    документов в каждом столбце возрастают: тогда документы у границы пересчитываются
+    векторно по исходным столбцам, с теми же операциями над float64 в том же порядке.
+    """
+
+    def __init__(
+        self,
+        indptr: Sequence[int],
+        rows: Sequence[int],
+        weights: Sequence[float],
+        norms: Sequence[float],
+        doc_keys: Sequence[Any],
+        column_of: Callable[[str], int | None],
+        query_order_rescore: bool = False,
+    ) -> None:
+        if not MATRIX_BACKEND_AVAILABLE:
+            raise RuntimeError("matrix backend requires numpy and scipy")
+        indptr_array = np.asarray(indptr, dtype=np.int64)
+        row_array = np.asarray(rows, dtype=np.int64)
+        data = np.asarray(weights, dtype=np.float64)
+        norm_array = np.asarray(norms, dtype=np.float64)
+        # Отрицательные веса ломают оценку "приближённый score близок к точному"
+        # (сокращение слагаемых): такой индекс ранжируется по чистому Python.
+        self.nonnegative = not data.size or bool(data.min() >= 0.0)
+        scale = np.divide(1.0, norm_array, out=np.zeros_like(norm_array), where=norm_array > 0.0)
+        self.matrix = sparse.csc_matrix(
+            (data * scale[row_array], row_array, indptr_array),
+            shape=(len(doc_keys), len(indptr_array) - 1),
+        )
+        self._doc_keys = doc_keys
+        self._column_of = column_of
+        self._query_order_rescore = query_order_rescore
+        if query_order_rescore:
+            # Исходные столбцы без нормировки; для v2 — без копирования поверх mmap.
+            self._indptr = indptr_array
+            self._column_rows = np.asarray(rows)
+            self._column_weights = np.asarray(weights)
+            self._norms = norm_array
+
+    def _scores(self, queries: Sequence[tuple[dict[str, float], float]]) -> Any:
+        """Приближённые score: плотная матрица документ × запрос."""
+        positions: dict[int, int] = {}
+        entries: list[tuple[int, int, float]] = []
+        for j, (query_vector, query_norm) in enumerate(queries):
+            for term, query_weight in query_vector.items():
+                column = self._column_of(term)
+                if column is None:
+                    continue
+                position = positions.setdefault(column, len(positions))
+                entries.append((position, j, query_weight / query_norm))
+        weights = np.zeros((len(positions), len(queries)))
+        for position, j, value in entries:
+            weights[position, j] += value
+        if not positions:
+            return np.zeros((self.matrix.shape[0], len(queries)))
+        columns = np.fromiter(positions, dtype=np.int64, count=len(positions))
+        return np.asarray(self.matrix[:, columns] @ weights)
+
+    def rank_batch(
+        self,
+        queries: Sequence[tuple[dict[str, float], float]],
+        top_k: int,
+        view: Any,
+    ) -> list[list[tuple[Any, float]]] | None:
+        """
+        Кандидаты top-K для каждого запроса (query_vector, query_norm) с точными score.
+
+        Возвращает документы, чей приближённый score не ниже K-го с запасом, с score,
+        пересчитанным view.rescore; окончательный отбор top-K — за вызывающим.
+        None, если матричное ранжирование к индексу или запросам неприменимо.
+        """
+        if not self.nonnegative:
+            return None
+        for query_vector, _query_norm in queries:
+            if any(weight < 0.0 for weight in query_vector.values()):
+                return None
+
+        results: list[list[tuple[Any, float]]] = []
+        for start in range(0, len(queries), _BATCH_CHUNK):
+            chunk = queries[start : start + _BATCH_CHUNK]
+            active = [j for j, (_vector, query_norm) in enumerate(chunk) if query_norm > 0.0]
+            scores = self._scores([chunk[j] for j in active])
+            columns = dict(zip(active, range(len(active))))
+            for j, (query_vector, query_norm) in enumerate(chunk):
+                if j not in columns:
+                    results.append([])
+                    continue
+                rows = self._boundary_rows(scores[:, columns[j]], top_k)
+                results.append(self._rescore(rows, query_vector, query_norm, view))
+        return results
+
+    @staticmethod
+    def _boundary_rows(scores: Any, top_k: int) -> Any:
+        """Строки с положительным score, не ниже K-го наибольшего с запасом."""
+        positive = np.flatnonzero(scores > 0.0)
+        if len(positive) <= top_k:
+            return positive
+        values = scores[positive]
+        kth = np.partition(values, len(values) - top_k)[len(values) - top_k]
+        return positive[values >= kth * (1.0 - _BOUNDARY_SLACK)]
+
+    def _rescore(
+        self,
+        rows: Any,
+        query_vector: dict[str, float],
+        query_norm: float,
+        view: Any,
+    ) -> list[tuple[Any, float]]:
+        if self._query_order_rescore:
+            scores = self._rescore_in_query_order(rows, query_vector, query_norm).tolist()
+            return [(self._doc_keys[row], score) for row, score in zip(rows.tolist(), scores) if score > 0.0]
+
+        candidates: list[tuple[Any, float]] = []
+        for row in rows.tolist():
+            doc = self._doc_keys[row]
+            # rescore собирает скалярное произведение заново в порядке полного перебора.
+            score = view.rescore(doc, query_vector, query_norm, 0.0)
+            if score > 0.0:
+                candidates.append((doc, score))
+        return candidates
+
+    def _rescore_in_query_order(self, rows: Any, query_vector: dict[str, float], query_norm: float) -> Any:
+        """
+        Точные score строк rows: dot = dot + query_weight * weight по леммам запроса по
+        порядку, затем dot / (query_norm * doc_norm) — как BinaryVectorIndex.rescore.
+        Отсутствующая у документа лемма добавляет +0.0 и значение dot не меняет.
+        """
+        dot = np.zeros(len(rows))
+        for term, query_weight in query_vector.items():
+            column = self._column_of(term)
+            if column is None:
+                continue
+            start, end = int(self._indptr[column]), int(self._indptr[column + 1])
+            if start == end:
+                continue
+            docs = self._column_rows[start:end]
+            positions = np.minimum(np.searchsorted(docs, rows), end - start - 1)
+            found = docs[positions] == rows
+            weights = np.where(found, self._column_weights[start:end][positions].astype(np.float64), 0.0)
+            dot = dot + query_weight * weights
+        doc_norms = self._norms[rows]
+        safe_norms = np.where(doc_norms == 0.0, 1.0, doc_norms)
+        return np.where(doc_norms == 0.0, 0.0, dot / (query_norm * safe_norms))
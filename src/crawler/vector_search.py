@@ -1,14 +1,35 @@
+import heapq
 import json
 import math
 import sys
 from collections import Counter
 from pathlib import Path
-
-from .text_processing import TOKEN_RE, _collect_unique_tokens, _group_by_lemmas
+from typing import Any, Iterable, Mapping, Sequence
+
+from .metrics import time_stage
+from .text_processing import _group_by_lemmas, _text_tokens
+from .vector_index_v2 import (
+    VECTOR_INDEX_V2,
+    VECTOR_INDEX_V2_FILENAME,
+    BinaryVectorIndex,
+    is_vector_index_v2,
+    load_vector_index_v2,
+    write_vector_index_v2,
+)
+from .vector_matrix import MATRIX_BACKEND_AVAILABLE, MatrixIndex
 
 DEFAULT_TFIDF_DIR = Path("output/tfidf")
 DEFAULT_VECTOR_INDEX_DIR = Path("output/vector_index")
 VECTOR_INDEX_FILENAME = "vector_index.json"
+VECTOR_INDEX_V1 = "vector-index-v1"
+VECTOR_INDEX_FORMATS = (VECTOR_INDEX_V1, VECTOR_INDEX_V2)
+VECTOR_BACKEND_PYTHON = "python"
+VECTOR_BACKEND_NUMPY = "numpy"
+VECTOR_BACKENDS = (VECTOR_BACKEND_PYTHON, VECTOR_BACKEND_NUMPY)
+
+# Относительный запас при отсечении по верхним оценкам: защищает от расхождений
+# в последнем бите из-за другого порядка суммирования.
+_PRUNE_SLACK = 1e-9
 
 
 # JSON schema (output/vector_index/vector_index.json):
@@ -19,6 +40,9 @@ VECTOR_INDEX_FILENAME = "vector_index.json"
 #   "doc_norms": {"0001": 1.234, ...},
 #   "idf_map": {"term": 2.345, ...}
 # }
+#
+# Бинарный формат vector-index-v2 (vector_index.bin) описан в vector_index_v2.py.
+# Если в каталоге есть оба файла, используется vector_index.bin.
 
 
 def _normalize_doc_id(doc_id: str) -> str:
@@ -62,29 +86,36 @@ def _norm_sparse(vector: dict[str, float]) -> float:
 
 
 def _vector_index_path(index_dir: Path) -> Path:
+    binary_path = index_dir / VECTOR_INDEX_V2_FILENAME
+    if binary_path.is_file():
+        return binary_path
     return index_dir / VECTOR_INDEX_FILENAME
 
 
 def _tokenize_query_terms(text: str) -> list[str]:
-    raw_tokens = TOKEN_RE.findall(text.lower())
-    query_terms: list[str] = []
-    for raw in raw_tokens:
-        accepted = _collect_unique_tokens([raw])
-        if accepted:
-            query_terms.append(accepted[0])
-    return query_terms
+    return _text_tokens(text)
 
 
-def _lemmatize_terms(terms: list[str]) -> list[str]:
+def _lemma_map(terms: Iterable[str], stage: str = "lemmatize") -> dict[str, str]:
+    """
+    Токен -> лемма для всех токенов одним вызовом aspell; токены без леммы не попадают.
+    stage — имя этапа в метриках (у пачки запросов своё).
+    """
     unique_terms = sorted(set(terms))
     try:
-        lemma_groups = _group_by_lemmas(unique_terms)
+        with time_stage(stage):
+            lemma_groups = _group_by_lemmas(unique_terms)
     except RuntimeError as exc:
         raise ValueError(str(exc)) from exc
     token_to_lemma: dict[str, str] = {}
     for lemma, tokens in lemma_groups.items():
         for token in tokens:
             token_to_lemma[token] = lemma
+    return token_to_lemma
+
+
+def _lemmatize_terms(terms: list[str]) -> list[str]:
+    token_to_lemma = _lemma_map(terms)
     return [token_to_lemma.get(term, term) for term in terms]
 
 
@@ -115,7 +146,7 @@ def load_doc_vector(doc_id: str, tfidf_dir: Path = DEFAULT_TFIDF_DIR) -> dict[st
 def build_query_vector(
     text: str,
     tfidf_dir: Path = DEFAULT_TFIDF_DIR,
-    idf_map: dict[str, float] | None = None,
+    idf_map: Mapping[str, float] | None = None,
 ) -> dict[str, float]:
     """
     Строит TF-IDF вектор запроса в пространстве лемм корпуса.
@@ -125,7 +156,8 @@ def build_query_vector(
     if not text or not text.strip():
         raise ValueError("query is empty")
 
-    query_terms = _tokenize_query_terms(text)
+    with time_stage("tokenize"):
+        query_terms = _tokenize_query_terms(text)
     if not query_terms:
         raise ValueError("query is empty after tokenization/filtering")
 
@@ -136,13 +168,16 @@ def build_query_vector(
     effective_idf_map = idf_map if idf_map is not None else _load_idf_map(tfidf_dir)
     if not effective_idf_map:
         raise ValueError(f"no TF-IDF corpus data found in: {tfidf_dir}")
+    return _query_vector_from_lemmas(query_lemmas, effective_idf_map)
 
+
+def _query_vector_from_lemmas(query_lemmas: list[str], idf_map: Mapping[str, float]) -> dict[str, float]:
     total = len(query_lemmas)
     counts = Counter(query_lemmas)
 
     vector: dict[str, float] = {}
     for term, count in counts.items():
-        idf_value = effective_idf_map.get(term)
+        idf_value = idf_map.get(term)
         if idf_value is None:
             continue
         tf_query = count / total
@@ -178,10 +213,17 @@ def cosine_similarity_sparse(vec_a: dict[str, float], vec_b: dict[str, float]) -
 def build_vector_index(
     tfidf_dir: Path = DEFAULT_TFIDF_DIR,
     index_dir: Path = DEFAULT_VECTOR_INDEX_DIR,
+    index_format: str = VECTOR_INDEX_V1,
 ) -> dict[str, dict[str, dict[str, float]] | dict[str, float] | str]:
     """
     Строит и сохраняет векторный индекс по существующим TF-IDF файлам лемм.
+
+    index_format: "vector-index-v1" (JSON) или "vector-index-v2" (бинарный, для mmap).
+    Возвращает payload в формате v1 независимо от формата файла.
     """
+    if index_format not in VECTOR_INDEX_FORMATS:
+        raise ValueError(f"unknown vector index format: {index_format}")
+
     tfidf_files = _iter_tfidf_files(tfidf_dir)
     if not tfidf_files:
         raise ValueError(f"no TF-IDF lemma files found in: {tfidf_dir}")
@@ -199,7 +241,7 @@ def build_vector_index(
         doc_norms[doc_id] = _norm_sparse(vector)
 
     index_payload: dict[str, dict[str, dict[str, float]] | dict[str, float] | str] = {
-        "format": "vector-index-v1",
+        "format": VECTOR_INDEX_V1,
         "source_tfidf_dir": str(tfidf_dir),
         "doc_vectors": doc_vectors,
         "doc_norms": doc_norms,
@@ -207,28 +249,64 @@ def build_vector_index(
     }
 
     index_dir.mkdir(parents=True, exist_ok=True)
-    index_path = _vector_index_path(index_dir)
-    index_path.write_text(
+    if index_format == VECTOR_INDEX_V2:
+        write_vector_index_v2(index_payload, index_dir / VECTOR_INDEX_V2_FILENAME)
+        return index_payload
+
+    index_path = index_dir / VECTOR_INDEX_FILENAME
+    # Пишем во временный файл и подменяем через rename: читатели (WEB-сервер)
+    # видят либо старый, либо новый индекс целиком, но не недописанный файл.
+    tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+    tmp_path.write_text(
         json.dumps(index_payload, ensure_ascii=False, separators=(",", ":")),
         encoding="utf-8",
     )
+    tmp_path.replace(index_path)
+    # Старый vector_index.bin иначе заслонил бы только что построенный JSON.
+    (index_dir / VECTOR_INDEX_V2_FILENAME).unlink(missing_ok=True)
     return index_payload
 
 
+def convert_vector_index(index_dir: Path = DEFAULT_VECTOR_INDEX_DIR) -> Path:
+    """
+    Переводит vector_index.json (v1) в vector_index.bin (v2) в том же каталоге.
+
+    JSON остаётся на месте; при загрузке каталога предпочтение отдаётся v2.
+    """
+    source_path = index_dir / VECTOR_INDEX_FILENAME
+    if not source_path.is_file():
+        raise FileNotFoundError(f"vector index file not found: {source_path}")
+    payload = _load_vector_index_v1(source_path)
+    target_path = index_dir / VECTOR_INDEX_V2_FILENAME
+    write_vector_index_v2(payload, target_path)
+    return target_path
+
+
 def load_vector_index(
     index_dir: Path = DEFAULT_VECTOR_INDEX_DIR,
 ) -> dict[str, dict[str, dict[str, float]] | dict[str, float] | str]:
     """
-    Загружает сериализованный индекс из JSON.
+    Загружает сериализованный индекс; формат (JSON v1 или бинарный v2) определяется по файлу.
+
+    Для v2 возвращается {"format", "source_tfidf_dir", "idf_map", "index"}, где idf_map —
+    отображение поверх mmap, а index — BinaryVectorIndex.
     """
     index_path = _vector_index_path(index_dir)
     if not index_path.exists() or not index_path.is_file():
         raise FileNotFoundError(f"vector index file not found: {index_path}")
+    with time_stage("index_load"):
+        if is_vector_index_v2(index_path):
+            return load_vector_index_v2(index_path)
+        return _load_vector_index_v1(index_path)
 
+
+def _load_vector_index_v1(
+    index_path: Path,
+) -> dict[str, dict[str, dict[str, float]] | dict[str, float] | str]:
     payload = json.loads(index_path.read_text(encoding="utf-8"))
     if not isinstance(payload, dict):
         raise ValueError("invalid vector index format: expected top-level JSON object")
-    if payload.get("format") != "vector-index-v1":
+    if payload.get("format") != VECTOR_INDEX_V1:
         raise ValueError("invalid vector index format version")
 
     doc_vectors = payload.get("doc_vectors")
@@ -258,7 +336,7 @@ def load_vector_index(
             cast_idf_map[term] = float(idf_value)
 
     return {
-        "format": "vector-index-v1",
+        "format": VECTOR_INDEX_V1,
         "source_tfidf_dir": str(payload.get("source_tfidf_dir", "")),
         "doc_vectors": cast_doc_vectors,
         "doc_norms": cast_doc_norms,
@@ -286,38 +364,464 @@ def _cosine_similarity_with_doc_norm(
     return dot / (query_norm * doc_norm)
 
 
+def _get_postings(
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+) -> dict[str, list[tuple[str, float]]]:
+    """
+    Инвертированное представление индекса: лемма -> [(doc_id, weight), ...].
+
+    Строится один раз на загруженный индекс и хранится в нём же под ключом "postings",
+    поэтому при кэшировании индекса в памяти (WEB-интерфейс) не пересчитывается.
+    """
+    postings = vector_index.get("postings")
+    if isinstance(postings, dict):
+        return postings
+
+    doc_vectors = vector_index.get("doc_vectors")
+    if not isinstance(doc_vectors, dict):
+        raise ValueError("invalid vector index payload")
+
+    built: dict[str, list[tuple[str, float]]] = {}
+    for doc_id, doc_vector in doc_vectors.items():
+        if not isinstance(doc_id, str) or not isinstance(doc_vector, dict):
+            continue
+        for term, weight in doc_vector.items():
+            built.setdefault(term, []).append((doc_id, weight))
+    vector_index["postings"] = built
+    return built
+
+
+def _get_term_upper_bounds(
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+) -> dict[str, float]:
+    """
+    Верхняя оценка вклада леммы в cosine: max(weight / doc_norm) по её списку документов.
+
+    Пустой словарь означает, что отсечение по оценкам неприменимо (в индексе есть
+    отрицательные веса и частичные суммы перестают быть нижними оценками score).
+    """
+    bounds = vector_index.get("term_upper_bounds")
+    if isinstance(bounds, dict):
+        return bounds
+
+    doc_norms = vector_index["doc_norms"]
+    assert isinstance(doc_norms, dict)
+    built: dict[str, float] = {}
+    for term, postings in _get_postings(vector_index).items():
+        best = 0.0
+        for doc_id, weight in postings:
+            if weight < 0.0:
+                vector_index["term_upper_bounds"] = {}
+                return {}
+            doc_norm = float(doc_norms.get(doc_id, 0.0))
+            if doc_norm > 0.0 and weight / doc_norm > best:
+                best = weight / doc_norm
+        built[term] = best
+    vector_index["term_upper_bounds"] = built
+    return built
+
+
+class _DictIndexView:
+    """
+    Доступ ранжирования к vector-index-v1: вложенные dict и списки документов по леммам.
+
+    Тот же набор методов реализует BinaryVectorIndex (vector-index-v2), поэтому
+    _score_candidates и _rank_with_max_score работают с обоими форматами.
+    Ключ документа здесь — сам doc_id, ключ леммы — сама лемма.
+    """
+
+    def __init__(self, vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str]) -> None:
+        doc_vectors = vector_index.get("doc_vectors")
+        doc_norms = vector_index.get("doc_norms")
+        if not isinstance(doc_vectors, dict) or not isinstance(doc_norms, dict):
+            raise ValueError("invalid vector index payload")
+        self._vector_index = vector_index
+        self._doc_vectors = doc_vectors
+        self._doc_norms = doc_norms
+        self._postings = _get_postings(vector_index)
+
+    @property
+    def prunable(self) -> bool:
+        return bool(_get_term_upper_bounds(self._vector_index))
+
+    def lookup(self, term: str) -> str | None:
+        return term if term in self._postings else None
+
+    def postings(self, term: str) -> list[tuple[str, float]]:
+        return self._postings[term]
+
+    def posting_count(self, term: str) -> int:
+        return len(self._postings[term])
+
+    def upper_bound(self, term: str) -> float:
+        return _get_term_upper_bounds(self._vector_index)[term]
+
+    def probe(self, doc_id: str, term: str) -> float | None:
+        return self._doc_vectors[doc_id].get(term)
+
+    def doc_norm(self, doc_id: str) -> float:
+        return float(self._doc_norms.get(doc_id, 0.0))
+
+    def finish_score(self, doc_id: str, query_vector: dict[str, float], query_norm: float, dot: float) -> float:
+        doc_norm = self.doc_norm(doc_id)
+        if doc_norm == 0.0:
+            return 0.0
+        doc_vector = self._doc_vectors[doc_id]
+        if len(doc_vector) < len(query_vector):
+            # Полный перебор суммирует по более короткому вектору; для документов короче
+            # запроса повторяем его порядок суммирования, чтобы score совпадал до бита.
+            return _cosine_similarity_with_doc_norm(query_vector, query_norm, doc_vector, doc_norm)
+        return dot / (query_norm * doc_norm)
+
+    def rescore(self, doc_id: str, query_vector: dict[str, float], query_norm: float, dot: float) -> float:
+        # dot накоплен в другом порядке: считаем score заново так же, как полный перебор.
+        doc_norm = self.doc_norm(doc_id)
+        return _cosine_similarity_with_doc_norm(query_vector, query_norm, self._doc_vectors[doc_id], doc_norm)
+
+    def doc_name(self, doc_id: str) -> str:
+        return doc_id
+
+
+def _index_view(
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+) -> Any:
+    """Представление загруженного индекса для ранжирования (v1 или v2)."""
+    if vector_index.get("format") == VECTOR_INDEX_V2:
+        binary_index = vector_index.get("index")
+        if not isinstance(binary_index, BinaryVectorIndex):
+            raise ValueError("invalid vector index payload")
+        return binary_index
+    return _DictIndexView(vector_index)
+
+
+def _score_candidates(
+    query_vector: dict[str, float],
+    query_norm: float,
+    view: Any,
+) -> list[tuple[Any, float]]:
+    """
+    Term-at-a-time: проходит только по спискам документов для лемм запроса
+    и накапливает скалярные произведения в аккумуляторах.
+
+    Возвращает документы с положительной cosine similarity (без сортировки).
+    """
+    if query_norm == 0.0 or not query_vector:
+        return []
+
+    accumulators: dict[Any, float] = {}
+    for term, query_weight in query_vector.items():
+        handle = view.lookup(term)
+        if handle is None:
+            continue
+        for doc, weight in view.postings(handle):
+            accumulators[doc] = accumulators.get(doc, 0.0) + query_weight * weight
+
+    candidates: list[tuple[Any, float]] = []
+    for doc, dot in accumulators.items():
+        score = view.finish_score(doc, query_vector, query_norm, dot)
+        if score > 0.0:
+            candidates.append((doc, score))
+    return candidates
+
+
+def _get_matrix(
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+    view: Any,
+) -> MatrixIndex | None:
+    """
+    Матрица документ × лемма для матричного backend; None без NumPy/SciPy.
+
+    Как и списки документов, строится один раз на загруженный индекс и хранится
+    в нём под ключом "matrix".
+    """
+    if not MATRIX_BACKEND_AVAILABLE:
+        return None
+    matrix = vector_index.get("matrix")
+    if isinstance(matrix, MatrixIndex):
+        return matrix
+
+    if isinstance(view, BinaryVectorIndex):
+        ptr, docs, weights, norms = view.column_arrays()
+        matrix = MatrixIndex(
+            ptr, docs, weights, norms, range(view.document_count), view.lookup, query_order_rescore=True
+        )
+    else:
+        doc_vectors = vector_index["doc_vectors"]
+        doc_norms = vector_index["doc_norms"]
+        assert isinstance(doc_vectors, dict) and isinstance(doc_norms, dict)
+        doc_ids = sorted(doc_vectors)
+        row_of = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        postings = _get_postings(vector_index)
+        terms = sorted(postings)
+        indptr = [0]
+        rows: list[int] = []
+        weights_list: list[float] = []
+        for term in terms:
+            for doc_id, weight in postings[term]:
+                rows.append(row_of[doc_id])
+                weights_list.append(weight)
+            indptr.append(len(rows))
+        norms_list = [float(doc_norms.get(doc_id, 0.0)) for doc_id in doc_ids]
+        columns = {term: column for column, term in enumerate(terms)}
+        matrix = MatrixIndex(indptr, rows, weights_list, norms_list, doc_ids, columns.get)
+    vector_index["matrix"] = matrix
+    return matrix
+
+
+def _rank_key(item: tuple[Any, float]) -> tuple[float, Any]:
+    return -item[1], item[0]
+
+
+def _top_k(candidates: Iterable[tuple[Any, float]], top_k: int) -> list[tuple[Any, float]]:
+    """Top-K по убыванию score (при равенстве — по doc_id) ограниченной кучей, без сортировки всех кандидатов."""
+    return heapq.nsmallest(top_k, candidates, key=_rank_key)
+
+
+def _kth_largest(values: Iterable[float], k: int) -> float:
+    largest = heapq.nlargest(k, values)
+    return largest[-1] if len(largest) >= k else 0.0
+
+
+def _rank_with_max_score(
+    query_vector: dict[str, float],
+    query_norm: float,
+    top_k: int,
+    view: Any,
+) -> list[tuple[Any, float]] | None:
+    """
+    Top-K с отсечением MaxScore; None, если отсечение неприменимо к индексу или запросу.
+
+    Леммы запроса обходятся по убыванию верхней оценки вклада. Пока сумма оценок
+    оставшихся лемм не ниже порога (K-й частичный score), новые документы набираются
+    из списков ("существенные" леммы). Как только она опускается ниже, документ вне
+    аккумуляторов уже не попадёт в top-K: по оставшимся леммам только уточняем
+    набранных кандидатов и отбрасываем тех, кому не хватает даже верхней оценки.
+    Итоговые score кандидатов у границы top-K пересчитываются тем же способом,
+    что и при полном переборе, поэтому выдача совпадает с ним до бита.
+    """
+    if query_norm == 0.0 or not view.prunable:
+        return None
+
+    terms: list[tuple[float, Any, float]] = []
+    for term, query_weight in query_vector.items():
+        if query_weight < 0.0:
+            return None
+        handle = view.lookup(term)
+        if handle is not None:
+            terms.append((query_weight * view.upper_bound(handle) / query_norm, handle, query_weight))
+    terms.sort(key=lambda item: -item[0])
+
+    remaining = [0.0] * (len(terms) + 1)
+    for i in range(len(terms) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + terms[i][0]
+
+    def partial_score(doc: Any, dot: float) -> float:
+        doc_norm = view.doc_norm(doc)
+        return dot / (query_norm * doc_norm) if doc_norm > 0.0 else 0.0
+
+    # Существенные леммы: набираем кандидатов из списков документов.
+    accumulators: dict[Any, float] = {}
+    threshold = 0.0
+    position = 0
+    while position < len(terms):
+        _bound, handle, query_weight = terms[position]
+        for doc, weight in view.postings(handle):
+            accumulators[doc] = accumulators.get(doc, 0.0) + query_weight * weight
+        position += 1
+        if position < len(terms) and len(accumulators) >= top_k:
+            threshold = _kth_largest((partial_score(d, dot) for d, dot in accumulators.items()), top_k)
+            if remaining[position] * (1.0 + _PRUNE_SLACK) < threshold * (1.0 - _PRUNE_SLACK):
+                break
+
+    # Несущественные леммы: только уточняем уже набранных кандидатов.
+    while position < len(terms):
+        cutoff = threshold * (1.0 - _PRUNE_SLACK) - remaining[position] * (1.0 + _PRUNE_SLACK)
+        accumulators = {d: dot for d, dot in accumulators.items() if partial_score(d, dot) >= cutoff}
+        _bound, handle, query_weight = terms[position]
+        if len(accumulators) < view.posting_count(handle):
+            for doc in accumulators:
+                weight = view.probe(doc, handle)
+                if weight is not None:
+                    accumulators[doc] += query_weight * weight
+        else:
+            for doc, weight in view.postings(handle):
+                if doc in accumulators:
+                    accumulators[doc] += query_weight * weight
+        position += 1
+        threshold = _kth_largest((partial_score(d, dot) for d, dot in accumulators.items()), top_k)
+
+    approx = _top_k(((d, partial_score(d, dot)) for d, dot in accumulators.items()), top_k)
+    if not approx:
+        return []
+    boundary = approx[-1][1] * (1.0 - _PRUNE_SLACK)
+
+    candidates: list[tuple[Any, float]] = []
+    for doc, dot in accumulators.items():
+        if partial_score(doc, dot) < boundary:
+            continue
+        score = view.rescore(doc, query_vector, query_norm, dot)
+        if score > 0.0:
+            candidates.append((doc, score))
+    return _top_k(candidates, top_k)
+
+
+def prepare_vector_index(
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+    backend: str = VECTOR_BACKEND_PYTHON,
+) -> None:
+    """
+    Заранее строит то, что поиск иначе строит на первом запросе: списки документов и
+    верхние оценки лемм (vector-index-v1), матрицу для backend="numpy". WEB-сервер с
+    несколькими процессами вызывает его до fork, чтобы процессы получили их готовыми.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"unknown vector search backend: {backend}")
+    view = _index_view(vector_index)
+    if isinstance(view, _DictIndexView):
+        _get_term_upper_bounds(vector_index)
+    if backend == VECTOR_BACKEND_NUMPY:
+        _get_matrix(vector_index, view)
+
+
 def search_in_loaded_index(
     query: str,
     top_k: int,
     vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
     tfidf_dir: Path = DEFAULT_TFIDF_DIR,
+    exhaustive: bool = False,
+    backend: str = VECTOR_BACKEND_PYTHON,
 ) -> list[tuple[str, float]]:
     """
     Поиск только по уже загруженному векторному индексу (без чтения TF-IDF файлов).
+
+    По умолчанию top-K выбирается с отсечением MaxScore; exhaustive=True считает score
+    всех документов с общими леммами (эталон для сравнения, выдача та же).
+    backend="numpy" считает score одним произведением разреженной матрицы на вектор
+    запроса (vector_matrix); без NumPy/SciPy используется чистый Python, выдача та же.
     """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"unknown vector search backend: {backend}")
     if top_k <= 0:
         return []
 
     idf_map = vector_index.get("idf_map")
-    doc_vectors = vector_index.get("doc_vectors")
-    doc_norms = vector_index.get("doc_norms")
-    if not isinstance(idf_map, dict) or not isinstance(doc_vectors, dict) or not isinstance(doc_norms, dict):
+    if not isinstance(idf_map, Mapping):
         raise ValueError("invalid vector index payload")
 
     query_vector = build_query_vector(query, tfidf_dir=tfidf_dir, idf_map=idf_map)
+    return rank_query_vector(query_vector, top_k, vector_index, exhaustive=exhaustive, backend=backend)
+
+
+def rank_query_vector(
+    query_vector: dict[str, float],
+    top_k: int,
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+    exhaustive: bool = False,
+    backend: str = VECTOR_BACKEND_PYTHON,
+) -> list[tuple[str, float]]:
+    """
+    Top-K документов для готового вектора запроса (лемма -> вес), как в search_in_loaded_index.
+
+    Score суммируется в порядке лемм вектора: одинаковые векторы с одинаковым порядком
+    лемм дают одинаковую до бита выдачу.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"unknown vector search backend: {backend}")
+    if top_k <= 0:
+        return []
+    view = _index_view(vector_index)
     query_norm = _norm_sparse(query_vector)
 
-    candidates: list[tuple[str, float]] = []
-    for doc_id, doc_vector in doc_vectors.items():
-        if not isinstance(doc_id, str) or not isinstance(doc_vector, dict):
-            continue
-        doc_norm = float(doc_norms.get(doc_id, 0.0))
-        score = _cosine_similarity_with_doc_norm(query_vector, query_norm, doc_vector, doc_norm)
-        if score > 0.0:
-            candidates.append((doc_id, score))
+    with time_stage("score"):
+        ranked = None
+        if not exhaustive and backend == VECTOR_BACKEND_NUMPY:
+            matrix = _get_matrix(vector_index, view)
+            candidates = matrix.rank_batch([(query_vector, query_norm)], top_k, view) if matrix is not None else None
+            if candidates is not None:
+                ranked = _top_k(candidates[0], top_k)
+        if not exhaustive and ranked is None:
+            ranked = _rank_with_max_score(query_vector, query_norm, top_k, view)
+        if ranked is None:
+            ranked = _top_k(_score_candidates(query_vector, query_norm, view), top_k)
+        return [(view.doc_name(doc), score) for doc, score in ranked]
+
+
+def search_batch(
+    queries: Sequence[str],
+    top_k: int,
+    vector_index: dict[str, dict[str, dict[str, float]] | dict[str, float] | str],
+    tfidf_dir: Path = DEFAULT_TFIDF_DIR,
+    backend: str = VECTOR_BACKEND_PYTHON,
+) -> list[tuple[list[tuple[str, float]], str | None]]:
+    """
+    Поиск пачки запросов по уже загруженному векторному индексу.
+
+    Для каждого запроса возвращает (выдача, None) или ([], текст ошибки): пустой запрос
+    или запрос без лемм корпуса не прерывают пачку. ValueError — только для ошибок всей
+    пачки (индекс, backend, aspell).
+
+    Все уникальные слова пачки лемматизируются одним вызовом aspell. С backend="numpy"
+    score всех запросов считаются вместе — произведением матрицы документ × лемма на
+    матрицу запросов; иначе каждый запрос ранжируется MaxScore, как в search_in_loaded_index.
+    Выдача каждого запроса та же, что у search_in_loaded_index.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"unknown vector search backend: {backend}")
+    if top_k <= 0:
+        return [([], None) for _ in queries]
 
-    candidates.sort(key=lambda item: (-item[1], item[0]))
-    return candidates[:top_k]
+    idf_map = vector_index.get("idf_map")
+    if not isinstance(idf_map, Mapping):
+        raise ValueError("invalid vector index payload")
+    view = _index_view(vector_index)
+    if not idf_map:
+        raise ValueError(f"no TF-IDF corpus data found in: {tfidf_dir}")
+
+    errors: list[str | None] = [None] * len(queries)
+    query_terms: list[list[str]] = []
+    with time_stage("tokenize_batch"):
+        for j, query in enumerate(queries):
+            terms: list[str] = []
+            if not query or not query.strip():
+                errors[j] = "query is empty"
+            else:
+                terms = _tokenize_query_terms(query)
+                if not terms:
+                    errors[j] = "query is empty after tokenization/filtering"
+            query_terms.append(terms)
+
+    token_to_lemma = _lemma_map((term for terms in query_terms for term in terms), stage="lemmatize_batch")
+    active: list[int] = []
+    vectors: list[tuple[dict[str, float], float]] = []
+    for j, terms in enumerate(query_terms):
+        if errors[j] is not None:
+            continue
+        try:
+            query_vector = _query_vector_from_lemmas([token_to_lemma.get(term, term) for term in terms], idf_map)
+        except ValueError as exc:
+            errors[j] = str(exc)
+            continue
+        active.append(j)
+        vectors.append((query_vector, _norm_sparse(query_vector)))
+
+    ranked: list[list[tuple[str, float]]] = [[] for _ in queries]
+    with time_stage("score_batch"):
+        candidates = None
+        if backend == VECTOR_BACKEND_NUMPY:
+            matrix = _get_matrix(vector_index, view)
+            if matrix is not None:
+                candidates = matrix.rank_batch(vectors, top_k, view)
+        if candidates is None:
+            candidates = []
+            for query_vector, query_norm in vectors:
+                query_ranked = _rank_with_max_score(query_vector, query_norm, top_k, view)
+                if query_ranked is None:
+                    query_ranked = _score_candidates(query_vector, query_norm, view)
+                candidates.append(query_ranked)
+
+        for j, query_candidates in zip(active, candidates):
+            ranked[j] = [(view.doc_name(doc), score) for doc, score in _top_k(query_candidates, top_k)]
+    return list(zip(ranked, errors))
 
 
 def search(
@@ -352,13 +856,13 @@ def search(
             print(f"vector-search: {exc}", file=sys.stderr)
             return []
 
-        candidates: list[tuple[str, float]] = []
-        for tfidf_file in _iter_tfidf_files(tfidf_dir):
-            doc_id = _doc_id_from_tfidf_file(tfidf_file)
-            doc_vector = load_doc_vector(doc_id, tfidf_dir=tfidf_dir)
-            score = cosine_similarity_sparse(doc_vector, query_vector)
-            if score > 0.0:
-                candidates.append((doc_id, score))
+        def iter_scored() -> Iterable[tuple[str, float]]:
+            for tfidf_file in _iter_tfidf_files(tfidf_dir):
+                doc_id = _doc_id_from_tfidf_file(tfidf_file)
+                doc_vector = load_doc_vector(doc_id, tfidf_dir=tfidf_dir)
+                score = cosine_similarity_sparse(doc_vector, query_vector)
+                if score > 0.0:
+                    yield doc_id, score
 
-        candidates.sort(key=lambda item: (-item[1], item[0]))
-        return candidates[:top_k]
+        # Куча размера top_k: кандидаты не копятся в памяти целиком.
+        return _top_k(iter_scored(), top_k)
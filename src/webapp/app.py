@@ -1,13 +1,28 @@
+import time
 from pathlib import Path
 
-from flask import Flask, render_template_string, request
+from flask import Flask, Response, g, jsonify, render_template_string, request
 
-from crawler.cli import _read_url_index
-from crawler.vector_search import load_vector_index, search_in_loaded_index
+from crawler.metrics import inc, metrics_enabled, observe, render_prometheus, time_stage
+from crawler.vector_search import (
+    VECTOR_BACKEND_PYTHON,
+    build_query_vector,
+    rank_query_vector,
+    search_batch,
+    search_in_loaded_index,
+)
+
+from .index_holder import IndexHolder
+from .search_cache import DEFAULT_SEARCH_CACHE_SIZE, DEFAULT_SEARCH_CACHE_TTL, SearchResultCache, search_cache_key
 
 DEFAULT_VECTOR_INDEX_DIR = Path("output/vector_index")
 DEFAULT_CORPUS_INDEX_PATH = Path("output/index.txt")
 DEFAULT_TOP_K = 10
+# Ограничения /api/search и /api/search/batch: пачка считается в одном запросе к серверу.
+MAX_BATCH_QUERIES = 1000
+MAX_TOP_K = 100
+# Эндпоинты, время обработки которых попадает в search_request_seconds.
+_TIMED_ENDPOINTS = frozenset({"search", "search_api", "search_batch_api"})
 
 PAGE_TEMPLATE = """
 <!doctype html>
@@ -73,11 +88,47 @@ def create_app(
     vector_index_dir: Path = DEFAULT_VECTOR_INDEX_DIR,
     corpus_index_path: Path = DEFAULT_CORPUS_INDEX_PATH,
     top_k: int = DEFAULT_TOP_K,
+    backend: str = VECTOR_BACKEND_PYTHON,
+    search_cache_size: int = DEFAULT_SEARCH_CACHE_SIZE,
+    search_cache_ttl: float | None = DEFAULT_SEARCH_CACHE_TTL,
+    auto_reload: bool = True,
 ) -> Flask:
+    """
+    Собирает приложение; индекс не загружается.
+
+    Индекс загружается при первом запросе или заранее — launcher вызывает
+    app.config["INDEX_HOLDER"].preload(): импорт модуля (app ниже) не читает файлы.
+    auto_reload=False отключает проверку файлов индекса на запросах (см. IndexHolder).
+
+    Сбор метрик — настройка процесса, а не приложения: его включает launcher через
+    crawler.metrics.configure_metrics до загрузки индекса, чтобы она попала в
+    index_reloads_total.
+    """
     app = Flask(__name__)
     app.config["VECTOR_INDEX_DIR"] = vector_index_dir
     app.config["CORPUS_INDEX_PATH"] = corpus_index_path
     app.config["TOP_K"] = top_k
+    app.config["SEARCH_BACKEND"] = backend
+
+    # Индекс загружается один раз на процесс и перечитывается только при изменении файлов.
+    index_holder = IndexHolder(
+        vector_index_dir=vector_index_dir, corpus_index_path=corpus_index_path, auto_reload=auto_reload
+    )
+    app.config["INDEX_HOLDER"] = index_holder
+    search_cache = SearchResultCache(search_cache_size, ttl=search_cache_ttl)
+    app.config["SEARCH_CACHE"] = search_cache
+
+    @app.before_request
+    def start_timer():
+        if metrics_enabled():
+            g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response: Response) -> Response:
+        started = g.get("request_started")
+        if started is not None and request.endpoint in _TIMED_ENDPOINTS:
+            observe("search_request_seconds", time.perf_counter() - started, endpoint=request.endpoint)
+        return response
 
     @app.get("/")
     def index():
@@ -94,9 +145,10 @@ def create_app(
                 message="Введите запрос",
                 error="",
             )
+        inc("search_queries_total", endpoint="search")
 
         try:
-            vector_index = load_vector_index(index_dir=app.config["VECTOR_INDEX_DIR"])
+            vector_index = index_holder.get_vector_index()
         except FileNotFoundError:
             return render_template_string(
                 PAGE_TEMPLATE,
@@ -119,7 +171,7 @@ def create_app(
             )
 
         try:
-            url_map = _read_url_index(app.config["CORPUS_INDEX_PATH"])
+            url_map = index_holder.get_url_map()
         except ValueError as exc:
             return render_template_string(
                 PAGE_TEMPLATE,
@@ -134,6 +186,7 @@ def create_app(
                 query=query,
                 top_k=app.config["TOP_K"],
                 vector_index=vector_index,
+                backend=app.config["SEARCH_BACKEND"],
             )
         except ValueError as exc:
             return render_template_string(
@@ -152,14 +205,151 @@ def create_app(
             }
             for doc_id, score in ranked
         ]
+        if not results:
+            inc("search_empty_results_total", endpoint="search")
         message = "Ничего не найдено" if not results else ""
-        return render_template_string(
-            PAGE_TEMPLATE,
-            query=query,
-            results=results,
-            message=message,
-            error="",
-        )
+        with time_stage("render"):
+            return render_template_string(
+                PAGE_TEMPLATE,
+                query=query,
+                results=results,
+                message=message,
+                error="",
+            )
+
+    @app.get("/api/search")
+    def search_api():
+        """
+        Один запрос: /api/search?q=...&k=10 ->
+        {"query", "k", "results": [{"doc_id", "score", "url"}], "cached", "error"}.
+
+        Выдача кэшируется по вектору лемм запроса: словоформы и перестановки слов
+        попадают в одну запись. Ошибка запроса (нет лемм в корпусе) возвращается в
+        "error" с пустой выдачей и не кэшируется.
+        """
+        query = (request.args.get("q") or "").strip()
+        if not query:
+            return jsonify(error="query parameter q is required"), 400
+        raw_top_k = request.args.get("k")
+        if raw_top_k is None:
+            top_k = app.config["TOP_K"]
+        else:
+            try:
+                top_k = int(raw_top_k)
+            except ValueError:
+                top_k = 0
+        if not 1 <= top_k <= MAX_TOP_K:
+            return jsonify(error=f"k must be an integer from 1 to {MAX_TOP_K}"), 400
+        inc("search_queries_total", endpoint="search_api")
+
+        try:
+            vector_index = index_holder.get_vector_index()
+        except FileNotFoundError:
+            return jsonify(error="vector index not found; run `vector-index` first"), 503
+        except ValueError as exc:
+            return jsonify(error=f"invalid vector index: {exc}"), 500
+        try:
+            url_map = index_holder.get_url_map()
+        except ValueError as exc:
+            return jsonify(error=f"failed to read index.txt: {exc}"), 500
+
+        try:
+            query_vector = build_query_vector(query, idf_map=vector_index["idf_map"])
+        except ValueError as exc:
+            inc("search_empty_results_total", endpoint="search_api")
+            return jsonify(query=query, k=top_k, results=[], cached=False, error=str(exc))
+
+        key = search_cache_key(query_vector, top_k)
+        ranked = search_cache.get(vector_index, key)
+        cached = ranked is not None
+        inc("search_cache_hits_total" if cached else "search_cache_misses_total")
+        if ranked is None:
+            try:
+                # Ранжируем канонический вектор ключа: выдача не зависит от порядка слов запроса.
+                ranked = rank_query_vector(dict(key[1]), top_k, vector_index, backend=app.config["SEARCH_BACKEND"])
+            except ValueError as exc:
+                return jsonify(error=str(exc)), 500
+            search_cache.put(vector_index, key, ranked)
+
+        if not ranked:
+            inc("search_empty_results_total", endpoint="search_api")
+        with time_stage("render"):
+            return jsonify(
+                query=query,
+                k=top_k,
+                results=[
+                    {"doc_id": doc_id, "score": score, "url": url_map.get(doc_id, "")} for doc_id, score in ranked
+                ],
+                cached=cached,
+                error=None,
+            )
+
+    @app.get("/api/stats")
+    def stats_api():
+        """Счётчики кэша выдачи и перезагрузок индекса."""
+        return jsonify(search_cache=search_cache.stats(), index=index_holder.stats())
+
+    @app.post("/api/search/batch")
+    def search_batch_api():
+        """
+        Пачка запросов: {"queries": ["...", ...], "k": 10} ->
+        {"k": 10, "results": [{"query", "results": [{"doc_id", "score", "url"}], "error"}, ...]}.
+
+        Ошибка отдельного запроса (пустой, нет лемм в корпусе) попадает в его "error",
+        остальные запросы пачки считаются как обычно.
+        """
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or not isinstance(payload.get("queries"), list):
+            return jsonify(error='expected a JSON object {"queries": [...], "k": N}'), 400
+        queries = payload["queries"]
+        if not all(isinstance(query, str) for query in queries):
+            return jsonify(error="queries must be strings"), 400
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jsonify(error=f"too many queries: at most {MAX_BATCH_QUERIES} per request"), 400
+        top_k = payload.get("k", app.config["TOP_K"])
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+            return jsonify(error=f"k must be an integer from 1 to {MAX_TOP_K}"), 400
+        inc("search_queries_total", len(queries), endpoint="search_batch_api")
+
+        try:
+            vector_index = index_holder.get_vector_index()
+        except FileNotFoundError:
+            return jsonify(error="vector index not found; run `vector-index` first"), 503
+        except ValueError as exc:
+            return jsonify(error=f"invalid vector index: {exc}"), 500
+        try:
+            url_map = index_holder.get_url_map()
+        except ValueError as exc:
+            return jsonify(error=f"failed to read index.txt: {exc}"), 500
+
+        try:
+            batch = search_batch(queries, top_k, vector_index, backend=app.config["SEARCH_BACKEND"])
+        except ValueError as exc:
+            return jsonify(error=str(exc)), 500
+
+        inc("search_empty_results_total", sum(not ranked for ranked, _error in batch), endpoint="search_batch_api")
+        with time_stage("render"):
+            return jsonify(
+                k=top_k,
+                results=[
+                    {
+                        "query": query,
+                        "results": [
+                            {"doc_id": doc_id, "score": score, "url": url_map.get(doc_id, "")}
+                            for doc_id, score in ranked
+                        ],
+                        "error": error,
+                    }
+                    for query, (ranked, error) in zip(queries, batch)
+                ],
+            )
+
+    @app.get("/metrics")
+    def metrics_api():
+        """Метрики (всех рабочих процессов под webapp.serve) в формате Prometheus; 404, если сбор выключен."""
+        if not metrics_enabled():
+            return jsonify(error="metrics are disabled; set METRICS_ENABLED=1"), 404
+        return Response(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
     return app
 
@@ -0,0 +1,133 @@
+"""Процессный кэш векторного индекса и index.txt для WEB-интерфейса."""
+
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+from crawler.cli import _read_url_index
+from crawler.metrics import inc
+from crawler.vector_search import _vector_index_path, load_vector_index
+
+
+def _file_signature(path: Path) -> tuple[int, int] | None:
+    """Сигнатура файла (mtime_ns, size); None, если файла нет."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _ReloadingFile:
+    """
+    Держит результат loader(path) и перечитывает его, когда у файла меняется mtime/size.
+
+    Значение подменяется целиком под блокировкой: запрос, уже получивший ссылку
+    на старое значение, дорабатывает с ним, новые запросы видят новое. Без auto_reload
+    get сверяет файл, только пока значения нет; загруженное обновляет лишь refresh.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path_getter: Callable[[], Path],
+        loader: Callable[[Path], Any],
+        auto_reload: bool = True,
+    ) -> None:
+        self.name = name
+        self._path_getter = path_getter
+        self._loader = loader
+        self._auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._signature: tuple[int, int] | None = None
+        self.hits = 0
+        self.reloads = 0
+
+    def get(self) -> Any:
+        if not self._auto_reload:
+            with self._lock:
+                if self._value is not None:
+                    self.hits += 1
+                    return self._value
+        return self.refresh()
+
+    def refresh(self) -> Any:
+        """Значение, перечитанное, если файл изменился с прошлой загрузки."""
+        path = self._path_getter()
+        signature = _file_signature(path)
+        with self._lock:
+            if self._value is not None and signature is not None and signature == self._signature:
+                self.hits += 1
+                return self._value
+
+            # Исключения loader пробрасываются наружу: старое значение не трогаем,
+            # сигнатуру не запоминаем, поэтому следующий запрос попробует снова.
+            value = self._loader(path)
+            self._value = value
+            self._signature = signature
+            self.reloads += 1
+            inc("index_reloads_total", file=self.name)
+            return value
+
+    def signature(self) -> tuple[int, int] | None:
+        """Текущая сигнатура файла на диске (файл не читается)."""
+        return _file_signature(self._path_getter())
+
+
+class IndexHolder:
+    """
+    Загружает векторный индекс и index.txt один раз на процесс и следит за их изменениями.
+
+    С auto_reload=False запросы не проверяют файлы: индекс обновляет только preload
+    (под webapp.serve её вызывает главный процесс перед перезапуском рабочих, и те
+    не держат каждый свою копию пересобранного индекса).
+    """
+
+    def __init__(self, vector_index_dir: Path, corpus_index_path: Path, auto_reload: bool = True) -> None:
+        self.vector_index_dir = vector_index_dir
+        self.corpus_index_path = corpus_index_path
+        self._vector_index = _ReloadingFile(
+            "vector_index",
+            lambda: _vector_index_path(self.vector_index_dir),
+            lambda _path: load_vector_index(index_dir=self.vector_index_dir),
+            auto_reload=auto_reload,
+        )
+        self._url_map = _ReloadingFile(
+            "url_index",
+            lambda: self.corpus_index_path,
+            _read_url_index,
+            auto_reload=auto_reload,
+        )
+
+    def get_vector_index(self) -> dict[str, dict[str, dict[str, float]] | dict[str, float] | str]:
+        """Текущий векторный индекс; FileNotFoundError/ValueError — как у load_vector_index."""
+        return self._vector_index.get()
+
+    def get_url_map(self) -> dict[str, str]:
+        """Текущее отображение doc_id -> url; ValueError — как у _read_url_index."""
+        return self._url_map.get()
+
+    def preload(self) -> None:
+        """
+        Пробует загрузить оба файла (или перечитать изменившиеся); ошибки покажутся
+        позже, на запросе.
+        """
+        for loader in (self._vector_index.refresh, self._url_map.refresh):
+            try:
+                loader()
+            except (FileNotFoundError, ValueError):
+                continue
+
+    def file_signatures(self) -> tuple[tuple[int, int] | None, tuple[int, int] | None]:
+        """Сигнатуры векторного индекса и index.txt на диске: по их смене видна пересборка."""
+        return self._vector_index.signature(), self._url_map.signature()
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики попаданий в кэш и перезагрузок по каждому файлу."""
+        return {
+            "vector_index_hits": self._vector_index.hits,
+            "vector_index_reloads": self._vector_index.reloads,
+            "url_index_hits": self._url_map.hits,
+            "url_index_reloads": self._url_map.reloads,
+        }
@@ -0,0 +1,60 @@
+"""Кэш выдачи JSON API поиска: ключ — вектор лемм запроса, сбрасывается при смене индекса."""
+
+import threading
+from typing import Any
+
+from crawler.cache import LRUCache
+
+DEFAULT_SEARCH_CACHE_SIZE = 1024
+DEFAULT_SEARCH_CACHE_TTL = 300.0
+
+SearchKey = tuple[int, tuple[tuple[str, float], ...]]
+
+
+def search_cache_key(query_vector: dict[str, float], top_k: int) -> SearchKey:
+    """
+    Ключ выдачи: top_k и вектор запроса с леммами по алфавиту.
+
+    Вектор строится по леммам, поэтому "кошки" и "кошкам", как и перестановки слов,
+    дают один ключ.
+    """
+    return top_k, tuple(sorted(query_vector.items()))
+
+
+class SearchResultCache:
+    """
+    LRU-кэш выдачи (doc_id, score) с TTL, привязанный к загруженному векторному индексу.
+
+    IndexHolder подменяет индекс новым объектом, когда файл индекса меняется: get и put
+    с другим объектом индекса сначала очищают кэш, чтобы не отдать выдачу старого индекса.
+    Сброс удаляет только записи: статистика попаданий накапливается за всё время работы.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_SEARCH_CACHE_SIZE, ttl: float | None = DEFAULT_SEARCH_CACHE_TTL) -> None:
+        self._cache: LRUCache[SearchKey, list[tuple[str, float]]] = LRUCache(maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        # Ссылка на сам индекс, а не id(): объект не освободится, и его id не достанется новому.
+        self._vector_index: Any = None
+        self.invalidations = 0
+
+    def _bind(self, vector_index: Any) -> None:
+        with self._lock:
+            if vector_index is self._vector_index:
+                return
+            if self._vector_index is not None:
+                self.invalidations += 1
+            self._cache.clear(reset_stats=False)
+            self._vector_index = vector_index
+
+    def get(self, vector_index: Any, key: SearchKey) -> list[tuple[str, float]] | None:
+        self._bind(vector_index)
+        return self._cache.get(key)
+
+    def put(self, vector_index: Any, key: SearchKey, ranked: list[tuple[str, float]]) -> None:
+        self._bind(vector_index)
+        self._cache.put(key, ranked)
+
+    def stats(self) -> dict[str, int | float]:
+        stats = self._cache.stats()
+        stats["invalidations"] = self.invalidations
+        return stats
@@ -0,0 +1,182 @@
+"""
+Production-запуск WEB-интерфейса: gunicorn с несколькими процессами (python -m webapp.serve).
+
+Приложение и векторный индекс загружаются в главном процессе до fork (preload), рабочие
+процессы наследуют их. vector-index-v2 отображён в память, поэтому его страницы общие
+для всех процессов; то, что поиск строит на первом запросе, строится заранее, а
+gc.freeze() выводит загруженные объекты из обхода сборщика мусора, чтобы он не копировал
+их страницы в каждый процесс.
+
+Пересборка индекса: главный процесс раз в WEB_RELOAD_INTERVAL секунд сверяет сигнатуры
+файлов и, когда они сменились и не меняются между двумя проверками, посылает себе SIGHUP.
+Gunicorn загружает новый индекс в главный процесс (хук on_reload), поднимает новые рабочие
+процессы и мягко останавливает старые: те дорабатывают начатые запросы. Сами рабочие
+процессы файлы индекса не проверяют (auto_reload=False), чтобы не загружать каждый свою копию.
+
+Метрики процессы пишут в общий каталог METRICS_DIR (по умолчанию — временный каталог на
+время работы сервера), и /metrics любого рабочего процесса отдаёт сумму по всем процессам.
+"""
+
+import atexit
+import gc
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from flask import Flask
+
+from crawler.metrics import configure_metrics, flush_metrics
+from crawler.vector_search import prepare_vector_index
+
+from .app import create_app
+from .settings import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    app_options_from_env,
+    configure_lemmatizer_from_env,
+    int_env,
+    metrics_enabled_from_env,
+    warm_up_aspell,
+)
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn не работает под Windows: там остаётся python -m webapp
+    BaseApplication = None
+
+DEFAULT_WEB_WORKERS = 2
+DEFAULT_WEB_THREADS = 4
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_RELOAD_INTERVAL = 5
+
+
+def _load_before_fork(app: Flask) -> None:
+    """Загружает индекс в главном процессе, строит структуры поиска и замораживает кучу."""
+    gc.unfreeze()
+    index_holder = app.config["INDEX_HOLDER"]
+    index_holder.preload()
+    try:
+        prepare_vector_index(index_holder.get_vector_index(), app.config["SEARCH_BACKEND"])
+    except (FileNotFoundError, ValueError):
+        # Индекса ещё нет или он битый: рабочие процессы покажут ошибку на запросе.
+        pass
+    # Загрузки индекса главным процессом учитываются в его файле метрик.
+    flush_metrics()
+    gc.freeze()
+
+
+def _metrics_dir() -> Path:
+    """
+    Каталог файлов метрик процессов: METRICS_DIR (файлы прошлого запуска удаляются) или
+    временный каталог, который главный процесс удаляет при выходе.
+    """
+    configured = os.getenv("METRICS_DIR")
+    if configured:
+        directory = Path(configured)
+        directory.mkdir(parents=True, exist_ok=True)
+        for path in directory.glob("metrics_*.json"):
+            path.unlink()
+        return directory
+    directory = Path(tempfile.mkdtemp(prefix="webapp-metrics-"))
+    master_pid = os.getpid()
+
+    def remove() -> None:
+        # Рабочие процессы наследуют обработчики atexit, а каталог нужен до выхода главного.
+        if os.getpid() == master_pid:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    atexit.register(remove)
+    return directory
+
+
+def _watch_index_files(app: Flask, interval: int) -> None:
+    """
+    Поток главного процесса: SIGHUP себе, когда файлы индекса пересобраны.
+
+    Сигнал посылается, только если сигнатура не изменилась между двумя проверками,
+    чтобы не перезапускать процессы посреди записи. Поток не берёт блокировок,
+    поэтому fork рабочего процесса рядом с ним безопасен.
+    """
+    index_holder = app.config["INDEX_HOLDER"]
+    loaded = index_holder.file_signatures()
+    previous = loaded
+    while True:
+        time.sleep(interval)
+        current = index_holder.file_signatures()
+        if current != loaded and current == previous:
+            loaded = current
+            os.kill(os.getpid(), signal.SIGHUP)
+        previous = current
+
+
+def _gunicorn_application(app: Flask, options: dict[str, Any]) -> Any:
+    class _Application(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Flask:
+            return app
+
+    return _Application()
+
+
+def main() -> int:
+    if BaseApplication is None:
+        print("webapp.serve: gunicorn is not installed (pip install gunicorn); use python -m webapp", file=sys.stderr)
+        return 1
+    workers = int_env("WEB_WORKERS", DEFAULT_WEB_WORKERS)
+    threads = int_env("WEB_THREADS", DEFAULT_WEB_THREADS)
+    if workers < 1 or threads < 1:
+        print("webapp.serve: WEB_WORKERS and WEB_THREADS must be >= 1", file=sys.stderr)
+        return 1
+    reload_interval = int_env("WEB_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL)
+
+    configure_lemmatizer_from_env()
+    metrics = metrics_enabled_from_env()
+    configure_metrics(metrics, _metrics_dir() if metrics else None)
+    # Проверку файлов на запросах выключаем: пересобранный индекс загружает только главный
+    # процесс (on_reload), иначе каждый рабочий успел бы прочитать свою копию до SIGHUP.
+    app = create_app(**app_options_from_env(), auto_reload=False)
+    _load_before_fork(app)
+
+    def when_ready(server: Any) -> None:
+        if reload_interval > 0:
+            threading.Thread(target=_watch_index_files, args=(app, reload_interval), daemon=True).start()
+
+    def on_reload(server: Any) -> None:
+        server.log.info("reloading vector index before restarting workers")
+        _load_before_fork(app)
+
+    def post_worker_init(worker: Any) -> None:
+        # Процессы aspell у каждого рабочего процесса свои: пайпы главного делить нельзя.
+        warm_up_aspell()
+
+    def worker_exit(server: Any, worker: Any) -> None:
+        # Последние значения процесса, ещё не сохранённые фоновым потоком.
+        flush_metrics()
+
+    options = {
+        "bind": f"{os.getenv('HOST', DEFAULT_HOST)}:{int_env('PORT', DEFAULT_PORT)}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "graceful_timeout": int_env("WEB_GRACEFUL_TIMEOUT", DEFAULT_GRACEFUL_TIMEOUT),
+        "when_ready": when_ready,
+        "on_reload": on_reload,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+    }
+    _gunicorn_application(app, options).run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
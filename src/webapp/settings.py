@@ -0,0 +1,61 @@
+"""Настройки WEB-сервера из переменных окружения: общие для python -m webapp и webapp.serve."""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+from crawler.lemmatizer import DEFAULT_LEMMA_CACHE_SIZE, configure_aspell_pool, configure_lemma_cache, get_aspell_pool
+from crawler.vector_search import VECTOR_BACKEND_PYTHON, VECTOR_BACKENDS
+
+from .app import DEFAULT_CORPUS_INDEX_PATH, DEFAULT_VECTOR_INDEX_DIR
+from .search_cache import DEFAULT_SEARCH_CACHE_SIZE, DEFAULT_SEARCH_CACHE_TTL
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+
+def int_env(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def app_options_from_env() -> dict[str, Any]:
+    """Аргументы create_app: VECTOR_INDEX_DIR, INDEX_PATH, SEARCH_BACKEND, SEARCH_CACHE_*."""
+    backend = os.getenv("SEARCH_BACKEND", VECTOR_BACKEND_PYTHON)
+    if backend not in VECTOR_BACKENDS:
+        backend = VECTOR_BACKEND_PYTHON
+    return {
+        "vector_index_dir": Path(os.getenv("VECTOR_INDEX_DIR", str(DEFAULT_VECTOR_INDEX_DIR))),
+        "corpus_index_path": Path(os.getenv("INDEX_PATH", str(DEFAULT_CORPUS_INDEX_PATH))),
+        "backend": backend,
+        "search_cache_size": int_env("SEARCH_CACHE_SIZE", DEFAULT_SEARCH_CACHE_SIZE),
+        # 0 — записи кэша выдачи не устаревают по времени (сбрасываются только при смене индекса).
+        "search_cache_ttl": int_env("SEARCH_CACHE_TTL", int(DEFAULT_SEARCH_CACHE_TTL)),
+    }
+
+
+def metrics_enabled_from_env() -> bool:
+    """METRICS_ENABLED: собирать ли метрики для /metrics (по умолчанию да)."""
+    return int_env("METRICS_ENABLED", 1) != 0
+
+
+def configure_lemmatizer_from_env() -> None:
+    """Пул aspell (ASPELL_WORKERS) и кэш лемм (LEMMA_CACHE_SIZE) текущего процесса."""
+    configure_aspell_pool(int_env("ASPELL_WORKERS", 1))
+    configure_lemma_cache(int_env("LEMMA_CACHE_SIZE", DEFAULT_LEMMA_CACHE_SIZE))
+
+
+def warm_up_aspell() -> None:
+    """Поднимает aspell заранее, чтобы первый поисковый запрос не ждал загрузки словаря."""
+    if shutil.which("aspell") is None:
+        return
+    try:
+        get_aspell_pool("ru").check(["тест"])
+    except RuntimeError:
+        pass